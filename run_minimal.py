@@ -10,7 +10,7 @@ import json
 import uuid
 import sqlite3
 import datetime
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import base64
 import hashlib
@@ -19,11 +19,134 @@ from datetime import datetime, timedelta
 import subprocess
 import re
 
+# 共用 sql-manager-backend 中的SQL执行引擎
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql-manager-backend'))
+from sql_engine import (
+    BINARY_MIMETYPE, DEFAULT_TARGET, FORMAT_COLUMNAR, NDJSON_MIMETYPE, SQLITE,
+    SQL_SCRIPT_MIMETYPES, AdmissionController, AdmissionRejectedError, CursorNotFoundError,
+    CursorRegistry, DemoDataGenerator, DriverRegistry, FanOutExecutor, JobManager,
+    JobNotFoundError, JobQueueFullError, LimitPolicy, MemoryBudget, MockDriver, PlanCache,
+    PreviewRunner, QueryCoalescer, QueryLimits, QueryStats, ResultCache, SQLEngine,
+    SQLExecutionError, SQLValidator, SQLiteDriver, SchemaCatalog, SnippetMaterializer,
+    SnippetNotScheduledError, SubprocessDriver, encode_result, export_chunks, export_headers,
+    job_lines, json_default, ndjson_lines, read_ndjson, resolve_export_format, resolve_format,
+    resolve_statement, script_lines, targets_from_env, wants_binary, wants_stream
+)
+
 # 全局配置
 PORT = 5000
 DB_FILE = 'sql_manager_minimal.db'
 SECRET_KEY = 'your-secure-secret-key-here'
 
+# SQL执行引擎配置：目标数据库（名称 -> SQLite文件），未配置时execute-sql返回模拟数据
+SQL_TARGETS = targets_from_env()
+SQL_DEMO_SEED = 42  # 模拟数据生成器的种子
+SQL_MOCK_ROWS = 10  # 未配置目标数据库时模拟查询返回的行数
+SQL_READ_POOL_SIZE = 5  # 只读查询使用的 mode=ro 连接数
+SQL_WRITE_POOL_SIZE = 1  # 写入语句使用的连接数，默认单个写连接
+SQL_JOURNAL_MODE = 'wal'  # WAL模式下读连接不与写事务争用锁
+SQL_STREAM_BATCH_SIZE = 500
+SQL_RESULT_PAGE_SIZE = 100
+SQL_CURSOR_IDLE_TTL = 300  # 秒，超时未访问的结果游标被回收
+SQL_CURSOR_MAX_OPEN = 50
+SQL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+SQL_CACHE_TTL = 60  # 秒
+SQL_COALESCE_QUERIES = True  # 相同的只读查询正在执行时共享其结果，不重复执行
+SQL_JOB_WORKERS = 4
+SQL_JOB_MAX_PENDING = 100
+SQL_JOB_RESULT_TTL = 600  # 秒，已结束任务的结果保留时间
+SQL_JOB_TIMEOUT = 3600  # 秒，异步任务使用更长的超时
+SQL_BUFFER_MEMORY_BYTES = 256 * 1024 * 1024  # 所有任务结果在内存中的总预算
+SQL_BUFFER_REQUEST_BYTES = 16 * 1024 * 1024  # 单个任务结果在内存中的预算，超出后溢出到磁盘
+SQL_SPILL_DIR = None  # 溢出文件目录，None表示系统临时目录
+SQL_BULK_BATCH_SIZE = 1000  # 批量写入每个事务的行数
+SQL_BULK_MAX_BATCH_SIZE = 50000
+SQL_MAX_CONCURRENT_QUERIES = 8  # 同时执行的查询总数上限
+SQL_MAX_USER_QUERIES = 2  # 每个用户同时执行的查询数上限
+SQL_ADMISSION_QUEUE_SIZE = 50  # 等待执行的交互请求总数上限，超出返回429
+SQL_ADMISSION_USER_QUEUE_SIZE = 4  # 每个用户等待执行的交互请求上限
+SQL_ADMISSION_TIMEOUT = 10  # 秒，交互请求最长等待时间
+SQL_DEFAULT_DRIVER = 'sqlite'  # 已配置目标默认使用的执行驱动：sqlite（进程内）/ subprocess（工作进程）
+SQL_TARGET_DRIVERS = {}  # 目标名称 -> 驱动名称
+SQL_SUBPROCESS_WORKERS = 2  # 同时运行的工作进程数上限
+SQL_SUBPROCESS_MEMORY_BYTES = None  # 工作进程的地址空间上限（仅POSIX），None表示不限制
+SQL_FANOUT_WORKERS = 8  # 多目标并行执行的工作线程数
+SQL_PLAN_CACHE_SIZE = 512
+SQL_VALIDATION_CACHE_SIZE = 2048  # 缓存的校验结论条数
+SQL_AUTOCOMPLETE_LIMIT = 50  # 自动补全默认返回的条数
+SQL_PLAN_LARGE_TABLE_ROWS = 10000  # 超过该行数的表被全表扫描时给出警告
+SQL_PREVIEW_LIMIT = 1000  # 预览模式下没有LIMIT的查询最多返回的行数
+SQL_PREVIEW_COUNT_CAP = 1000000  # 预览被截断时后台COUNT(*)最多数到的行数
+SQL_MATERIALIZED_DB = 'sql_materialized.db'  # 定时刷新的片段结果保存在该SQLite文件中
+SQL_MATERIALIZE_TIMEOUT = 600  # 秒，单次刷新的超时
+SQL_MATERIALIZE_MAX_ROWS = 100000  # 单个片段最多物化的行数，超出时刷新失败并保留上一次的结果
+SQL_SLOW_QUERY_MS = 500  # 超过该耗时的语句写入慢查询日志
+SQL_SLOW_QUERY_LOG = os.environ.get('SQL_SLOW_QUERY_LOG')  # 慢查询日志文件（JSON行），None表示只保存在内存
+SQL_QUERY_STATS_MAX_FINGERPRINTS = 1000
+# 单条语句执行预算：timeout（秒）/ maxRows / maxVmSteps，None表示不限制
+SQL_LIMITS = {'timeout': 60, 'maxRows': None, 'maxVmSteps': None}
+SQL_TARGET_LIMITS = {}  # 目标名称 -> 预算
+SQL_USER_LIMITS = {}  # 用户ID/邮箱（或 '用户:目标'）-> 预算
+
+demo_data = DemoDataGenerator(seed=SQL_DEMO_SEED)
+result_cache = ResultCache(max_bytes=SQL_CACHE_MAX_BYTES, ttl=SQL_CACHE_TTL)
+query_coalescer = QueryCoalescer() if SQL_COALESCE_QUERIES else None
+query_stats = QueryStats(
+    slow_threshold_ms=SQL_SLOW_QUERY_MS,
+    max_fingerprints=SQL_QUERY_STATS_MAX_FINGERPRINTS,
+    log_path=SQL_SLOW_QUERY_LOG
+)
+sql_engine = SQLEngine(
+    SQL_TARGETS,
+    read_pool_size=SQL_READ_POOL_SIZE,
+    write_pool_size=SQL_WRITE_POOL_SIZE,
+    journal_mode=SQL_JOURNAL_MODE,
+    result_cache=result_cache,
+    query_stats=query_stats,
+    coalescer=query_coalescer
+)
+result_cursors = CursorRegistry(sql_engine, idle_ttl=SQL_CURSOR_IDLE_TTL, max_open=SQL_CURSOR_MAX_OPEN)
+limit_policy = LimitPolicy(SQL_LIMITS, per_target=SQL_TARGET_LIMITS, per_user=SQL_USER_LIMITS)
+result_memory = MemoryBudget(SQL_BUFFER_MEMORY_BYTES)
+query_admission = AdmissionController(
+    max_concurrent=SQL_MAX_CONCURRENT_QUERIES,
+    max_per_user=SQL_MAX_USER_QUERIES,
+    max_queue=SQL_ADMISSION_QUEUE_SIZE,
+    max_user_queue=SQL_ADMISSION_USER_QUEUE_SIZE,
+    queue_timeout=SQL_ADMISSION_TIMEOUT
+)
+query_jobs = JobManager(
+    sql_engine,
+    max_workers=SQL_JOB_WORKERS,
+    max_pending=SQL_JOB_MAX_PENDING,
+    result_ttl=SQL_JOB_RESULT_TTL,
+    memory_budget=result_memory,
+    buffer_memory_bytes=SQL_BUFFER_REQUEST_BYTES,
+    spill_dir=SQL_SPILL_DIR,
+    admission=query_admission
+)
+query_plans = PlanCache(sql_engine, max_entries=SQL_PLAN_CACHE_SIZE, large_table_rows=SQL_PLAN_LARGE_TABLE_ROWS)
+query_drivers = DriverRegistry(
+    sql_engine,
+    [
+        MockDriver(demo_data, rows=SQL_MOCK_ROWS),
+        SQLiteDriver(sql_engine, plans=query_plans),
+        SubprocessDriver(sql_engine, max_workers=SQL_SUBPROCESS_WORKERS, memory_limit=SQL_SUBPROCESS_MEMORY_BYTES)
+    ],
+    default=SQL_DEFAULT_DRIVER,
+    target_drivers=SQL_TARGET_DRIVERS
+)
+schema_catalog = SchemaCatalog(sql_engine)
+sql_validator = SQLValidator(sql_engine, max_entries=SQL_VALIDATION_CACHE_SIZE)
+query_fanout = FanOutExecutor(sql_engine, max_workers=SQL_FANOUT_WORKERS)
+query_previews = PreviewRunner(sql_engine, jobs=query_jobs, limit=SQL_PREVIEW_LIMIT, count_cap=SQL_PREVIEW_COUNT_CAP)
+snippet_materializer = SnippetMaterializer(
+    sql_engine,
+    SQL_MATERIALIZED_DB,
+    admission=query_admission,
+    limits=QueryLimits(timeout=SQL_MATERIALIZE_TIMEOUT, max_rows=SQL_MATERIALIZE_MAX_ROWS)
+)
+
 # 初始化数据库
 def init_db():
     """初始化SQLite数据库"""
@@ -166,6 +289,17 @@ class SQLManagerHandler(SimpleHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(b'Not Found')
     
+    def do_DELETE(self):
+        parsed_path = urlparse(self.path)
+        
+        # API路由处理
+        if parsed_path.path.startswith('/api'):
+            self.handle_api_request(parsed_path)
+        else:
+            self.send_response(404)
+            self.end_headers()
+            self.wfile.write(b'Not Found')
+    
     def handle_api_request(self, parsed_path):
         """处理API请求"""
         path = parsed_path.path
@@ -175,9 +309,15 @@ class SQLManagerHandler(SimpleHTTPRequestHandler):
         content_length = int(self.headers.get('Content-Length', 0))
         post_data = self.rfile.read(content_length).decode('utf-8') if content_length > 0 else ''
         
-        # 解析JSON数据
+        # 解析JSON数据（SQL脚本可直接作为请求体上传）
         try:
-            data = json.loads(post_data) if post_data else {}
+            content_type = self.headers.get('Content-Type', '').split(';')[0].strip()
+            if content_type in SQL_SCRIPT_MIMETYPES:
+                data = {'script': post_data}
+            elif content_type == NDJSON_MIMETYPE:
+                data = {'ndjson': post_data}
+            else:
+                data = json.loads(post_data) if post_data else {}
         except json.JSONDecodeError:
             self.send_response(400)
             self.send_header('Content-type', 'application/json')
@@ -195,6 +335,21 @@ class SQLManagerHandler(SimpleHTTPRequestHandler):
                 self.handle_get_sql_snippets()
             elif self.command == 'POST':
                 self.handle_create_sql_snippet(data)
+        elif path.startswith('/api/sql-snippets/') and path.endswith(('/schedule', '/refresh', '/materialized')):
+            parts = path.split('/')
+            if len(parts) == 5 and parts[3]:
+                snippet_id = parts[3]
+                if parts[4] == 'schedule':
+                    if self.command == 'GET':
+                        self.handle_get_snippet_schedule(snippet_id)
+                    elif self.command == 'POST':
+                        self.handle_schedule_sql_snippet(snippet_id, data)
+                    elif self.command == 'DELETE':
+                        self.handle_unschedule_sql_snippet(snippet_id)
+                elif parts[4] == 'refresh' and self.command == 'POST':
+                    self.handle_refresh_sql_snippet(snippet_id)
+                elif parts[4] == 'materialized' and self.command == 'GET':
+                    self.handle_get_materialized_snippet(snippet_id, query_params)
         elif path.startswith('/api/sql-snippets/'):
             parts = path.split('/')
             if len(parts) >= 4 and parts[3]:
@@ -239,7 +394,65 @@ class SQLManagerHandler(SimpleHTTPRequestHandler):
                 comment_id = parts[3]
                 self.handle_delete_comment(comment_id)
         elif path == '/api/execute-sql' and self.command == 'POST':
-            self.handle_execute_sql(data)
+            self.handle_admitted(self.handle_execute_sql, data)
+        elif path == '/api/schema' and self.command == 'GET':
+            self.handle_get_schema(query_params)
+        elif path == '/api/autocomplete' and self.command == 'GET':
+            self.handle_autocomplete(query_params)
+        elif path == '/api/validate-sql' and self.command == 'POST':
+            self.handle_validate_sql(data)
+        elif path == '/api/execute-script' and self.command == 'POST':
+            self.handle_admitted(self.handle_execute_script, data, query_params)
+        elif path == '/api/execute-bulk' and self.command == 'POST':
+            self.handle_admitted(self.handle_execute_bulk, data)
+        elif path == '/api/execute-sql/export' and self.command == 'POST':
+            self.handle_admitted(self.handle_export_sql, data, query_params)
+        elif path.startswith('/api/results/'):
+            parts = path.split('/')
+            if len(parts) >= 4 and parts[3]:
+                cursor_id = parts[3]
+                if self.command == 'GET':
+                    self.handle_get_result_page(cursor_id, query_params)
+                elif self.command == 'DELETE':
+                    self.handle_close_result_cursor(cursor_id)
+        elif path == '/api/jobs' and self.command == 'POST':
+            self.handle_submit_job(data)
+        elif path.startswith('/api/jobs/'):
+            parts = path.split('/')
+            if len(parts) >= 4 and parts[3]:
+                job_id = parts[3]
+                if self.command == 'GET':
+                    self.handle_get_job(job_id, query_params)
+                elif self.command == 'DELETE':
+                    self.handle_cancel_job(job_id)
+        elif path.startswith('/api/executions/') and self.command == 'DELETE':
+            parts = path.split('/')
+            if len(parts) >= 4 and parts[3]:
+                execution_id = parts[3]
+                self.handle_cancel_execution(execution_id)
+        elif path == '/api/admin/coalescing' and self.command == 'GET':
+            self.handle_get_coalescing_stats()
+        elif path == '/api/admin/schedules' and self.command == 'GET':
+            self.handle_get_schedules()
+        elif path == '/api/admin/admission' and self.command == 'GET':
+            self.handle_get_admission_stats()
+        elif path == '/api/admin/drivers' and self.command == 'GET':
+            self.handle_get_driver_stats()
+        elif path == '/api/admin/plans':
+            if self.command == 'GET':
+                self.handle_get_plan_stats()
+            elif self.command == 'DELETE':
+                self.handle_clear_plans()
+        elif path == '/api/admin/slow-queries':
+            if self.command == 'GET':
+                self.handle_get_slow_queries(query_params)
+            elif self.command == 'DELETE':
+                self.handle_clear_slow_queries()
+        elif path == '/api/admin/cache':
+            if self.command == 'GET':
+                self.handle_get_cache_stats()
+            elif self.command == 'DELETE':
+                self.handle_clear_cache()
         else:
             self.send_response(404)
             self.send_header('Content-type', 'application/json')
@@ -271,15 +484,80 @@ class SQLManagerHandler(SimpleHTTPRequestHandler):
         
         return None
     
-    def send_json_response(self, data, status_code=200):
+    def handle_admitted(self, handler, *args):
+        """在准入控制下执行查询请求：超出并发上限时排队等待，队列已满或等待超时返回429"""
+        user = self.get_current_user()
+        
+        if not user:
+            # 由处理函数返回401
+            handler(*args)
+            return
+        
+        try:
+            ticket = query_admission.acquire(user['id'])
+        except AdmissionRejectedError as e:
+            self.send_json_response(e.to_dict(), 429, headers={'Retry-After': str(e.retry_after)})
+            return
+        
+        # 流式响应在处理函数内发送完毕，之后才归还名额
+        with ticket:
+            handler(*args)
+    
+    def send_json_response(self, data, status_code=200, headers=None):
         """发送JSON响应"""
+        # 先编码再发送响应头，编码失败时不会留下状态为200的空响应
+        body = json.dumps(data, default=json_default).encode()
         self.send_response(status_code)
         self.send_header('Content-type', 'application/json')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(body)
+    
+    def send_bytes_response(self, body, content_type, status_code=200):
+        """发送二进制响应"""
+        self.send_response(status_code)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_chunked_response(self, chunks, content_type, status_code=200, headers=None):
+        """以Transfer-Encoding: chunked发送字节块生成器"""
+        # 分块传输需要HTTP/1.1，响应结束后关闭连接
+        self.protocol_version = 'HTTP/1.1'
+        self.send_response(status_code)
+        self.send_header('Content-type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.end_headers()
+        
+        try:
+            for chunk in chunks:
+                if chunk:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            print("Client disconnected during streaming response")
+        except SQLExecutionError as e:
+            # 响应头已发送：不写结束块直接关闭连接，客户端会收到不完整的分块传输而不是截断的文件
+            print(f"Streaming response aborted: {e}")
+        finally:
+            # 确保连接归还连接池
+            if hasattr(chunks, 'close'):
+                chunks.close()
+            self.close_connection = True
     
     def handle_login(self, data):
         """处理登录请求"""
@@ -614,6 +892,10 @@ class SQLManagerHandler(SimpleHTTPRequestHandler):
             row = cursor.fetchone()
             row_dict = dict(row)
             
+            # 已设置定时刷新的片段按新内容重新物化
+            if 'content' in data:
+                snippet_materializer.update_content(snippet_id, row_dict['content'])
+            
             # 解析JSON字段
             try:
                 tags = json.loads(row_dict['tags']) if row_dict['tags'] else []
@@ -683,6 +965,7 @@ class SQLManagerHandler(SimpleHTTPRequestHandler):
             cursor.execute('DELETE FROM sql_snippets WHERE id = ?', (snippet_id,))
             
             conn.commit()
+            snippet_materializer.unschedule(snippet_id)
             self.send_json_response({'message': 'SQL snippet deleted successfully'})
             
         except Exception as e:
@@ -691,6 +974,134 @@ class SQLManagerHandler(SimpleHTTPRequestHandler):
         finally:
             conn.close()
     
+    def get_snippet_row(self, snippet_id):
+        """读取SQL片段的内容和创建者，不存在时返回None"""
+        conn = sqlite3.connect(DB_FILE)
+        conn.row_factory = sqlite3.Row
+        try:
+            return conn.execute('SELECT content, created_by FROM sql_snippets WHERE id = ?', (snippet_id,)).fetchone()
+        finally:
+            conn.close()
+    
+    def handle_schedule_sql_snippet(self, snippet_id, data):
+        """设置片段的定时刷新：{"interval": 秒} 或 {"cron": "*/15 * * * *"}，可选 target / templateParams / params"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        snippet = self.get_snippet_row(snippet_id)
+        
+        if not snippet:
+            self.send_json_response({'message': 'SQL snippet not found'}, 404)
+            return
+        
+        # 检查权限
+        if snippet['created_by'] != user['id']:
+            self.send_json_response({'message': 'You do not have permission to schedule this snippet'}, 403)
+            return
+        
+        if data.get('interval') is not None:
+            schedule = f'every {data["interval"]}'
+        elif data.get('cron'):
+            schedule = data['cron']
+        else:
+            self.send_json_response({'message': 'Missing interval or cron'}, 400)
+            return
+        
+        try:
+            result = snippet_materializer.schedule(
+                snippet_id, snippet['content'], schedule, target=data.get('target', DEFAULT_TARGET),
+                owner=user['id'], template_params=data.get('templateParams'), params=data.get('params')
+            )
+        except SQLExecutionError as e:
+            self.send_json_response(e.to_dict(), 400)
+            return
+        except (ValueError, TypeError) as e:
+            self.send_json_response({'error': str(e), 'success': False}, 400)
+            return
+        self.send_json_response(result)
+    
+    def handle_get_snippet_schedule(self, snippet_id):
+        """片段的刷新计划和最近一次刷新的状态"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        result = snippet_materializer.get(snippet_id)
+        if result is None:
+            self.send_json_response({'message': 'Snippet has no refresh schedule'}, 404)
+            return
+        self.send_json_response(result)
+    
+    def handle_unschedule_sql_snippet(self, snippet_id):
+        """取消片段的定时刷新并删除物化结果"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        snippet = self.get_snippet_row(snippet_id)
+        
+        if snippet and snippet['created_by'] != user['id']:
+            self.send_json_response({'message': 'You do not have permission to unschedule this snippet'}, 403)
+            return
+        
+        if not snippet_materializer.unschedule(snippet_id):
+            self.send_json_response({'message': 'Snippet has no refresh schedule'}, 404)
+            return
+        self.send_json_response({'message': 'Refresh schedule removed'})
+    
+    def handle_refresh_sql_snippet(self, snippet_id):
+        """立即刷新片段（同步执行），返回刷新后的状态"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        snippet = self.get_snippet_row(snippet_id)
+        
+        if snippet and snippet['created_by'] != user['id']:
+            self.send_json_response({'message': 'You do not have permission to refresh this snippet'}, 403)
+            return
+        
+        try:
+            result = snippet_materializer.refresh_now(snippet_id)
+        except SnippetNotScheduledError as e:
+            self.send_json_response({'message': str(e)}, 404)
+            return
+        self.send_json_response(result, 200 if result['error'] is None else 400)
+    
+    def handle_get_materialized_snippet(self, snippet_id, query_params):
+        """读取片段的物化结果：?offset=0&limit=100&format=arrays，响应带有 refreshedAt / ageSeconds"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        try:
+            limit = query_params.get('limit', [None])[0]
+            result = snippet_materializer.read(
+                snippet_id, offset=int(query_params.get('offset', [0])[0]), limit=int(limit) if limit else None,
+                result_format=resolve_format(query_params.get('format', [None])[0])
+            )
+        except SnippetNotScheduledError as e:
+            self.send_json_response({'message': str(e)}, 404)
+            return
+        except ValueError as e:
+            self.send_json_response({'error': str(e), 'success': False}, 400)
+            return
+        except SQLExecutionError as e:
+            self.send_json_response(e.to_dict(), 400)
+            return
+        self.send_json_response(result)
+    
     def handle_get_categories(self):
         """获取所有分类"""
         user = self.get_current_user()
@@ -1146,7 +1557,7 @@ class SQLManagerHandler(SimpleHTTPRequestHandler):
             conn.close()
     
     def handle_execute_sql(self, data):
-        """执行SQL语句（模拟）"""
+        """执行SQL语句（按目标和请求选择执行驱动，未配置目标数据库时模拟）"""
         user = self.get_current_user()
         
         if not user:
@@ -1159,95 +1570,581 @@ class SQLManagerHandler(SimpleHTTPRequestHandler):
             self.send_json_response({'message': 'Missing required fields'}, 400)
             return
         
-        lower_sql = sql.lower()
+        target = data.get('target', DEFAULT_TARGET)
         
-        # 模拟错误
-        if 'error' in lower_sql:
-            self.send_json_response({
-                'error': '模拟错误: 这是一个测试错误',
-                'success': False
-            }, 400)
-            return
-        
-        # 模拟SELECT语句
-        if lower_sql.startswith('select'):
-            import re
-            # 尝试解析表名
-            table_name = 'users'  # 默认表名
-            from_match = re.search(r'from\s+(\w+)', lower_sql)
-            if from_match and from_match.group(1):
-                table_name = from_match.group(1)
-            
-            # 根据不同表名返回不同数据
-            columns = []
-            rows = []
-            
-            if table_name == 'users':
-                columns = ['id', 'name', 'email', 'created_at']
-                for i in range(1, 11):
-                    rows.append({
-                        'id': i,
-                        'name': f'User {i}',
-                        'email': f'user{i}@example.com',
-                        'created_at': (datetime.now() - timedelta(days=30 * i)).isoformat()
-                    })
-            elif table_name == 'products':
-                columns = ['id', 'product_name', 'price', 'stock', 'category']
-                categories = ['Electronics', 'Books', 'Clothing', 'Home', 'Beauty']
-                for i in range(1, 11):
-                    rows.append({
-                        'id': i,
-                        'product_name': f'Product {i}',
-                        'price': round(10 + (i * 10.5), 2),
-                        'stock': 100 - i,
-                        'category': categories[i % len(categories)]
-                    })
-            elif table_name == 'orders':
-                columns = ['id', 'user_id', 'order_date', 'total_amount', 'status']
-                statuses = ['Pending', 'Processing', 'Shipped', 'Delivered', 'Cancelled']
-                for i in range(1, 11):
-                    rows.append({
-                        'id': i,
-                        'user_id': (i % 5) + 1,
-                        'order_date': (datetime.now() - timedelta(days=i)).isoformat(),
-                        'total_amount': round(100 + (i * 20.5), 2),
-                        'status': statuses[i % len(statuses)]
-                    })
-            elif table_name == 'customers':
-                columns = ['customer_id', 'first_name', 'last_name', 'phone', 'address']
-                first_names = ['John', 'Jane', 'Michael', 'Emily', 'David', 'Sarah', 'Robert', 'Lisa']
-                last_names = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Miller', 'Davis', 'Garcia']
-                for i in range(1, 11):
-                    rows.append({
-                        'customer_id': i,
-                        'first_name': first_names[i % len(first_names)],
-                        'last_name': last_names[i % len(last_names)],
-                        'phone': f'+1-555-{100 + i}-{1000 + i}',
-                        'address': f'{100 + i} Main St, City, Country'
-                    })
+        # 结果格式：objects（默认）/ arrays / columnar
+        try:
+            result_format = resolve_format(data.get('format'))
+        except ValueError as e:
+            self.send_json_response({'error': str(e), 'success': False}, 400)
+            return
+        
+        # 多目标并行执行：targets 为目标名称列表或通配模式，合并结果带有来源列，
+        # 可选的 orderBy / limit 在合并后的结果上生效
+        if data.get('targets') is not None:
+            try:
+                names = query_fanout.resolve_targets(data['targets'])
+                sql, params = resolve_statement(data)
+                limits = {name: limit_policy.resolve((user['id'], user['email']), name) for name in names}
+                result = query_fanout.execute(sql, params, targets=names, limits=limits, order_by=data.get('orderBy'),
+                                              limit=data.get('limit'), result_format=result_format,
+                                              admission=query_admission, user=user['id'])
+            except SQLExecutionError as e:
+                self.send_json_response(e.to_dict(), 400)
+                return
+            except (ValueError, TypeError, KeyError) as e:
+                self.send_json_response({'error': str(e), 'success': False}, 400)
+                return
+            self.send_json_response(result, 200 if result['success'] else 400)
+            return
+        
+        # 按目标和请求选择执行驱动：已配置的目标默认进程内执行（sqlite），可指定 driver 为 subprocess
+        # 在工作进程中执行；未配置的目标使用模拟驱动（mock）
+        try:
+            driver = query_drivers.resolve(target, data.get('driver'))
+            sql, params = resolve_statement(data)
+        except SQLExecutionError as e:
+            self.send_json_response(e.to_dict(), 400)
+            return
+        
+        limits = limit_policy.resolve((user['id'], user['email']), target)
+        # executionId 由客户端生成，执行期间可通过 DELETE /api/executions/<executionId> 取消
+        execution_id = f'{user["id"]}:{data["executionId"]}' if data.get('executionId') else None
+        
+        # 在慢查询统计中把语句指纹关联到保存的SQL片段
+        query_stats.note_snippet(sql, data.get('snippetId'))
+        
+        # 已物化的片段：SQL、参数和目标与刷新计划相同时直接返回物化的结果，不访问目标库
+        if (data.get('snippetId') and not data.get('explain') and not data.get('cursor')
+                and not wants_stream(data, self.headers.get('Accept'))
+                and not wants_binary(self.headers.get('Accept'))
+                and snippet_materializer.lookup(data['snippetId'], sql, params, target)):
+            try:
+                preview_limit = int(data.get('previewLimit') or SQL_PREVIEW_LIMIT)
+                result = snippet_materializer.read(
+                    data['snippetId'], limit=preview_limit if data.get('preview') else None,
+                    result_format=result_format
+                )
+            except (ValueError, TypeError) as e:
+                self.send_json_response({'error': str(e), 'success': False}, 400)
+                return
+            except (SnippetNotScheduledError, SQLExecutionError):
+                # 刚被取消或替换，按普通查询执行
+                result = None
+            if result is not None:
+                if data.get('preview'):
+                    result.update({'preview': True, 'previewLimit': preview_limit,
+                                   'truncated': result['rowCount'] > preview_limit,
+                                   'estimatedRowCount': result['rowCount'], 'estimateSource': 'exact'})
+                self.send_json_response(result)
+                return
+        
+        # 计划模式：返回 EXPLAIN QUERY PLAN 计划树和全表扫描警告
+        if data.get('explain'):
+            try:
+                result = driver.explain(sql, params, target=target, limits=limits, snippet_id=data.get('snippetId'))
+            except SQLExecutionError as e:
+                self.send_json_response(e.to_dict(), 400)
+                return
+            self.send_json_response(result)
+            return
+        
+        # 流式模式：分批读取并以NDJSON分块输出
+        if wants_stream(data, self.headers.get('Accept')):
+            try:
+                lines = ndjson_lines(driver, sql, params, target=target,
+                                     batch_size=SQL_STREAM_BATCH_SIZE, limits=limits)
+            except SQLExecutionError as e:
+                self.send_json_response(e.to_dict(), 400)
+                return
+            self.send_chunked_response(lines, NDJSON_MIMETYPE)
+            return
+        
+        # 二进制列式传输：Accept: application/vnd.sql-manager.columnar
+        if wants_binary(self.headers.get('Accept')):
+            try:
+                result = driver.execute(sql, params, target=target, limits=limits, result_format=FORMAT_COLUMNAR,
+                                        use_cache=data.get('cache', True), execution_id=execution_id)
+            except SQLExecutionError as e:
+                self.send_json_response(e.to_dict(), 400)
+                return
+            self.send_bytes_response(encode_result(result), BINARY_MIMETYPE)
+            return
+        
+        # 预览和游标模式依赖进程内的连接池，只用于 sqlite 驱动
+        # 预览模式：没有LIMIT的查询只取前 previewLimit 行，返回 truncated 标记和总行数估计
+        if data.get('preview') and driver.name == SQLITE:
+            try:
+                result = query_previews.run(
+                    sql, params, target=target, owner=user['id'], limit=data.get('previewLimit'),
+                    limits=limits, result_format=result_format
+                )
+            except SQLExecutionError as e:
+                self.send_json_response(e.to_dict(), 400)
+                return
+            except (ValueError, TypeError) as e:
+                self.send_json_response({'error': str(e), 'success': False}, 400)
+                return
+            self.send_json_response(result)
+            return
+        
+        # 游标模式：返回游标ID和第一页，之后通过 /api/results/<id> 翻页
+        if data.get('cursor') and driver.name == SQLITE:
+            try:
+                result = result_cursors.open(
+                    sql, params, target=target, owner=user['id'],
+                    page_size=data.get('pageSize', SQL_RESULT_PAGE_SIZE),
+                    limits=limits, result_format=result_format
+                )
+            except SQLExecutionError as e:
+                self.send_json_response(e.to_dict(), 400)
+                return
+            except (ValueError, TypeError) as e:
+                self.send_json_response({'error': str(e), 'success': False}, 400)
+                return
+            self.send_json_response(result)
+            return
+        
+        try:
+            result = driver.execute(sql, params, target=target, limits=limits, result_format=result_format,
+                                    use_cache=data.get('cache', True), execution_id=execution_id)
+        except SQLExecutionError as e:
+            self.send_json_response(e.to_dict(), 400)
+            return
+        self.send_json_response(result)
+
+    def handle_get_schema(self, query_params):
+        """目标库的表、视图、列和索引（按 schema_version 缓存的快照）"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        target = query_params.get('target', [DEFAULT_TARGET])[0]
+        
+        if not sql_engine.has_target(target):
+            self.send_json_response({'error': f'Unknown target database: {target}', 'success': False}, 400)
+            return
+        
+        try:
+            result = schema_catalog.describe(target)
+        except SQLExecutionError as e:
+            self.send_json_response(e.to_dict(), 400)
+            return
+        self.send_json_response(result)
+    
+    def handle_autocomplete(self, query_params):
+        """自动补全：prefix=ord 补全表/视图/列/索引名，prefix=orders.to 补全该表的列"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        target = query_params.get('target', [DEFAULT_TARGET])[0]
+        
+        if not sql_engine.has_target(target):
+            self.send_json_response({'error': f'Unknown target database: {target}', 'success': False}, 400)
+            return
+        
+        try:
+            limit = min(max(int(query_params.get('limit', [SQL_AUTOCOMPLETE_LIMIT])[0]), 1), 500)
+            result = schema_catalog.complete(query_params.get('prefix', [''])[0], target=target, limit=limit)
+        except ValueError as e:
+            self.send_json_response({'error': str(e), 'success': False}, 400)
+            return
+        except SQLExecutionError as e:
+            self.send_json_response(e.to_dict(), 400)
+            return
+        self.send_json_response(result)
+    
+    def handle_validate_sql(self, data):
+        """校验SQL（只编译不执行），返回语法错误和未知表/列及其位置"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        sql = data.get('sql', '')
+        
+        if not sql:
+            self.send_json_response({'message': 'Missing required fields'}, 400)
+            return
+        
+        target = data.get('target', DEFAULT_TARGET)
+        
+        if not sql_engine.has_target(target):
+            self.send_json_response({'error': f'Unknown target database: {target}', 'success': False}, 400)
+            return
+        
+        try:
+            result = sql_validator.validate(sql, target=target)
+        except SQLExecutionError as e:
+            self.send_json_response(e.to_dict(), 400)
+            return
+        self.send_json_response(result)
+    
+    def handle_execute_script(self, data, query_params):
+        """在单个事务中执行多语句脚本，逐条以NDJSON输出耗时和行数"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        script = data.get('script', '')
+        
+        if not script:
+            self.send_json_response({'message': 'Missing required fields'}, 400)
+            return
+        
+        target = data.get('target', query_params.get('target', [DEFAULT_TARGET])[0])
+        
+        if not sql_engine.has_target(target):
+            self.send_json_response({'error': f'Unknown target database: {target}', 'success': False}, 400)
+            return
+        
+        limits = limit_policy.resolve((user['id'], user['email']), target)
+        
+        try:
+            lines = script_lines(sql_engine, script, target=target, limits=limits)
+        except SQLExecutionError as e:
+            self.send_json_response(e.to_dict(), 400)
+            return
+        self.send_chunked_response(lines, NDJSON_MIMETYPE)
+    
+    def handle_execute_bulk(self, data):
+        """以executemany分批写入参数行
+
+        请求体为JSON {sql, rows: [...]}，或NDJSON（首行 {sql, ...}，之后每行一组参数）。
+        """
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        try:
+            if 'ndjson' in data:
+                rows = read_ndjson(data['ndjson'].splitlines())
+                data = next(rows, None) or {}
             else:
-                # 自定义表名，返回默认数据
-                columns = ['id', 'column1', 'column2', 'column3']
-                for i in range(1, 6):
-                    rows.append({
-                        'id': i,
-                        'column1': f'Value {i}-1',
-                        'column2': f'Value {i}-2',
-                        'column3': f'Value {i}-3'
-                    })
-            
-            self.send_json_response({
-                'columns': columns,
-                'rows': rows,
-                'success': True,
-                'message': f'Successfully executed query, returned {len(rows)} rows'
-            })
-        else:
-            # 模拟其他SQL语句执行
-            self.send_json_response({
-                'success': True,
-                'message': 'SQL statement executed successfully'
-            })
+                rows = data.get('rows') or []
+        except SQLExecutionError as e:
+            self.send_json_response(e.to_dict(), 400)
+            return
+        
+        if not data.get('sql'):
+            self.send_json_response({'message': 'Missing required fields'}, 400)
+            return
+        
+        target = data.get('target', DEFAULT_TARGET)
+        
+        if not sql_engine.has_target(target):
+            self.send_json_response({'error': f'Unknown target database: {target}', 'success': False}, 400)
+            return
+        
+        try:
+            batch_size = int(data.get('batchSize', SQL_BULK_BATCH_SIZE))
+        except (TypeError, ValueError):
+            self.send_json_response({'error': 'batchSize must be an integer', 'success': False}, 400)
+            return
+        batch_size = min(max(batch_size, 1), SQL_BULK_MAX_BATCH_SIZE)
+        limits = limit_policy.resolve((user['id'], user['email']), target)
+        
+        try:
+            result = sql_engine.execute_many(data['sql'], rows, target=target, batch_size=batch_size, limits=limits)
+        except SQLExecutionError as e:
+            self.send_json_response(e.to_dict(), 400)
+            return
+        self.send_json_response(result, 200 if result['success'] else 400)
+    
+    def handle_export_sql(self, data, query_params):
+        """执行查询并以CSV / TSV / JSONL文件流导出"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        sql = data.get('sql', '')
+        
+        if not sql:
+            self.send_json_response({'message': 'Missing required fields'}, 400)
+            return
+        
+        target = data.get('target', DEFAULT_TARGET)
+        
+        if not sql_engine.has_target(target):
+            self.send_json_response({'error': f'Unknown target database: {target}', 'success': False}, 400)
+            return
+        
+        try:
+            fmt = resolve_export_format(query_params.get('format', [data.get('format')])[0])
+        except ValueError as e:
+            self.send_json_response({'error': str(e), 'success': False}, 400)
+            return
+        
+        compress = query_params.get('gzip', [''])[0] in ('1', 'true') or bool(data.get('gzip'))
+        # 导出与异步任务相同，使用更长的超时而不是交互查询的超时
+        limits = limit_policy.resolve((user['id'], user['email']), target)._replace(timeout=SQL_JOB_TIMEOUT)
+        
+        try:
+            sql, params = resolve_statement(data)
+            chunks = export_chunks(sql_engine, sql, params, target=target, fmt=fmt,
+                                   compress=compress, batch_size=SQL_STREAM_BATCH_SIZE, limits=limits)
+        except SQLExecutionError as e:
+            self.send_json_response(e.to_dict(), 400)
+            return
+        
+        content_type, disposition = export_headers(fmt, compress)
+        self.send_chunked_response(chunks, content_type, headers={'Content-Disposition': disposition})
+    
+    def handle_get_result_page(self, cursor_id, query_params):
+        """读取结果游标的一页"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        try:
+            page = result_cursors.fetch(
+                cursor_id,
+                offset=query_params.get('offset', [0])[0],
+                limit=query_params.get('limit', [SQL_RESULT_PAGE_SIZE])[0],
+                owner=user['id'],
+                result_format=resolve_format(query_params.get('format', [None])[0])
+            )
+        except CursorNotFoundError as e:
+            self.send_json_response({'error': str(e), 'success': False}, 404)
+            return
+        except SQLExecutionError as e:
+            self.send_json_response(e.to_dict(), 400)
+            return
+        except ValueError as e:
+            self.send_json_response({'error': str(e), 'success': False}, 400)
+            return
+        
+        self.send_json_response(page)
+    
+    def handle_close_result_cursor(self, cursor_id):
+        """关闭结果游标"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        if not result_cursors.close(cursor_id, owner=user['id']):
+            self.send_json_response({'message': 'Result cursor not found'}, 404)
+            return
+        
+        self.send_json_response({'message': 'Result cursor closed successfully'})
+    
+    def handle_submit_job(self, data):
+        """提交异步查询任务"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        sql = data.get('sql', '')
+        
+        if not sql:
+            self.send_json_response({'message': 'Missing required fields'}, 400)
+            return
+        
+        target = data.get('target', DEFAULT_TARGET)
+        limits = limit_policy.resolve((user['id'], user['email']), target)
+        
+        try:
+            sql, params = resolve_statement(data)
+            job = query_jobs.submit(
+                sql, params, target=target, owner=user['id'],
+                limits=limits._replace(timeout=SQL_JOB_TIMEOUT)
+            )
+        except JobQueueFullError as e:
+            self.send_json_response({'error': str(e), 'success': False}, 429)
+            return
+        except SQLExecutionError as e:
+            self.send_json_response(e.to_dict(), 400)
+            return
+        
+        self.send_json_response(job.to_dict(limit=0), 202)
+    
+    def handle_get_job(self, job_id, query_params):
+        """查询任务状态及已读取的行"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        try:
+            job = query_jobs.get(job_id, owner=user['id'])
+            offset = max(int(query_params.get('offset', [0])[0]), 0)
+            limit = query_params.get('limit', [None])[0]
+            limit = max(int(limit), 0) if limit is not None else None
+            result_format = resolve_format(query_params.get('format', [None])[0])
+        except JobNotFoundError as e:
+            self.send_json_response({'error': str(e), 'success': False}, 404)
+            return
+        except ValueError as e:
+            self.send_json_response({'error': str(e), 'success': False}, 400)
+            return
+        
+        # 流式读取已缓冲的结果：?stream=1 或 Accept: application/x-ndjson
+        if wants_stream({'stream': query_params.get('stream', [''])[0] in ('1', 'true')}, self.headers.get('Accept')):
+            self.send_chunked_response(job_lines(job, offset, batch_size=SQL_STREAM_BATCH_SIZE), NDJSON_MIMETYPE)
+            return
+        
+        self.send_json_response(job.to_dict(offset, limit, result_format))
+    
+    def handle_cancel_job(self, job_id):
+        """取消任务"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        try:
+            job = query_jobs.cancel(job_id, owner=user['id'])
+        except JobNotFoundError as e:
+            self.send_json_response({'error': str(e), 'success': False}, 404)
+            return
+        
+        self.send_json_response(job.to_dict(limit=0))
+    
+    def handle_cancel_execution(self, execution_id):
+        """取消执行中的语句"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        if not query_drivers.cancel(f'{user["id"]}:{execution_id}'):
+            self.send_json_response({'message': 'Execution not found'}, 404)
+            return
+        
+        self.send_json_response({'message': 'Execution cancelled successfully'})
+    
+    def handle_get_cache_stats(self):
+        """查询结果缓存统计"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        self.send_json_response(result_cache.stats())
+    
+    def handle_clear_cache(self):
+        """清空查询结果缓存"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        removed = result_cache.invalidate()
+        self.send_json_response({'message': f'Cleared {removed} cached results'})
+    
+    def handle_get_coalescing_stats(self):
+        """合并执行统计：coalesced 为共享了进行中执行结果的请求数"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        if query_coalescer is None:
+            self.send_json_response({'enabled': False})
+            return
+        self.send_json_response(dict(query_coalescer.stats(), enabled=True))
+    
+    def handle_get_schedules(self):
+        """定时刷新的片段及物化统计"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        self.send_json_response(dict(snippet_materializer.stats(), schedules=snippet_materializer.list()))
+    
+    def handle_get_admission_stats(self):
+        """查询准入控制状态"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        self.send_json_response(query_admission.stats())
+    
+    def handle_get_driver_stats(self):
+        """执行驱动状态"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        self.send_json_response(query_drivers.stats())
+    
+    def handle_get_plan_stats(self):
+        """查询计划缓存统计"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        self.send_json_response(query_plans.stats())
+    
+    def handle_clear_plans(self):
+        """清空查询计划缓存"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        removed = query_plans.clear()
+        self.send_json_response({'message': f'Cleared {removed} cached plans'})
+    
+    def handle_get_slow_queries(self, query_params):
+        """按指纹聚合的执行统计（sort: total / max / count / mean）和最近的慢查询"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        try:
+            result = query_stats.report(sort=query_params.get('sort', ['total'])[0],
+                                        limit=int(query_params.get('limit', [50])[0]))
+        except ValueError as e:
+            self.send_json_response({'error': str(e), 'success': False}, 400)
+            return
+        self.send_json_response(result)
+    
+    def handle_clear_slow_queries(self):
+        """清空查询指纹统计和慢查询日志"""
+        user = self.get_current_user()
+        
+        if not user:
+            self.send_json_response({'message': 'Authentication required'}, 401)
+            return
+        
+        removed = query_stats.clear()
+        self.send_json_response({'message': f'Cleared statistics for {removed} query fingerprints'})
 
 def get_current_pip_version():
     """获取当前pip版本"""
@@ -1339,7 +2236,8 @@ def main():
     print("按 Ctrl+C 停止服务器")
     
     try:
-        server = HTTPServer(('', PORT), SQLManagerHandler)
+        # 多线程处理请求，排队等待准入的请求不阻塞其他请求
+        server = ThreadingHTTPServer(('', PORT), SQLManagerHandler)
         server.serve_forever()
     except KeyboardInterrupt:
         print("\n服务器已停止")
@@ -1,18 +1,39 @@
 import os
 import json
 import uuid
-import re
 from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
+from flask.json import JSONEncoder
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 from functools import wraps
 import datetime as dt
+from sql_engine import (
+    BINARY_MIMETYPE, DEFAULT_TARGET, FORMAT_COLUMNAR, NDJSON_MIMETYPE, SQLITE,
+    SQL_SCRIPT_MIMETYPES, AdmissionController, AdmissionRejectedError, CursorNotFoundError,
+    CursorRegistry, DemoDataGenerator, DriverRegistry, FanOutExecutor, JobManager,
+    JobNotFoundError, JobQueueFullError, LimitPolicy, MemoryBudget, MockDriver, PlanCache,
+    PreviewRunner, QueryCoalescer, QueryLimits, QueryStats, ResultCache, SQLEngine,
+    SQLExecutionError, SQLValidator, SQLiteDriver, SchemaCatalog, SnippetMaterializer,
+    SnippetNotScheduledError, SubprocessDriver, encode_result, export_chunks, export_headers,
+    job_lines, json_default, ndjson_lines, read_ndjson, resolve_export_format, resolve_format,
+    resolve_statement, script_lines, targets_from_env, wants_binary, wants_stream
+)
+
+class ResultJSONEncoder(JSONEncoder):
+    """查询结果中的BLOB等Flask无法编码的值按 json_default 编码（与流式输出一致）"""
+    
+    def default(self, o):
+        try:
+            return super().default(o)
+        except TypeError:
+            return json_default(o)
 
 # 初始化Flask应用
 app = Flask(__name__, static_folder='../sql-manager', static_url_path='')
+app.json_encoder = ResultJSONEncoder
 CORS(app)
 
 # 配置SQLite数据库（不依赖pyodbc）
@@ -20,9 +41,140 @@ app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///sql_manager.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = 'your-secure-secret-key-here-keep-it-safe'  # 建议使用环境变量
 
+# SQL执行引擎配置：目标数据库（名称 -> SQLite文件），未配置时execute-sql返回模拟数据
+app.config['SQL_TARGETS'] = targets_from_env()
+app.config['SQL_DEMO_SEED'] = 42  # 模拟数据生成器的种子
+app.config['SQL_MOCK_ROWS'] = 10  # 未配置目标数据库时模拟查询返回的行数
+app.config['SQL_READ_POOL_SIZE'] = 5  # 只读查询使用的 mode=ro 连接数
+app.config['SQL_WRITE_POOL_SIZE'] = 1  # 写入语句使用的连接数，默认单个写连接
+app.config['SQL_JOURNAL_MODE'] = 'wal'  # WAL模式下读连接不与写事务争用锁
+app.config['SQL_STREAM_BATCH_SIZE'] = 500
+app.config['SQL_RESULT_PAGE_SIZE'] = 100
+app.config['SQL_CURSOR_IDLE_TTL'] = 300  # 秒，超时未访问的结果游标被回收
+app.config['SQL_CURSOR_MAX_OPEN'] = 50
+app.config['SQL_CACHE_MAX_BYTES'] = 64 * 1024 * 1024
+app.config['SQL_CACHE_TTL'] = 60  # 秒
+app.config['SQL_COALESCE_QUERIES'] = True  # 相同的只读查询正在执行时共享其结果，不重复执行
+app.config['SQL_JOB_WORKERS'] = 4
+app.config['SQL_JOB_MAX_PENDING'] = 100
+app.config['SQL_JOB_RESULT_TTL'] = 600  # 秒，已结束任务的结果保留时间
+app.config['SQL_JOB_TIMEOUT'] = 3600  # 秒，异步任务使用更长的超时
+app.config['SQL_BUFFER_MEMORY_BYTES'] = 256 * 1024 * 1024  # 所有任务结果在内存中的总预算
+app.config['SQL_BUFFER_REQUEST_BYTES'] = 16 * 1024 * 1024  # 单个任务结果在内存中的预算，超出后溢出到磁盘
+app.config['SQL_SPILL_DIR'] = None  # 溢出文件目录，None表示系统临时目录
+app.config['SQL_BULK_BATCH_SIZE'] = 1000  # 批量写入每个事务的行数
+app.config['SQL_BULK_MAX_BATCH_SIZE'] = 50000
+app.config['SQL_MAX_CONCURRENT_QUERIES'] = 8  # 同时执行的查询总数上限
+app.config['SQL_MAX_USER_QUERIES'] = 2  # 每个用户同时执行的查询数上限
+app.config['SQL_ADMISSION_QUEUE_SIZE'] = 50  # 等待执行的交互请求总数上限，超出返回429
+app.config['SQL_ADMISSION_USER_QUEUE_SIZE'] = 4  # 每个用户等待执行的交互请求上限
+app.config['SQL_ADMISSION_TIMEOUT'] = 10  # 秒，交互请求最长等待时间
+app.config['SQL_DEFAULT_DRIVER'] = 'sqlite'  # 已配置目标默认使用的执行驱动：sqlite（进程内）/ subprocess（工作进程）
+app.config['SQL_TARGET_DRIVERS'] = {}  # 目标名称 -> 驱动名称
+app.config['SQL_SUBPROCESS_WORKERS'] = 2  # 同时运行的工作进程数上限
+app.config['SQL_SUBPROCESS_MEMORY_BYTES'] = None  # 工作进程的地址空间上限（仅POSIX），None表示不限制
+app.config['SQL_FANOUT_WORKERS'] = 8  # 多目标并行执行的工作线程数
+app.config['SQL_PLAN_CACHE_SIZE'] = 512
+app.config['SQL_VALIDATION_CACHE_SIZE'] = 2048  # 缓存的校验结论条数
+app.config['SQL_AUTOCOMPLETE_LIMIT'] = 50  # 自动补全默认返回的条数
+app.config['SQL_PLAN_LARGE_TABLE_ROWS'] = 10000  # 超过该行数的表被全表扫描时给出警告
+app.config['SQL_PREVIEW_LIMIT'] = 1000  # 预览模式下没有LIMIT的查询最多返回的行数
+app.config['SQL_PREVIEW_COUNT_CAP'] = 1000000  # 预览被截断时后台COUNT(*)最多数到的行数
+app.config['SQL_MATERIALIZED_DB'] = 'sql_materialized.db'  # 定时刷新的片段结果保存在该SQLite文件中
+app.config['SQL_MATERIALIZE_TIMEOUT'] = 600  # 秒，单次刷新的超时
+app.config['SQL_MATERIALIZE_MAX_ROWS'] = 100000  # 单个片段最多物化的行数，超出时刷新失败并保留上一次的结果
+app.config['SQL_SLOW_QUERY_MS'] = 500  # 超过该耗时的语句写入慢查询日志
+app.config['SQL_SLOW_QUERY_LOG'] = os.environ.get('SQL_SLOW_QUERY_LOG')  # 慢查询日志文件（JSON行），None表示只保存在内存
+app.config['SQL_QUERY_STATS_MAX_FINGERPRINTS'] = 1000
+# 单条语句执行预算：timeout（秒）/ maxRows / maxVmSteps，None表示不限制
+app.config['SQL_LIMITS'] = {'timeout': 60, 'maxRows': None, 'maxVmSteps': None}
+app.config['SQL_TARGET_LIMITS'] = {}  # 目标名称 -> 预算
+app.config['SQL_USER_LIMITS'] = {}  # 用户ID/邮箱（或 '用户:目标'）-> 预算
+
 # 初始化数据库
 db = SQLAlchemy(app)
 
+# 初始化SQL执行引擎
+demo_data = DemoDataGenerator(seed=app.config['SQL_DEMO_SEED'])
+result_cache = ResultCache(max_bytes=app.config['SQL_CACHE_MAX_BYTES'], ttl=app.config['SQL_CACHE_TTL'])
+query_coalescer = QueryCoalescer() if app.config['SQL_COALESCE_QUERIES'] else None
+query_stats = QueryStats(
+    slow_threshold_ms=app.config['SQL_SLOW_QUERY_MS'],
+    max_fingerprints=app.config['SQL_QUERY_STATS_MAX_FINGERPRINTS'],
+    log_path=app.config['SQL_SLOW_QUERY_LOG']
+)
+sql_engine = SQLEngine(
+    app.config['SQL_TARGETS'],
+    read_pool_size=app.config['SQL_READ_POOL_SIZE'],
+    write_pool_size=app.config['SQL_WRITE_POOL_SIZE'],
+    journal_mode=app.config['SQL_JOURNAL_MODE'],
+    result_cache=result_cache,
+    query_stats=query_stats,
+    coalescer=query_coalescer
+)
+result_cursors = CursorRegistry(
+    sql_engine,
+    idle_ttl=app.config['SQL_CURSOR_IDLE_TTL'],
+    max_open=app.config['SQL_CURSOR_MAX_OPEN']
+)
+limit_policy = LimitPolicy(
+    app.config['SQL_LIMITS'],
+    per_target=app.config['SQL_TARGET_LIMITS'],
+    per_user=app.config['SQL_USER_LIMITS']
+)
+result_memory = MemoryBudget(app.config['SQL_BUFFER_MEMORY_BYTES'])
+query_admission = AdmissionController(
+    max_concurrent=app.config['SQL_MAX_CONCURRENT_QUERIES'],
+    max_per_user=app.config['SQL_MAX_USER_QUERIES'],
+    max_queue=app.config['SQL_ADMISSION_QUEUE_SIZE'],
+    max_user_queue=app.config['SQL_ADMISSION_USER_QUEUE_SIZE'],
+    queue_timeout=app.config['SQL_ADMISSION_TIMEOUT']
+)
+query_jobs = JobManager(
+    sql_engine,
+    max_workers=app.config['SQL_JOB_WORKERS'],
+    max_pending=app.config['SQL_JOB_MAX_PENDING'],
+    result_ttl=app.config['SQL_JOB_RESULT_TTL'],
+    memory_budget=result_memory,
+    buffer_memory_bytes=app.config['SQL_BUFFER_REQUEST_BYTES'],
+    spill_dir=app.config['SQL_SPILL_DIR'],
+    admission=query_admission
+)
+query_plans = PlanCache(
+    sql_engine,
+    max_entries=app.config['SQL_PLAN_CACHE_SIZE'],
+    large_table_rows=app.config['SQL_PLAN_LARGE_TABLE_ROWS']
+)
+query_drivers = DriverRegistry(
+    sql_engine,
+    [
+        MockDriver(demo_data, rows=app.config['SQL_MOCK_ROWS']),
+        SQLiteDriver(sql_engine, plans=query_plans),
+        SubprocessDriver(
+            sql_engine,
+            max_workers=app.config['SQL_SUBPROCESS_WORKERS'],
+            memory_limit=app.config['SQL_SUBPROCESS_MEMORY_BYTES']
+        )
+    ],
+    default=app.config['SQL_DEFAULT_DRIVER'],
+    target_drivers=app.config['SQL_TARGET_DRIVERS']
+)
+schema_catalog = SchemaCatalog(sql_engine)
+sql_validator = SQLValidator(sql_engine, max_entries=app.config['SQL_VALIDATION_CACHE_SIZE'])
+query_fanout = FanOutExecutor(sql_engine, max_workers=app.config['SQL_FANOUT_WORKERS'])
+query_previews = PreviewRunner(
+    sql_engine,
+    jobs=query_jobs,
+    limit=app.config['SQL_PREVIEW_LIMIT'],
+    count_cap=app.config['SQL_PREVIEW_COUNT_CAP']
+)
+snippet_materializer = SnippetMaterializer(
+    sql_engine,
+    app.config['SQL_MATERIALIZED_DB'],
+    admission=query_admission,
+    limits=QueryLimits(timeout=app.config['SQL_MATERIALIZE_TIMEOUT'], max_rows=app.config['SQL_MATERIALIZE_MAX_ROWS'])
+)
+
 # JWT认证装饰器
 def token_required(f):
     @wraps(f)
@@ -56,6 +208,33 @@ def token_required(f):
     
     return decorated
 
+# 查询准入控制装饰器（放在 token_required 之后）：超出并发上限时排队等待，
+# 队列已满或等待超时返回429和Retry-After
+def admission_required(f):
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        try:
+            ticket = query_admission.acquire(current_user.id)
+        except AdmissionRejectedError as e:
+            response = jsonify(e.to_dict())
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 429
+        
+        try:
+            response = app.make_response(f(current_user, *args, **kwargs))
+        except BaseException:
+            ticket.release()
+            raise
+        
+        # 流式响应发送完毕后才归还名额
+        if response.is_streamed:
+            response.call_on_close(ticket.release)
+        else:
+            ticket.release()
+        return response
+    
+    return decorated
+
 # 数据库模型
 class User(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
@@ -302,6 +481,10 @@ def update_sql_snippet(current_user, snippet_id):
     
     db.session.commit()
     
+    # 已设置定时刷新的片段按新内容重新物化
+    if 'content' in data:
+        snippet_materializer.update_content(snippet_id, snippet.content)
+    
     return jsonify(snippet.to_dict()), 200
 
 @app.route('/api/sql-snippets/<snippet_id>', methods=['DELETE'])
@@ -322,8 +505,97 @@ def delete_sql_snippet(current_user, snippet_id):
     db.session.delete(snippet)
     db.session.commit()
     
+    snippet_materializer.unschedule(snippet_id)
+    
     return jsonify({'message': 'SQL snippet deleted successfully'}), 200
 
+# 片段定时刷新路由：按计划在后台执行片段并物化结果，读取时直接返回物化的结果
+# 请求体：{"interval": 秒} 或 {"cron": "*/15 * * * *"}，可选 target / templateParams / params
+@app.route('/api/sql-snippets/<snippet_id>/schedule', methods=['POST'])
+@token_required
+def schedule_sql_snippet(current_user, snippet_id):
+    snippet = SqlSnippet.query.get(snippet_id)
+    
+    if not snippet:
+        return jsonify({'message': 'SQL snippet not found'}), 404
+    
+    # 检查权限
+    if snippet.created_by != current_user.id:
+        return jsonify({'message': 'You do not have permission to schedule this snippet'}), 403
+    
+    data = request.get_json()
+    
+    if data.get('interval') is not None:
+        schedule = f'every {data["interval"]}'
+    elif data.get('cron'):
+        schedule = data['cron']
+    else:
+        return jsonify({'message': 'Missing interval or cron'}), 400
+    
+    try:
+        result = snippet_materializer.schedule(
+            snippet_id, snippet.content, schedule, target=data.get('target', DEFAULT_TARGET),
+            owner=current_user.id, template_params=data.get('templateParams'), params=data.get('params')
+        )
+    except SQLExecutionError as e:
+        return jsonify(e.to_dict()), 400
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+    return jsonify(result), 200
+
+@app.route('/api/sql-snippets/<snippet_id>/schedule', methods=['GET'])
+@token_required
+def get_snippet_schedule(current_user, snippet_id):
+    result = snippet_materializer.get(snippet_id)
+    if result is None:
+        return jsonify({'message': 'Snippet has no refresh schedule'}), 404
+    return jsonify(result), 200
+
+@app.route('/api/sql-snippets/<snippet_id>/schedule', methods=['DELETE'])
+@token_required
+def unschedule_sql_snippet(current_user, snippet_id):
+    snippet = SqlSnippet.query.get(snippet_id)
+    
+    if snippet and snippet.created_by != current_user.id:
+        return jsonify({'message': 'You do not have permission to unschedule this snippet'}), 403
+    
+    if not snippet_materializer.unschedule(snippet_id):
+        return jsonify({'message': 'Snippet has no refresh schedule'}), 404
+    return jsonify({'message': 'Refresh schedule removed'}), 200
+
+# 立即刷新（同步执行，返回刷新后的状态）
+@app.route('/api/sql-snippets/<snippet_id>/refresh', methods=['POST'])
+@token_required
+def refresh_sql_snippet(current_user, snippet_id):
+    snippet = SqlSnippet.query.get(snippet_id)
+    
+    if snippet and snippet.created_by != current_user.id:
+        return jsonify({'message': 'You do not have permission to refresh this snippet'}), 403
+    
+    try:
+        result = snippet_materializer.refresh_now(snippet_id)
+    except SnippetNotScheduledError as e:
+        return jsonify({'message': str(e)}), 404
+    return jsonify(result), 200 if result['error'] is None else 400
+
+# 读取物化结果：?offset=0&limit=100&format=arrays，响应带有 refreshedAt / ageSeconds
+@app.route('/api/sql-snippets/<snippet_id>/materialized', methods=['GET'])
+@token_required
+def get_materialized_snippet(current_user, snippet_id):
+    try:
+        limit = request.args.get('limit')
+        result = snippet_materializer.read(
+            snippet_id, offset=int(request.args.get('offset', 0)), limit=int(limit) if limit else None,
+            result_format=resolve_format(request.args.get('format'))
+        )
+    except SnippetNotScheduledError as e:
+        return jsonify({'message': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+    except SQLExecutionError as e:
+        return jsonify(e.to_dict()), 400
+    return jsonify(result), 200
+
 # Category路由
 @app.route('/api/categories', methods=['GET'])
 @token_required
@@ -475,6 +747,7 @@ def delete_comment(current_user, comment_id):
 # SQL执行路由
 @app.route('/api/execute-sql', methods=['POST'])
 @token_required
+@admission_required
 def execute_sql(current_user):
     data = request.get_json()
     
@@ -482,93 +755,440 @@ def execute_sql(current_user):
         return jsonify({'message': 'Missing required fields'}), 400
     
     sql = data['sql']
-    lower_sql = sql.lower()
-    
-    # 模拟错误
-    if 'error' in lower_sql:
-        return jsonify({
-            'error': '模拟错误: 这是一个测试错误',
-            'success': False
-        }), 400
-    
-    # 模拟SELECT语句
-    if lower_sql.startswith('select'):
-        # 尝试解析表名
-        table_name = 'users'  # 默认表名
-        from_match = re.search(r'from\s+(\w+)', lower_sql)
-        if from_match and from_match.group(1):
-            table_name = from_match.group(1)
-        
-        # 根据不同表名返回不同数据
-        columns = []
-        rows = []
-        
-        if table_name == 'users':
-            columns = ['id', 'name', 'email', 'created_at']
-            for i in range(1, 11):
-                rows.append({
-                    'id': i,
-                    'name': f'User {i}',
-                    'email': f'user{i}@example.com',
-                    'created_at': (datetime.now() - dt.timedelta(days=30 * i)).isoformat()
-                })
-        elif table_name == 'products':
-            columns = ['id', 'product_name', 'price', 'stock', 'category']
-            categories = ['Electronics', 'Books', 'Clothing', 'Home', 'Beauty']
-            for i in range(1, 11):
-                rows.append({
-                    'id': i,
-                    'product_name': f'Product {i}',
-                    'price': round(10 + (i * 10.5), 2),
-                    'stock': 100 - i,
-                    'category': categories[i % len(categories)]
-                })
-        elif table_name == 'orders':
-            columns = ['id', 'user_id', 'order_date', 'total_amount', 'status']
-            statuses = ['Pending', 'Processing', 'Shipped', 'Delivered', 'Cancelled']
-            for i in range(1, 11):
-                rows.append({
-                    'id': i,
-                    'user_id': (i % 5) + 1,
-                    'order_date': (datetime.now() - dt.timedelta(days=i)).isoformat(),
-                    'total_amount': round(100 + (i * 20.5), 2),
-                    'status': statuses[i % len(statuses)]
-                })
-        elif table_name == 'customers':
-            columns = ['customer_id', 'first_name', 'last_name', 'phone', 'address']
-            first_names = ['John', 'Jane', 'Michael', 'Emily', 'David', 'Sarah', 'Robert', 'Lisa']
-            last_names = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Miller', 'Davis', 'Garcia']
-            for i in range(1, 11):
-                rows.append({
-                    'customer_id': i,
-                    'first_name': first_names[i % len(first_names)],
-                    'last_name': last_names[i % len(last_names)],
-                    'phone': f'+1-555-{100 + i}-{1000 + i}',
-                    'address': f'{100 + i} Main St, City, Country'
-                })
-        else:
-            # 自定义表名，返回默认数据
-            columns = ['id', 'column1', 'column2', 'column3']
-            for i in range(1, 6):
-                rows.append({
-                    'id': i,
-                    'column1': f'Value {i}-1',
-                    'column2': f'Value {i}-2',
-                    'column3': f'Value {i}-3'
-                })
-        
-        return jsonify({
-            'columns': columns,
-            'rows': rows,
-            'success': True,
-            'message': f'Successfully executed query, returned {len(rows)} rows'
-        }), 200
+    target = data.get('target', DEFAULT_TARGET)
+    
+    # 结果格式：objects（默认）/ arrays / columnar
+    try:
+        result_format = resolve_format(data.get('format'))
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+    
+    # 多目标并行执行：targets 为目标名称列表或通配模式，合并结果带有来源列，
+    # 可选的 orderBy / limit 在合并后的结果上生效
+    if data.get('targets') is not None:
+        try:
+            names = query_fanout.resolve_targets(data['targets'])
+            sql, params = resolve_statement(data)
+            limits = {name: limit_policy.resolve((current_user.id, current_user.email), name) for name in names}
+            result = query_fanout.execute(sql, params, targets=names, limits=limits, order_by=data.get('orderBy'),
+                                          limit=data.get('limit'), result_format=result_format,
+                                          admission=query_admission, user=current_user.id)
+        except SQLExecutionError as e:
+            return jsonify(e.to_dict()), 400
+        except (ValueError, TypeError, KeyError) as e:
+            return jsonify({'error': str(e), 'success': False}), 400
+        return jsonify(result), 200 if result['success'] else 400
+    
+    # 按目标和请求选择执行驱动：已配置的目标默认进程内执行（sqlite），可指定 driver 为 subprocess
+    # 在工作进程中执行；未配置的目标使用模拟驱动（mock）
+    try:
+        driver = query_drivers.resolve(target, data.get('driver'))
+        sql, params = resolve_statement(data)
+    except SQLExecutionError as e:
+        return jsonify(e.to_dict()), 400
+    
+    limits = limit_policy.resolve((current_user.id, current_user.email), target)
+    # executionId 由客户端生成，执行期间可通过 DELETE /api/executions/<executionId> 取消
+    execution_id = f'{current_user.id}:{data["executionId"]}' if data.get('executionId') else None
+    
+    # 在慢查询统计中把语句指纹关联到保存的SQL片段
+    query_stats.note_snippet(sql, data.get('snippetId'))
+    
+    # 已物化的片段：SQL、参数和目标与刷新计划相同时直接返回物化的结果，不访问目标库
+    if (data.get('snippetId') and not data.get('explain') and not data.get('cursor')
+            and not wants_stream(data, request.headers.get('Accept'))
+            and not wants_binary(request.headers.get('Accept'))
+            and snippet_materializer.lookup(data['snippetId'], sql, params, target)):
+        try:
+            preview_limit = int(data.get('previewLimit') or app.config['SQL_PREVIEW_LIMIT'])
+            result = snippet_materializer.read(
+                data['snippetId'], limit=preview_limit if data.get('preview') else None, result_format=result_format
+            )
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e), 'success': False}), 400
+        except (SnippetNotScheduledError, SQLExecutionError):
+            # 刚被取消或替换，按普通查询执行
+            result = None
+        if result is not None:
+            if data.get('preview'):
+                result.update({'preview': True, 'previewLimit': preview_limit,
+                               'truncated': result['rowCount'] > preview_limit,
+                               'estimatedRowCount': result['rowCount'], 'estimateSource': 'exact'})
+            return jsonify(result), 200
+    
+    # 计划模式：返回 EXPLAIN QUERY PLAN 计划树和全表扫描警告
+    if data.get('explain'):
+        try:
+            result = driver.explain(sql, params, target=target, limits=limits, snippet_id=data.get('snippetId'))
+        except SQLExecutionError as e:
+            return jsonify(e.to_dict()), 400
+        return jsonify(result), 200
+    
+    # 流式模式：分批读取并以NDJSON分块输出
+    if wants_stream(data, request.headers.get('Accept')):
+        try:
+            lines = ndjson_lines(driver, sql, params, target=target,
+                                 batch_size=app.config['SQL_STREAM_BATCH_SIZE'], limits=limits)
+        except SQLExecutionError as e:
+            return jsonify(e.to_dict()), 400
+        return Response(lines, mimetype=NDJSON_MIMETYPE)
+    
+    # 二进制列式传输：Accept: application/vnd.sql-manager.columnar
+    if wants_binary(request.headers.get('Accept')):
+        try:
+            result = driver.execute(sql, params, target=target, limits=limits, result_format=FORMAT_COLUMNAR,
+                                    use_cache=data.get('cache', True), execution_id=execution_id)
+        except SQLExecutionError as e:
+            return jsonify(e.to_dict()), 400
+        return Response(encode_result(result), mimetype=BINARY_MIMETYPE)
+    
+    # 预览和游标模式依赖进程内的连接池，只用于 sqlite 驱动
+    # 预览模式：没有LIMIT的查询只取前 previewLimit 行，返回 truncated 标记和总行数估计
+    if data.get('preview') and driver.name == SQLITE:
+        try:
+            result = query_previews.run(
+                sql, params, target=target, owner=current_user.id, limit=data.get('previewLimit'),
+                limits=limits, result_format=result_format
+            )
+        except SQLExecutionError as e:
+            return jsonify(e.to_dict()), 400
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e), 'success': False}), 400
+        return jsonify(result), 200
+    
+    # 游标模式：返回游标ID和第一页，之后通过 /api/results/<id> 翻页
+    if data.get('cursor') and driver.name == SQLITE:
+        try:
+            result = result_cursors.open(
+                sql, params, target=target, owner=current_user.id,
+                page_size=data.get('pageSize', app.config['SQL_RESULT_PAGE_SIZE']),
+                limits=limits, result_format=result_format
+            )
+        except SQLExecutionError as e:
+            return jsonify(e.to_dict()), 400
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e), 'success': False}), 400
+        return jsonify(result), 200
+    
+    try:
+        result = driver.execute(sql, params, target=target, limits=limits, result_format=result_format,
+                                use_cache=data.get('cache', True), execution_id=execution_id)
+    except SQLExecutionError as e:
+        return jsonify(e.to_dict()), 400
+    return jsonify(result), 200
+
+# SQL校验路由：只编译不执行，返回语法错误和未知表/列及其位置，不占执行名额
+@app.route('/api/validate-sql', methods=['POST'])
+@token_required
+def validate_sql(current_user):
+    data = request.get_json()
+    
+    if not 'sql' in data:
+        return jsonify({'message': 'Missing required fields'}), 400
+    
+    target = data.get('target', DEFAULT_TARGET)
+    
+    if not sql_engine.has_target(target):
+        return jsonify({'error': f'Unknown target database: {target}', 'success': False}), 400
+    
+    try:
+        result = sql_validator.validate(data['sql'], target=target)
+    except SQLExecutionError as e:
+        return jsonify(e.to_dict()), 400
+    return jsonify(result), 200
+
+# schema路由：目标库的表、视图、列和索引（按 schema_version 缓存的快照）
+@app.route('/api/schema', methods=['GET'])
+@token_required
+def get_schema(current_user):
+    target = request.args.get('target', DEFAULT_TARGET)
+    
+    if not sql_engine.has_target(target):
+        return jsonify({'error': f'Unknown target database: {target}', 'success': False}), 400
+    
+    try:
+        result = schema_catalog.describe(target)
+    except SQLExecutionError as e:
+        return jsonify(e.to_dict()), 400
+    return jsonify(result), 200
+
+# 自动补全路由：?prefix=ord 补全表/视图/列/索引名，?prefix=orders.to 补全该表的列
+@app.route('/api/autocomplete', methods=['GET'])
+@token_required
+def autocomplete(current_user):
+    target = request.args.get('target', DEFAULT_TARGET)
+    
+    if not sql_engine.has_target(target):
+        return jsonify({'error': f'Unknown target database: {target}', 'success': False}), 400
+    
+    try:
+        limit = min(max(int(request.args.get('limit', app.config['SQL_AUTOCOMPLETE_LIMIT'])), 1), 500)
+        result = schema_catalog.complete(request.args.get('prefix', ''), target=target, limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+    except SQLExecutionError as e:
+        return jsonify(e.to_dict()), 400
+    return jsonify(result), 200
+
+# 多语句脚本执行路由：JSON {script} 或直接上传 .sql 文件（Content-Type: application/sql）
+@app.route('/api/execute-script', methods=['POST'])
+@token_required
+@admission_required
+def execute_script(current_user):
+    if request.mimetype in SQL_SCRIPT_MIMETYPES:
+        data = {'script': request.get_data(as_text=True)}
     else:
-        # 模拟其他SQL语句执行
-        return jsonify({
-            'success': True,
-            'message': 'SQL statement executed successfully'
-        }), 200
+        data = request.get_json()
+    
+    if not data.get('script'):
+        return jsonify({'message': 'Missing required fields'}), 400
+    
+    target = data.get('target', request.args.get('target', DEFAULT_TARGET))
+    
+    if not sql_engine.has_target(target):
+        return jsonify({'error': f'Unknown target database: {target}', 'success': False}), 400
+    
+    limits = limit_policy.resolve((current_user.id, current_user.email), target)
+    
+    try:
+        lines = script_lines(sql_engine, data['script'], target=target, limits=limits)
+    except SQLExecutionError as e:
+        return jsonify(e.to_dict()), 400
+    return Response(lines, mimetype=NDJSON_MIMETYPE)
+
+# 批量写入路由：JSON {sql, rows: [...]}，或NDJSON（首行 {sql, ...}，之后每行一组参数）
+@app.route('/api/execute-bulk', methods=['POST'])
+@token_required
+@admission_required
+def execute_bulk(current_user):
+    try:
+        if request.mimetype == NDJSON_MIMETYPE:
+            rows = read_ndjson(request.stream)
+            data = next(rows, None) or {}
+        else:
+            data = request.get_json()
+            rows = data.get('rows') or []
+    except SQLExecutionError as e:
+        return jsonify(e.to_dict()), 400
+    
+    if not data.get('sql'):
+        return jsonify({'message': 'Missing required fields'}), 400
+    
+    target = data.get('target', DEFAULT_TARGET)
+    
+    if not sql_engine.has_target(target):
+        return jsonify({'error': f'Unknown target database: {target}', 'success': False}), 400
+    
+    try:
+        batch_size = int(data.get('batchSize', app.config['SQL_BULK_BATCH_SIZE']))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'batchSize must be an integer', 'success': False}), 400
+    batch_size = min(max(batch_size, 1), app.config['SQL_BULK_MAX_BATCH_SIZE'])
+    limits = limit_policy.resolve((current_user.id, current_user.email), target)
+    
+    try:
+        result = sql_engine.execute_many(data['sql'], rows, target=target, batch_size=batch_size, limits=limits)
+    except SQLExecutionError as e:
+        return jsonify(e.to_dict()), 400
+    return jsonify(result), 200 if result['success'] else 400
+
+# 服务端导出路由：?format=csv|tsv|jsonl&gzip=1
+@app.route('/api/execute-sql/export', methods=['POST'])
+@token_required
+@admission_required
+def export_sql(current_user):
+    data = request.get_json()
+    
+    if not 'sql' in data:
+        return jsonify({'message': 'Missing required fields'}), 400
+    
+    target = data.get('target', DEFAULT_TARGET)
+    
+    if not sql_engine.has_target(target):
+        return jsonify({'error': f'Unknown target database: {target}', 'success': False}), 400
+    
+    try:
+        fmt = resolve_export_format(request.args.get('format', data.get('format')))
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+    
+    compress = request.args.get('gzip') in ('1', 'true') or bool(data.get('gzip'))
+    # 导出与异步任务相同，使用更长的超时而不是交互查询的超时
+    limits = limit_policy.resolve((current_user.id, current_user.email), target)._replace(
+        timeout=app.config['SQL_JOB_TIMEOUT']
+    )
+    
+    try:
+        sql, params = resolve_statement(data)
+        chunks = export_chunks(sql_engine, sql, params, target=target, fmt=fmt,
+                               compress=compress, batch_size=app.config['SQL_STREAM_BATCH_SIZE'],
+                               limits=limits)
+    except SQLExecutionError as e:
+        return jsonify(e.to_dict()), 400
+    
+    content_type, disposition = export_headers(fmt, compress)
+    return Response(chunks, content_type=content_type, headers={'Content-Disposition': disposition})
+
+# 结果游标翻页路由
+@app.route('/api/results/<cursor_id>', methods=['GET'])
+@token_required
+def get_result_page(current_user, cursor_id):
+    try:
+        page = result_cursors.fetch(
+            cursor_id,
+            offset=request.args.get('offset', 0),
+            limit=request.args.get('limit', app.config['SQL_RESULT_PAGE_SIZE']),
+            owner=current_user.id,
+            result_format=resolve_format(request.args.get('format'))
+        )
+    except CursorNotFoundError as e:
+        return jsonify({'error': str(e), 'success': False}), 404
+    except SQLExecutionError as e:
+        return jsonify(e.to_dict()), 400
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+    
+    return jsonify(page), 200
+
+@app.route('/api/results/<cursor_id>', methods=['DELETE'])
+@token_required
+def close_result_cursor(current_user, cursor_id):
+    if not result_cursors.close(cursor_id, owner=current_user.id):
+        return jsonify({'message': 'Result cursor not found'}), 404
+    
+    return jsonify({'message': 'Result cursor closed successfully'}), 200
+
+# 异步查询任务路由
+@app.route('/api/jobs', methods=['POST'])
+@token_required
+def submit_job(current_user):
+    data = request.get_json()
+    
+    if not 'sql' in data:
+        return jsonify({'message': 'Missing required fields'}), 400
+    
+    target = data.get('target', DEFAULT_TARGET)
+    limits = limit_policy.resolve((current_user.id, current_user.email), target)
+    
+    try:
+        sql, params = resolve_statement(data)
+        job = query_jobs.submit(
+            sql, params, target=target, owner=current_user.id,
+            limits=limits._replace(timeout=app.config['SQL_JOB_TIMEOUT'])
+        )
+    except JobQueueFullError as e:
+        return jsonify({'error': str(e), 'success': False}), 429
+    except SQLExecutionError as e:
+        return jsonify(e.to_dict()), 400
+    
+    return jsonify(job.to_dict(limit=0)), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_job(current_user, job_id):
+    try:
+        job = query_jobs.get(job_id, owner=current_user.id)
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = request.args.get('limit')
+        limit = max(int(limit), 0) if limit is not None else None
+        result_format = resolve_format(request.args.get('format'))
+    except JobNotFoundError as e:
+        return jsonify({'error': str(e), 'success': False}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+    
+    # 流式读取已缓冲的结果：?stream=1 或 Accept: application/x-ndjson
+    if wants_stream({'stream': request.args.get('stream') in ('1', 'true')}, request.headers.get('Accept')):
+        return Response(job_lines(job, offset, batch_size=app.config['SQL_STREAM_BATCH_SIZE']),
+                        mimetype=NDJSON_MIMETYPE)
+    
+    return jsonify(job.to_dict(offset, limit, result_format)), 200
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+@token_required
+def cancel_job(current_user, job_id):
+    try:
+        job = query_jobs.cancel(job_id, owner=current_user.id)
+    except JobNotFoundError as e:
+        return jsonify({'error': str(e), 'success': False}), 404
+    
+    return jsonify(job.to_dict(limit=0)), 200
+
+# 取消执行中的语句：executionId 为执行请求中给出的ID
+@app.route('/api/executions/<execution_id>', methods=['DELETE'])
+@token_required
+def cancel_execution(current_user, execution_id):
+    if not query_drivers.cancel(f'{current_user.id}:{execution_id}'):
+        return jsonify({'message': 'Execution not found'}), 404
+    
+    return jsonify({'message': 'Execution cancelled successfully'}), 200
+
+# 结果缓存管理路由
+@app.route('/api/admin/cache', methods=['GET'])
+@token_required
+def get_cache_stats(current_user):
+    return jsonify(result_cache.stats()), 200
+
+@app.route('/api/admin/cache', methods=['DELETE'])
+@token_required
+def clear_cache(current_user):
+    removed = result_cache.invalidate()
+    return jsonify({'message': f'Cleared {removed} cached results'}), 200
+
+# 合并执行统计路由：coalesced 为共享了进行中执行结果的请求数
+@app.route('/api/admin/coalescing', methods=['GET'])
+@token_required
+def get_coalescing_stats(current_user):
+    if query_coalescer is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify(dict(query_coalescer.stats(), enabled=True)), 200
+
+# 定时刷新的片段及物化统计路由
+@app.route('/api/admin/schedules', methods=['GET'])
+@token_required
+def get_schedules(current_user):
+    return jsonify(dict(snippet_materializer.stats(), schedules=snippet_materializer.list())), 200
+
+# 准入控制状态路由
+@app.route('/api/admin/admission', methods=['GET'])
+@token_required
+def get_admission_stats(current_user):
+    return jsonify(query_admission.stats()), 200
+
+# 执行驱动状态路由
+@app.route('/api/admin/drivers', methods=['GET'])
+@token_required
+def get_driver_stats(current_user):
+    return jsonify(query_drivers.stats()), 200
+
+# 查询计划缓存管理路由
+@app.route('/api/admin/plans', methods=['GET'])
+@token_required
+def get_plan_stats(current_user):
+    return jsonify(query_plans.stats()), 200
+
+@app.route('/api/admin/plans', methods=['DELETE'])
+@token_required
+def clear_plans(current_user):
+    removed = query_plans.clear()
+    return jsonify({'message': f'Cleared {removed} cached plans'}), 200
+
+@app.route('/api/admin/slow-queries', methods=['GET'])
+@token_required
+def get_slow_queries(current_user):
+    # 按指纹聚合的执行统计（sort: total / max / count / mean）和最近的慢查询
+    try:
+        result = query_stats.report(sort=request.args.get('sort', 'total'),
+                                    limit=int(request.args.get('limit', 50)))
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+    return jsonify(result), 200
+
+@app.route('/api/admin/slow-queries', methods=['DELETE'])
+@token_required
+def clear_slow_queries(current_user):
+    removed = query_stats.clear()
+    return jsonify({'message': f'Cleared statistics for {removed} query fingerprints'}), 200
 
 # 前端路由
 @app.route('/')
@@ -0,0 +1,141 @@
+"""
+SQL执行引擎包
+供 sql-manager-backend/app.py 与 run_minimal.py 共用
+"""
+
+from .admission import (
+    PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, AdmissionController, AdmissionRejectedError
+)
+from .binary import BINARY_MIMETYPE, decode_result, encode_result, wants_binary
+from .buffer import MemoryBudget, ResultBuffer
+from .cache import ResultCache, normalize_sql
+from .client import SQLManagerClient, iter_rows
+from .coalesce import QueryCoalescer
+from .cursors import CursorNotFoundError, CursorRegistry
+from .demo_data import DEMO_TABLES, DemoDataGenerator, write_demo_tables
+from .drivers import (
+    MOCK, SQLITE, SUBPROCESS, Driver, DriverRegistry, MockDriver, RemoteExecutionError, SQLiteDriver,
+    SubprocessDriver
+)
+from .encoding import FORMAT_COLUMNAR, RESULT_FORMATS, resolve_format, shape_rows
+from .engine import DEFAULT_TARGET, SQLEngine, targets_from_env
+from .errors import SQLExecutionError
+from .export import EXPORT_FORMATS, export_chunks, export_headers, resolve_export_format
+from .fanout import FanOutExecutor
+from .jobs import JobManager, JobNotFoundError, JobQueueFullError
+from .limits import BudgetExceededError, LimitPolicy, QueryLimits
+from .materialize import SnippetMaterializer, SnippetNotScheduledError, parse_schedule
+from .params import bind_template, resolve_statement
+from .plans import PlanCache
+from .pool import ConnectionPool, PoolTimeoutError
+from .preview import PreviewRunner
+from .querylog import QueryStats, fingerprint
+from .schema import PrefixTrie, SchemaCatalog
+from .streaming import (
+    NDJSON_MIMETYPE, SQL_SCRIPT_MIMETYPES, job_lines, json_default, ndjson_lines, read_ndjson, script_lines,
+    wants_stream
+)
+from .tokenizer import is_query, split_statements, statement_kind
+from .validate import SQLValidator
+
+__all__ = [
+    # admission
+    'PRIORITY_BACKGROUND',
+    'PRIORITY_INTERACTIVE',
+    'AdmissionController',
+    'AdmissionRejectedError',
+    # binary
+    'BINARY_MIMETYPE',
+    'decode_result',
+    'encode_result',
+    'wants_binary',
+    # buffer
+    'MemoryBudget',
+    'ResultBuffer',
+    # cache
+    'ResultCache',
+    'normalize_sql',
+    # client
+    'SQLManagerClient',
+    'iter_rows',
+    # coalesce
+    'QueryCoalescer',
+    # cursors
+    'CursorNotFoundError',
+    'CursorRegistry',
+    # demo_data
+    'DEMO_TABLES',
+    'DemoDataGenerator',
+    'write_demo_tables',
+    # drivers
+    'MOCK',
+    'SQLITE',
+    'SUBPROCESS',
+    'Driver',
+    'DriverRegistry',
+    'MockDriver',
+    'RemoteExecutionError',
+    'SQLiteDriver',
+    'SubprocessDriver',
+    # encoding
+    'FORMAT_COLUMNAR',
+    'RESULT_FORMATS',
+    'resolve_format',
+    'shape_rows',
+    # engine
+    'DEFAULT_TARGET',
+    'SQLEngine',
+    'targets_from_env',
+    # errors
+    'SQLExecutionError',
+    # export
+    'EXPORT_FORMATS',
+    'export_chunks',
+    'export_headers',
+    'resolve_export_format',
+    # fanout
+    'FanOutExecutor',
+    # jobs
+    'JobManager',
+    'JobNotFoundError',
+    'JobQueueFullError',
+    # limits
+    'BudgetExceededError',
+    'LimitPolicy',
+    'QueryLimits',
+    # materialize
+    'SnippetMaterializer',
+    'SnippetNotScheduledError',
+    'parse_schedule',
+    # params
+    'bind_template',
+    'resolve_statement',
+    # plans
+    'PlanCache',
+    # pool
+    'ConnectionPool',
+    'PoolTimeoutError',
+    # preview
+    'PreviewRunner',
+    # querylog
+    'QueryStats',
+    'fingerprint',
+    # schema
+    'PrefixTrie',
+    'SchemaCatalog',
+    # streaming
+    'NDJSON_MIMETYPE',
+    'SQL_SCRIPT_MIMETYPES',
+    'job_lines',
+    'json_default',
+    'ndjson_lines',
+    'read_ndjson',
+    'script_lines',
+    'wants_stream',
+    # tokenizer
+    'is_query',
+    'split_statements',
+    'statement_kind',
+    # validate
+    'SQLValidator',
+]
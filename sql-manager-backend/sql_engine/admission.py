@@ -0,0 +1,265 @@
+"""
+查询准入控制
+在执行引擎之前限制并发：全局和每个用户同时执行的查询数都有上限，超出上限的请求进入有界等待队列，
+按优先级（交互执行优先于后台任务）和到达顺序放行；已达到个人上限的用户排在后面的请求不挡住其他用户。
+队列已满或等待超时的交互请求被拒绝，接口返回429并带上 Retry-After。
+
+后台任务（异步任务、预览的计数任务等）不占等待队列的名额、也不会超时，
+可以登记放行回调（on_admit），放行后才交给工作线程执行，等待期间不占用线程。
+"""
+
+import math
+import threading
+import time
+
+from .errors import SQLExecutionError
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# 占用时长的指数移动平均系数，用于估算 Retry-After
+_HOLD_SMOOTHING = 0.2
+
+
+class AdmissionRejectedError(SQLExecutionError):
+    """并发已满，请求未能在等待时限内放行"""
+
+    def __init__(self, message, retry_after=1, reason='busy'):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.reason = reason
+
+    def to_dict(self):
+        result = super().to_dict()
+        result.update({'errorType': 'admission_rejected', 'reason': self.reason, 'retryAfter': self.retry_after})
+        return result
+
+
+class AdmissionTicket:
+    """一次准入：放行前在等待队列中，放行后占用一个并发名额，release() 归还名额"""
+
+    def __init__(self, controller, user, priority, sequence, on_admit=None):
+        self.controller = controller
+        self.user = user
+        self.priority = priority
+        self.sequence = sequence
+        self.on_admit = on_admit
+        self.enqueued_at = time.monotonic()
+        self.admitted_at = None
+        self.admitted = False
+        self.cancelled = False
+        self.released = False
+
+    def release(self):
+        self.controller.release(self)
+
+    def cancel(self):
+        """放弃等待（后台任务被取消时调用），返回是否在放行之前取消成功"""
+        return self.controller.cancel(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class AdmissionController:
+    """全局/每用户并发上限、有界等待队列和优先级放行
+
+    max_concurrent: 同时执行的查询总数上限
+    max_per_user: 每个用户同时执行的查询数上限（交互和后台合计）
+    max_queue: 等待中的交互请求总数上限；max_user_queue: 每个用户等待中的交互请求上限
+    queue_timeout: 交互请求最长等待秒数
+    """
+
+    def __init__(self, max_concurrent=8, max_per_user=2, max_queue=50, max_user_queue=4, queue_timeout=10.0):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.max_user_queue = max_user_queue
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._running = 0
+        self._per_user = {}
+        self._sequence = 0
+        self._hold_ms = None
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.max_wait_ms = 0.0
+
+    def acquire(self, user, priority=PRIORITY_INTERACTIVE):
+        """等待放行并返回AdmissionTicket，用完后调用其 release()（也可用作上下文管理器）
+
+        交互请求在队列已满或等待超时时抛出 AdmissionRejectedError；后台请求一直等待，
+        直到放行或被 cancel()。
+        """
+        ticket = self.enqueue(user, priority)
+        self.wait(ticket)
+        return ticket
+
+    def try_acquire(self, user, priority=PRIORITY_INTERACTIVE):
+        """有空闲名额时立即放行并返回AdmissionTicket，否则返回None（不进入等待队列）
+
+        用于为已放行的请求申请额外的并行宽度（如多目标执行），申请不到时由调用方降低并行度，
+        不会因等待自己占着的名额而超时。
+        """
+        with self._cond:
+            self._sequence += 1
+            ticket = AdmissionTicket(self, user, priority, self._sequence)
+            self._waiting.append(ticket)
+            granted = self._dispatch_locked()
+            if not ticket.admitted:
+                self._waiting.remove(ticket)
+                ticket = None
+        self._notify_admitted(granted)
+        return ticket
+
+    def enqueue(self, user, priority=PRIORITY_INTERACTIVE, on_admit=None):
+        """加入等待队列（有空闲名额时直接放行），返回AdmissionTicket
+
+        on_admit(ticket) 在放行时调用（在控制器的锁之外，可能就在本次调用中），
+        使用回调的请求不必调用 wait()。
+        """
+        error = None
+        with self._cond:
+            self._sequence += 1
+            ticket = AdmissionTicket(self, user, priority, self._sequence, on_admit)
+            self._waiting.append(ticket)
+            granted = self._dispatch_locked()
+            if not ticket.admitted and priority == PRIORITY_INTERACTIVE:
+                error = self._check_queue_locked(ticket, user)
+        self._notify_admitted(granted)
+        if error is not None:
+            raise error
+        return ticket
+
+    def _check_queue_locked(self, ticket, user):
+        """等待队列超出上限时移除ticket并返回 AdmissionRejectedError"""
+        queued = [t for t in self._waiting if t.priority == PRIORITY_INTERACTIVE]
+        if len(queued) > self.max_queue:
+            self._reject_locked(ticket)
+            return AdmissionRejectedError(
+                f'Too many queries waiting to run ({self.max_queue})', self._retry_after_locked(), 'queue_full'
+            )
+        if sum(1 for t in queued if t.user == user) > self.max_user_queue:
+            self._reject_locked(ticket)
+            return AdmissionRejectedError(
+                f'Too many of your queries are running or waiting (at most {self.max_per_user} running, '
+                f'{self.max_user_queue} waiting)', self._retry_after_locked(), 'user_limit'
+            )
+        return None
+
+    def wait(self, ticket):
+        """等待ticket被放行"""
+        with self._cond:
+            deadline = ticket.enqueued_at + self.queue_timeout if ticket.priority == PRIORITY_INTERACTIVE else None
+            while not ticket.admitted:
+                if ticket.cancelled:
+                    raise AdmissionRejectedError('Query was cancelled while waiting to run', 0, 'cancelled')
+                if deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._reject_locked(ticket)
+                    self.timed_out += 1
+                    raise AdmissionRejectedError(
+                        f'Timed out after {self.queue_timeout}s waiting to run', self._retry_after_locked(), 'timeout'
+                    )
+                self._cond.wait(remaining)
+
+    def _dispatch_locked(self):
+        """按（优先级, 到达顺序）放行等待中的请求，跳过已达到个人上限的用户，返回本次放行的ticket"""
+        granted = []
+        while self._running < self.max_concurrent:
+            eligible = [t for t in self._waiting if self._per_user.get(t.user, 0) < self.max_per_user]
+            if not eligible:
+                break
+            ticket = min(eligible, key=lambda t: (t.priority, t.sequence))
+            self._waiting.remove(ticket)
+            self._running += 1
+            self._per_user[ticket.user] = self._per_user.get(ticket.user, 0) + 1
+            ticket.admitted = True
+            ticket.admitted_at = time.monotonic()
+            self.admitted += 1
+            self.max_wait_ms = max(self.max_wait_ms, (ticket.admitted_at - ticket.enqueued_at) * 1000)
+            granted.append(ticket)
+        if granted:
+            self._cond.notify_all()
+        return granted
+
+    @staticmethod
+    def _notify_admitted(granted):
+        """在锁外调用放行回调，回调可以再调用控制器的方法"""
+        for ticket in granted:
+            if ticket.on_admit is not None:
+                ticket.on_admit(ticket)
+
+    def _reject_locked(self, ticket):
+        self._waiting.remove(ticket)
+        self.rejected += 1
+
+    def _retry_after_locked(self):
+        """按平均占用时长和排队长度估算的重试间隔（整数秒，至少1秒）"""
+        hold_seconds = (self._hold_ms or 1000) / 1000
+        rounds = len(self._waiting) / self.max_concurrent + 1
+        return max(1, math.ceil(hold_seconds * rounds))
+
+    def release(self, ticket):
+        """归还名额并放行下一个请求；重复调用无效"""
+        with self._cond:
+            if not ticket.admitted or ticket.released:
+                return
+            ticket.released = True
+            self._running -= 1
+            count = self._per_user[ticket.user] - 1
+            if count:
+                self._per_user[ticket.user] = count
+            else:
+                del self._per_user[ticket.user]
+
+            hold_ms = (time.monotonic() - ticket.admitted_at) * 1000
+            if self._hold_ms is None:
+                self._hold_ms = hold_ms
+            else:
+                self._hold_ms += _HOLD_SMOOTHING * (hold_ms - self._hold_ms)
+            granted = self._dispatch_locked()
+        self._notify_admitted(granted)
+
+    def cancel(self, ticket):
+        """从等待队列中移除尚未放行的请求，其 acquire() 抛出 AdmissionRejectedError
+
+        返回是否取消成功；已放行（或已取消）的请求返回False。
+        """
+        with self._cond:
+            if ticket.admitted or ticket.cancelled:
+                return False
+            ticket.cancelled = True
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+            self._cond.notify_all()
+            return True
+
+    def stats(self):
+        with self._cond:
+            return {
+                'maxConcurrent': self.max_concurrent,
+                'maxPerUser': self.max_per_user,
+                'maxQueue': self.max_queue,
+                'maxUserQueue': self.max_user_queue,
+                'queueTimeout': self.queue_timeout,
+                'running': self._running,
+                'activeUsers': len(self._per_user),
+                'queued': {
+                    'interactive': sum(1 for t in self._waiting if t.priority == PRIORITY_INTERACTIVE),
+                    'background': sum(1 for t in self._waiting if t.priority != PRIORITY_INTERACTIVE)
+                },
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timedOut': self.timed_out,
+                'maxWaitMs': round(self.max_wait_ms, 3),
+                'meanHoldMs': round(self._hold_ms, 3) if self._hold_ms is not None else None
+            }
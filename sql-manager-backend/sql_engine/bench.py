@@ -0,0 +1,90 @@
+"""
+执行驱动吞吐量对比
+对同一个目标库和同一条语句，依次用各驱动并发执行若干次，报告每秒语句数和延迟分位数：
+
+    python -m sql_engine.bench target.db "SELECT * FROM orders LIMIT 1000" --iterations 200 --concurrency 4
+
+mock 驱动不读目标库，结果只反映接口本身的开销。
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .demo_data import DemoDataGenerator
+from .drivers import MOCK, SQLITE, SUBPROCESS, MockDriver, SQLiteDriver, SubprocessDriver
+from .engine import DEFAULT_TARGET, SQLEngine
+from .errors import SQLExecutionError
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 3)
+
+
+def run_benchmark(driver, sql, params=None, target=DEFAULT_TARGET, iterations=100, concurrency=1, warmup=5):
+    """用 concurrency 个线程共执行 iterations 次，返回吞吐量和延迟统计（毫秒）
+
+    不使用结果缓存，每次都真正执行；失败的执行计入 errors，不计入延迟。
+    """
+    def run_one(_):
+        start = time.perf_counter()
+        try:
+            driver.execute(sql, params, target=target, use_cache=False)
+        except SQLExecutionError:
+            return None
+        return (time.perf_counter() - start) * 1000
+
+    for _ in range(warmup):
+        run_one(None)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(run_one, range(iterations)))
+    elapsed = time.perf_counter() - start
+
+    timings = sorted(ms for ms in latencies if ms is not None)
+    return {
+        'driver': driver.name,
+        'iterations': iterations,
+        'concurrency': concurrency,
+        'errors': iterations - len(timings),
+        'elapsedMs': round(elapsed * 1000, 3),
+        'perSecond': round(len(timings) / elapsed, 1) if elapsed else None,
+        'p50Ms': _percentile(timings, 0.5),
+        'p95Ms': _percentile(timings, 0.95),
+        'maxMs': round(timings[-1], 3) if timings else None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='对比各执行驱动的吞吐量')
+    parser.add_argument('db_path', help='目标SQLite文件')
+    parser.add_argument('sql', help='要执行的语句')
+    parser.add_argument('--drivers', default=','.join((MOCK, SQLITE, SUBPROCESS)), help='逗号分隔的驱动名称')
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    engine = SQLEngine({DEFAULT_TARGET: args.db_path})
+    drivers = {
+        MOCK: MockDriver(DemoDataGenerator()),
+        SQLITE: SQLiteDriver(engine),
+        SUBPROCESS: SubprocessDriver(engine, max_workers=args.concurrency)
+    }
+    try:
+        for name in args.drivers.split(','):
+            report = run_benchmark(drivers[name], args.sql, iterations=args.iterations,
+                                   concurrency=args.concurrency)
+            print(f'{name:<11} {report["perSecond"]:>9} stmt/s  p50 {report["p50Ms"]} ms  '
+                  f'p95 {report["p95Ms"]} ms  max {report["maxMs"]} ms  errors {report["errors"]}')
+    finally:
+        for driver in drivers.values():
+            driver.close()
+        engine.close()
+
+
+if __name__ == '__main__':
+    main()
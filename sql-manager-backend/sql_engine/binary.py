@@ -0,0 +1,170 @@
+"""
+二进制列式结果编码
+通过 Accept: application/vnd.sql-manager.columnar 协商，参考Arrow IPC的列缓冲区布局：
+数值列写成连续的 int64 / float64 缓冲区，字符串和BLOB列写成 offsets + data 两个缓冲区，
+整列由 array 模块一次性打包，不为每个单元格创建中间对象。
+
+消息格式（小端序）：
+    magic 'SQLB' | version u8 | header长度 u32 | header(JSON, UTF-8)
+    之后每列依次为若干缓冲区，每个缓冲区前有 u64 长度：
+        validity  有空值时为位图（LSB优先，1表示非空），否则长度为0
+        int64 / float64       values
+        utf8 / binary / json  offsets(int64, rowCount + 1)，data
+header 为结果字典去掉 data 后的其余字段，另加每列的 types。
+"""
+
+import json
+import struct
+import sys
+from array import array
+from itertools import accumulate
+
+from .streaming import json_default
+
+BINARY_MIMETYPE = 'application/vnd.sql-manager.columnar'
+
+MAGIC = b'SQLB'
+VERSION = 1
+
+INT64 = 'int64'
+FLOAT64 = 'float64'
+UTF8 = 'utf8'
+BINARY = 'binary'
+JSON = 'json'
+
+_PREAMBLE = struct.Struct('<4sBI')
+_LENGTH = struct.Struct('<Q')
+_NONE_TYPE = type(None)
+_SWAP = sys.byteorder == 'big'
+
+
+def wants_binary(accept_header):
+    """Accept头中包含二进制列式格式时启用"""
+    return BINARY_MIMETYPE in (accept_header or '')
+
+
+def _typed_bytes(typecode, values):
+    """整列打包为小端序的定长缓冲区"""
+    buffer = array(typecode, values)
+    if _SWAP:
+        buffer.byteswap()
+    return buffer.tobytes()
+
+
+def _validity(values):
+    """非空位图，全部非空时返回空串"""
+    bitmap = bytearray((len(values) + 7) // 8)
+    for i, value in enumerate(values):
+        if value is not None:
+            bitmap[i >> 3] |= 1 << (i & 7)
+    return bytes(bitmap)
+
+
+def _encode_column(values):
+    """返回 (类型, 缓冲区列表)"""
+    kinds = set(map(type, values))
+    nullable = _NONE_TYPE in kinds
+    kinds.discard(_NONE_TYPE)
+    validity = _validity(values) if nullable else b''
+
+    if kinds <= {int}:
+        filled = [0 if v is None else v for v in values] if nullable else values
+        return INT64, [validity, _typed_bytes('q', filled)]
+
+    if kinds <= {int, float}:
+        filled = [0.0 if v is None else v for v in values] if nullable else values
+        return FLOAT64, [validity, _typed_bytes('d', filled)]
+
+    if kinds == {str}:
+        kind = UTF8
+        encoded = [b'' if v is None else v.encode('utf-8') for v in values]
+    elif kinds <= {bytes, bytearray, memoryview}:
+        kind = BINARY
+        encoded = [b'' if v is None else bytes(v) for v in values]
+    else:
+        # 混合类型的列逐个值编码为JSON文本
+        kind = JSON
+        encoded = [b'' if v is None else json.dumps(v, default=json_default).encode('utf-8') for v in values]
+
+    offsets = array('q', [0])
+    offsets.extend(accumulate(map(len, encoded)))
+    if _SWAP:
+        offsets.byteswap()
+    return kind, [validity, offsets.tobytes(), b''.join(encoded)]
+
+
+def encode_result(result):
+    """将 columnar 格式的结果字典编码为二进制消息"""
+    header = {k: v for k, v in result.items() if k != 'data'}
+    columns = result.get('data') or []
+
+    types = []
+    buffers = []
+    for values in columns:
+        kind, column_buffers = _encode_column(values)
+        types.append(kind)
+        buffers.extend(column_buffers)
+    if result.get('columns') is not None:
+        header['types'] = types
+
+    header_bytes = json.dumps(header, default=json_default, separators=(',', ':')).encode('utf-8')
+    parts = [_PREAMBLE.pack(MAGIC, VERSION, len(header_bytes)), header_bytes]
+    for buffer in buffers:
+        parts.append(_LENGTH.pack(len(buffer)))
+        parts.append(buffer)
+    return b''.join(parts)
+
+
+def _typed_values(typecode, data):
+    buffer = array(typecode)
+    buffer.frombytes(data)
+    if _SWAP:
+        buffer.byteswap()
+    return buffer
+
+
+def decode_result(payload):
+    """解码二进制消息，返回与 format=columnar 的JSON响应相同结构的字典"""
+    magic, version, header_length = _PREAMBLE.unpack_from(payload, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a sql-manager columnar payload')
+
+    position = _PREAMBLE.size
+    result = json.loads(bytes(payload[position:position + header_length]).decode('utf-8'))
+    position += header_length
+
+    view = memoryview(payload)
+
+    def read_buffer():
+        nonlocal position
+        (length,) = _LENGTH.unpack_from(payload, position)
+        position += _LENGTH.size
+        data = view[position:position + length]
+        position += length
+        return data
+
+    data = []
+    for kind in result.get('types', []):
+        validity = read_buffer()
+        if kind == INT64:
+            values = _typed_values('q', read_buffer()).tolist()
+        elif kind == FLOAT64:
+            values = _typed_values('d', read_buffer()).tolist()
+        else:
+            offsets = _typed_values('q', read_buffer())
+            raw = read_buffer().tobytes()
+            values = [raw[start:end] for start, end in zip(offsets, offsets[1:])]
+            if kind == UTF8:
+                values = [v.decode('utf-8') for v in values]
+            elif kind == JSON:
+                values = [json.loads(v) if v else None for v in values]
+
+        if len(validity):
+            bitmap = validity.tobytes()
+            present = (bitmap[i >> 3] >> (i & 7) & 1 for i in range(len(values)))
+            values = [v if p else None for v, p in zip(values, present)]
+        data.append(values)
+
+    if 'types' in result:
+        result['data'] = data
+    return result
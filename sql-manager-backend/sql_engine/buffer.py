@@ -0,0 +1,184 @@
+"""
+可溢出到磁盘的结果缓冲区
+行先保存在内存中，超过单个缓冲区的字节预算或全局内存预算（MemoryBudget）时，
+已有的行和之后追加的行全部写入临时文件，读取时通过mmap随机访问。
+分页读取（slice）和流式读取（iter_batches）与是否溢出无关；
+多个用户同时执行宽查询时进程内存保持在预算之内。
+
+临时文件中每行为一条pickle记录，另用 array('Q') 保存各行的起始偏移量。
+"""
+
+import mmap
+import os
+import pickle
+import tempfile
+import threading
+from array import array
+
+from .cache import estimate_size
+
+# 单个缓冲区在内存中最多保存的字节数
+REQUEST_MEMORY_BYTES = 16 * 1024 * 1024
+
+# 所有缓冲区在内存中保存的总字节数
+GLOBAL_MEMORY_BYTES = 256 * 1024 * 1024
+
+
+class MemoryBudget:
+    """多个结果缓冲区共享的内存预算"""
+
+    def __init__(self, max_bytes=GLOBAL_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.peak = 0
+        self.spills = 0
+        self._lock = threading.Lock()
+
+    def try_reserve(self, size):
+        """预留size字节，超出预算时返回False"""
+        with self._lock:
+            if self.used + size > self.max_bytes:
+                return False
+            self.used += size
+            self.peak = max(self.peak, self.used)
+            return True
+
+    def release(self, size):
+        with self._lock:
+            self.used -= size
+
+    def record_spill(self):
+        with self._lock:
+            self.spills += 1
+
+    def stats(self):
+        with self._lock:
+            return {'maxBytes': self.max_bytes, 'usedBytes': self.used, 'peakBytes': self.peak, 'spills': self.spills}
+
+
+class ResultBuffer:
+    """只追加的行缓冲区
+
+    调用方负责串行化 extend 与读取（QueryJob 在 job.lock 下访问）。
+    用完后调用 close() 归还内存预算并删除临时文件。
+    """
+
+    def __init__(self, budget=None, max_memory_bytes=REQUEST_MEMORY_BYTES, spill_dir=None):
+        self.budget = budget
+        self.max_memory_bytes = max_memory_bytes
+        self.spill_dir = spill_dir
+        self.memory_bytes = 0
+        self._rows = []
+        self._file = None
+        self._offsets = None
+        self._size = 0
+        self._map = None
+        self._closed = False
+
+    @property
+    def spilled(self):
+        return self._file is not None
+
+    @property
+    def disk_bytes(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._offsets) if self.spilled else len(self._rows)
+
+    def extend(self, rows):
+        """追加一批行"""
+        if self._closed:
+            raise ValueError('Result buffer is closed')
+        if not rows:
+            return
+        if not self.spilled:
+            size = estimate_size((), rows) - 64
+            if self.memory_bytes + size <= self.max_memory_bytes and (
+                    self.budget is None or self.budget.try_reserve(size)):
+                self.memory_bytes += size
+                self._rows.extend(rows)
+                return
+            self._spill()
+        self._write(rows)
+
+    def _spill(self):
+        """把内存中的行写入临时文件并归还内存预算"""
+        self._file = tempfile.TemporaryFile(prefix='sql-result-', dir=self.spill_dir)
+        self._offsets = array('Q')
+        rows, self._rows = self._rows, []
+        self._write(rows)
+        if self.budget is not None:
+            self.budget.release(self.memory_bytes)
+            self.budget.record_spill()
+        self.memory_bytes = 0
+
+    def _write(self, rows):
+        chunks = []
+        for row in rows:
+            data = pickle.dumps(tuple(row), pickle.HIGHEST_PROTOCOL)
+            self._offsets.append(self._size)
+            self._size += len(data)
+            chunks.append(data)
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(b''.join(chunks))
+
+    def _mapped(self):
+        """返回覆盖当前全部数据的mmap（文件增长后重新映射）"""
+        if self._map is None or len(self._map) < self._size:
+            self._file.flush()
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), self._size, access=mmap.ACCESS_READ)
+        return self._map
+
+    def slice(self, start=0, stop=None):
+        """返回 [start, stop) 范围内的行元组列表"""
+        if not self.spilled:
+            return self._rows[start:stop]
+
+        start, stop, _ = slice(start, stop).indices(len(self._offsets))
+        if start >= stop:
+            return []
+        data = self._mapped()
+        offsets = self._offsets
+        rows = []
+        for index in range(start, stop):
+            end = offsets[index + 1] if index + 1 < len(offsets) else self._size
+            rows.append(pickle.loads(data[offsets[index]:end]))
+        return rows
+
+    def iter_batches(self, batch_size=500, start=0, lock=None):
+        """从start开始按批产出行；lock 为读取每批时需要持有的锁（与追加的一方共用）"""
+        position = start
+        while True:
+            if lock is not None:
+                with lock:
+                    batch = self.slice(position, position + batch_size)
+            else:
+                batch = self.slice(position, position + batch_size)
+            if not batch:
+                return
+            position += len(batch)
+            yield batch
+
+    def close(self):
+        self._closed = True
+        if self.budget is not None and self.memory_bytes:
+            self.budget.release(self.memory_bytes)
+        self.memory_bytes = 0
+        self._rows = []
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self):
+        return {
+            'rows': len(self),
+            'spilled': self.spilled,
+            'memoryBytes': self.memory_bytes,
+            'diskBytes': self.disk_bytes
+        }
@@ -0,0 +1,149 @@
+"""
+查询结果缓存
+以（规范化SQL文本, 绑定参数, 目标数据库, 数据版本）为键缓存查询结果，
+LRU淘汰并受总字节预算和TTL约束。数据版本来自 PRAGMA data_version 与文件mtime，
+任何连接提交写入后版本都会变化，因此命中的结果不会过期。
+"""
+
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from .tokenizer import is_query
+
+# 结果不确定的函数，包含时不缓存。日期时间函数省略时间参数时默认取 'now'：
+# date() / time() / datetime() / julianday() / unixepoch()，以及只有格式参数的 strftime(fmt)
+_NONDETERMINISTIC = re.compile(
+    r"\b(random|randomblob|changes|total_changes|last_insert_rowid|current_(date|time|timestamp))\b|'now'"
+    r"|\b(date|time|datetime|julianday|unixepoch)\s*\(\s*\)"
+    r"|\bstrftime\s*\((?:'(?:[^']|'')*'|[^,()'])*\)",
+    re.IGNORECASE
+)
+
+_TOKEN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\s+|[^'\"\s]+")
+
+
+def normalize_sql(sql):
+    """规范化SQL文本：合并字符串字面量之外的空白并去掉结尾分号"""
+    parts = []
+    for token in _TOKEN.findall(sql.strip()):
+        if token.isspace():
+            parts.append(' ')
+        else:
+            parts.append(token)
+    return ''.join(parts).rstrip('; ')
+
+
+def _binds_now(params):
+    """绑定参数中有 'now'（作为日期时间函数的时间参数时结果随时间变化）"""
+    values = params.values() if isinstance(params, dict) else params or ()
+    return any(isinstance(value, str) and value.strip().lower() == 'now' for value in values)
+
+
+def is_cacheable(sql, params=None):
+    """只读且结果确定的语句才允许缓存"""
+    if not is_query(sql):
+        return False
+    return _NONDETERMINISTIC.search(sql) is None and not _binds_now(params)
+
+
+def estimate_size(columns, rows):
+    """粗略估算结果（行元组列表）占用的字节数"""
+    size = 64 + sum(len(c) for c in columns)
+    for row in rows:
+        size += 16 * len(row)
+        for value in row:
+            if isinstance(value, (str, bytes)):
+                size += len(value)
+            else:
+                size += 8
+    return size
+
+
+class ResultCache:
+    """线程安全的LRU结果缓存"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=60, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 4
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(sql, params, target, data_version):
+        """构造缓存键"""
+        params_key = json.dumps(params, sort_keys=True, default=str) if params else ''
+        return (target, data_version, normalize_sql(sql), params_key)
+
+    def get(self, key):
+        """查找缓存，未命中或已过期返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, size, result = entry
+            if expires_at < time.monotonic():
+                self._remove_locked(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        """写入缓存，超过单条上限的结果不缓存"""
+        size = estimate_size(result['columns'], result['rows'])
+        if size > self.max_entry_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+
+            self._entries[key] = (time.monotonic() + self.ttl, size, result)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove_locked(oldest)
+                self.evictions += 1
+        return True
+
+    def invalidate(self, target=None):
+        """删除某个目标（或全部）的缓存项"""
+        with self._lock:
+            keys = [k for k in self._entries if target is None or k[0] == target]
+            for key in keys:
+                self._remove_locked(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def _remove_locked(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'maxBytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
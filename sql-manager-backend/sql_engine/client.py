@@ -0,0 +1,70 @@
+"""
+SQL Manager Python客户端
+供批处理脚本调用 /api/execute-sql，默认使用二进制列式传输。只依赖标准库。
+
+    client = SQLManagerClient('http://localhost:5000')
+    client.login('test@example.com', 'password123')
+    result = client.execute('SELECT * FROM orders')
+    for row in iter_rows(result):
+        ...
+"""
+
+import json
+import urllib.error
+import urllib.request
+
+from .binary import BINARY_MIMETYPE, decode_result
+from .errors import SQLExecutionError
+
+
+def iter_rows(result):
+    """按行遍历 columnar 结果，每行为一个元组"""
+    return zip(*result.get('data') or [])
+
+
+class SQLManagerClient:
+    """SQL Manager HTTP API客户端"""
+
+    def __init__(self, base_url, token=None, timeout=300):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+
+    def _request(self, path, data, accept='application/json'):
+        headers = {'Content-Type': 'application/json', 'Accept': accept}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        request = urllib.request.Request(
+            self.base_url + path, data=json.dumps(data).encode('utf-8'), headers=headers, method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.headers.get('Content-Type', ''), response.read()
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            try:
+                error = json.loads(body.decode('utf-8'))
+            except ValueError:
+                error = {}
+            raise SQLExecutionError(error.get('error') or error.get('message') or f'HTTP {e.code}')
+
+    def login(self, email, password):
+        """登录并保存令牌"""
+        _, body = self._request('/api/login', {'email': email, 'password': password})
+        self.token = json.loads(body.decode('utf-8'))['token']
+        return self.token
+
+    def execute(self, sql, params=None, target=None, binary=True):
+        """执行SQL，返回 format=columnar 结构的结果字典（列数据在 data 中）"""
+        payload = {'sql': sql, 'format': 'columnar'}
+        if params is not None:
+            payload['params'] = params
+        if target is not None:
+            payload['target'] = target
+
+        content_type, body = self._request(
+            '/api/execute-sql', payload, accept=BINARY_MIMETYPE if binary else 'application/json'
+        )
+        if content_type.startswith(BINARY_MIMETYPE):
+            return decode_result(body)
+        return json.loads(body.decode('utf-8'))
@@ -0,0 +1,85 @@
+"""
+相同查询的合并执行（single-flight）
+同一目标上（规范化SQL, 绑定参数, 数据版本, 执行预算）相同的只读查询正在执行时，后到的请求
+不再各自执行，而是等待进行中的那次执行并共享其结果（或错误）。例如很多用户在同一时刻
+打开同一个报表片段时，目标库只执行一次。
+
+键中的数据版本保证：执行开始后有写入提交的话，新请求会单独执行而不会拿到旧结果。
+"""
+
+import json
+import threading
+
+from .cache import normalize_sql
+
+
+def coalesce_key(sql, params, target, data_version, limits=None):
+    """构造合并键；预算不同的请求不合并，避免宽松的预算替严格的预算执行"""
+    params_key = json.dumps(params, sort_keys=True, default=str) if params else ''
+    return (target, data_version, normalize_sql(sql), params_key, tuple(limits) if limits is not None else None)
+
+
+class _Call:
+    """一次进行中的执行"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class QueryCoalescer:
+    """按键合并并发执行
+
+    do(key, fn)：没有相同键的执行在进行时调用 fn() 并返回 (结果, False)；
+    否则等待进行中的执行结束，返回 (同一个结果, True) 或抛出同一个异常。
+    结果被多个调用方共享，调用方不能原地修改。
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                self.max_waiters = max(self.max_waiters, call.waiters)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'inFlight': len(self._calls),
+                'waiting': sum(call.waiters for call in self._calls.values()),
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'maxWaiters': self.max_waiters
+            }
@@ -0,0 +1,277 @@
+"""
+服务端结果游标
+execute-sql 返回游标ID和第一页结果，之后通过 /api/results/<id> 按需翻页，
+长时间未访问的游标由后台线程按空闲TTL回收
+"""
+
+import sqlite3
+import threading
+import time
+import uuid
+
+from .encoding import FORMAT_OBJECTS, format_result
+from .engine import DEFAULT_TARGET
+from .errors import SQLExecutionError
+from .limits import MAX_ROWS, BudgetExceededError, BudgetGuard
+from .pool import connect
+from .tokenizer import is_query
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 5000
+
+
+class CursorNotFoundError(Exception):
+    """游标不存在、已过期或不属于当前用户"""
+
+
+class ResultCursor:
+    """保持打开状态的只进游标
+
+    每个游标使用独立的只读连接（不占用连接池），向前翻页直接继续读取，
+    向后翻页时重新执行语句并跳到目标偏移量。
+    """
+
+    def __init__(self, cursor_id, db_path, sql, params, owner, limits=None):
+        self.id = cursor_id
+        self.db_path = db_path
+        self.sql = sql
+        self.params = params or ()
+        self.owner = owner
+        self.limits = limits
+        self.columns = None
+        self.affected_rows = 0
+        self.position = 0
+        self.exhausted = False
+        self.last_access = time.monotonic()
+        self.lock = threading.Lock()
+        self._conn = connect(db_path, read_only=True, check_same_thread=False, isolation_level=None)
+        self._cursor = None
+
+    def open(self):
+        """执行语句，非查询语句返回False"""
+        changes_before = self._conn.total_changes
+        self._cursor = self._conn.cursor()
+        self._cursor.execute(self.sql, self.params)
+        self.position = 0
+        self.exhausted = False
+        if self._cursor.description is None:
+            self.affected_rows = self._conn.total_changes - changes_before
+            return False
+        self.columns = [d[0] for d in self._cursor.description]
+        return True
+
+    def _skip(self, count):
+        """向前跳过count行"""
+        while count > 0 and not self.exhausted:
+            batch = self._cursor.fetchmany(min(count, MAX_PAGE_SIZE))
+            if not batch:
+                self.exhausted = True
+                break
+            self.position += len(batch)
+            count -= len(batch)
+
+    def guard(self):
+        """每次翻页单独计算超时和VM指令预算"""
+        return BudgetGuard(self._conn, self.limits)
+
+    def fetch(self, offset, limit):
+        """读取 [offset, offset + limit) 范围内的行（rows为行元组列表）"""
+        self.last_access = time.monotonic()
+
+        max_rows = self.limits.max_rows if self.limits is not None else None
+        if max_rows is not None and offset >= max_rows:
+            raise BudgetExceededError(MAX_ROWS, max_rows, 0, offset)
+        if max_rows is not None:
+            limit = min(limit, max_rows - offset)
+
+        with self.guard() as guard:
+            try:
+                if offset < self.position:
+                    self._cursor.close()
+                    self.open()
+
+                self._skip(offset - self.position)
+
+                rows = []
+                if not self.exhausted:
+                    rows = self._cursor.fetchmany(limit)
+                    self.position += len(rows)
+                    if len(rows) < limit:
+                        self.exhausted = True
+            except sqlite3.Error as e:
+                raise guard.translate(e)
+
+        has_more = not self.exhausted
+        if max_rows is not None and self.position >= max_rows:
+            has_more = False
+
+        return {
+            'cursorId': self.id,
+            'columns': self.columns,
+            'rows': rows,
+            'offset': offset,
+            'limit': limit,
+            'hasMore': has_more,
+            'truncated': max_rows is not None and self.position >= max_rows and not self.exhausted,
+            'success': True
+        }
+
+    def close(self):
+        try:
+            if self._cursor is not None:
+                self._cursor.close()
+            self._conn.close()
+        except sqlite3.Error:
+            pass
+
+
+class CursorRegistry:
+    """管理打开的结果游标，按空闲TTL回收"""
+
+    def __init__(self, engine, idle_ttl=300, max_open=50, sweep_interval=30):
+        self.engine = engine
+        self.idle_ttl = idle_ttl
+        self.max_open = max_open
+        self.sweep_interval = sweep_interval
+        self._cursors = {}
+        self._lock = threading.Lock()
+        self._janitor = None
+        self._stop = threading.Event()
+
+    def open(self, sql, params=None, target=DEFAULT_TARGET, owner=None, page_size=DEFAULT_PAGE_SIZE, limits=None,
+             result_format=FORMAT_OBJECTS):
+        """执行语句并返回第一页
+
+        非查询语句不会保留游标，交给引擎的写连接执行并直接返回执行结果。
+        执行并读取第一页的耗时计入引擎的查询统计。
+        """
+        if not is_query(sql):
+            return self.engine.execute(sql, params, target=target, use_cache=False, limits=limits,
+                                       result_format=result_format)
+
+        start = time.perf_counter()
+        try:
+            result = self._open(sql, params, target, owner, page_size, limits, result_format)
+        except SQLExecutionError as e:
+            self.engine.record_query(sql, (time.perf_counter() - start) * 1000, target, e)
+            raise
+        self.engine.record_query(sql, (time.perf_counter() - start) * 1000, target)
+        return result
+
+    def _open(self, sql, params, target, owner, page_size, limits, result_format):
+        self._ensure_janitor()
+        self.evict_expired()
+
+        if not self.engine.has_target(target):
+            raise SQLExecutionError(f'Unknown target database: {target}')
+
+        cursor = ResultCursor(uuid.uuid4().hex, self.engine.targets()[target], sql, params, owner, limits)
+        try:
+            with cursor.guard() as guard:
+                try:
+                    has_rows = cursor.open()
+                except sqlite3.Error as e:
+                    raise guard.translate(e)
+        except SQLExecutionError:
+            cursor.close()
+            raise
+
+        if not has_rows:
+            cursor.close()
+            return {
+                'success': True,
+                'affectedRows': cursor.affected_rows,
+                'message': 'SQL statement executed successfully'
+            }
+
+        with self._lock:
+            self._cursors[cursor.id] = cursor
+            overflow = self._pop_oldest_locked(len(self._cursors) - self.max_open)
+        for stale in overflow:
+            with stale.lock:
+                stale.close()
+
+        return self._fetch(cursor, 0, page_size, result_format)
+
+    def fetch(self, cursor_id, offset=0, limit=DEFAULT_PAGE_SIZE, owner=None, result_format=FORMAT_OBJECTS):
+        """读取已打开游标的一页"""
+        self.evict_expired()
+        with self._lock:
+            cursor = self._cursors.get(cursor_id)
+        if cursor is None or (owner is not None and cursor.owner != owner):
+            raise CursorNotFoundError(f'Result cursor not found or expired: {cursor_id}')
+        return self._fetch(cursor, offset, limit, result_format)
+
+    def _fetch(self, cursor, offset, limit, result_format=FORMAT_OBJECTS):
+        offset = max(int(offset), 0)
+        limit = min(max(int(limit), 1), MAX_PAGE_SIZE)
+        with cursor.lock:
+            try:
+                page = cursor.fetch(offset, limit)
+            except SQLExecutionError:
+                with self._lock:
+                    self._cursors.pop(cursor.id, None)
+                cursor.close()
+                raise
+
+        page['message'] = f'Returned {len(page["rows"])} rows from offset {offset}'
+        return format_result(page, result_format)
+
+    def close(self, cursor_id, owner=None):
+        """关闭游标，返回是否存在"""
+        with self._lock:
+            cursor = self._cursors.get(cursor_id)
+            if cursor is None or (owner is not None and cursor.owner != owner):
+                return False
+            del self._cursors[cursor_id]
+        with cursor.lock:
+            cursor.close()
+        return True
+
+    def evict_expired(self):
+        """关闭超过空闲TTL的游标"""
+        deadline = time.monotonic() - self.idle_ttl
+        with self._lock:
+            expired = [c for c in self._cursors.values() if c.last_access < deadline]
+            for cursor in expired:
+                del self._cursors[cursor.id]
+        for cursor in expired:
+            with cursor.lock:
+                cursor.close()
+        return len(expired)
+
+    def _pop_oldest_locked(self, count):
+        """超出max_open时移除最久未访问的游标（调用方持有锁）"""
+        if count <= 0:
+            return []
+        oldest = sorted(self._cursors.values(), key=lambda c: c.last_access)[:count]
+        for cursor in oldest:
+            del self._cursors[cursor.id]
+        return oldest
+
+    def _ensure_janitor(self):
+        """启动后台回收线程"""
+        if self._janitor is not None:
+            return
+        with self._lock:
+            if self._janitor is not None:
+                return
+            self._janitor = threading.Thread(target=self._sweep_loop, name='result-cursor-janitor', daemon=True)
+            self._janitor.start()
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            self.evict_expired()
+
+    def stats(self):
+        with self._lock:
+            return {'open': len(self._cursors), 'maxOpen': self.max_open, 'idleTtl': self.idle_ttl}
+
+    def shutdown(self):
+        """停止回收线程并关闭所有游标"""
+        self._stop.set()
+        with self._lock:
+            cursors = list(self._cursors.values())
+            self._cursors.clear()
+        for cursor in cursors:
+            cursor.close()
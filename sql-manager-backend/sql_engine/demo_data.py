@@ -0,0 +1,354 @@
+"""
+演示表数据生成器
+按种子确定性地生成 users / products / orders / customers 四张演示表，可以百万行的规模写入本地SQLite目标库，
+用于在真实数据量下压测执行引擎和前端；未配置目标库时 execute-sql 的模拟结果也由它生成。
+
+每个值由 (种子, 表.列, 行ID) 经 splitmix64 散列得到，与分块方式无关：同样的种子无论一次生成多少行、
+从哪一行开始，结果都相同，NumPy 与纯Python两种实现的输出也完全一致。
+安装了 NumPy 时按列向量化计算，否则回退到标准库逐行计算。
+
+    cd sql-manager-backend
+    python -m sql_engine.demo_data demo.db --scale 1 --seed 42
+    SQL_TARGET_DB=demo.db python app.py
+"""
+
+import argparse
+import sqlite3
+import time
+import zlib
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_SEED = 42
+
+# scale=1 时各表的行数
+BASE_ROWS = {'users': 100000, 'products': 10000, 'orders': 1000000, 'customers': 100000}
+
+# 写入时每批生成的行数
+BATCH_SIZE = 50000
+
+# 行数少于该值时不值得走NumPy
+_VECTOR_MIN_ROWS = 256
+
+# 时间列分布在该时刻之前的三年内
+EPOCH = datetime(2024, 1, 1)
+DATE_SPAN_SECONDS = 3 * 365 * 86400
+
+# 表名 -> ((列名, 类型), ...)，列与原先的模拟数据一致
+DEMO_TABLES = {
+    'users': (
+        ('id', 'INTEGER PRIMARY KEY'), ('name', 'TEXT'), ('email', 'TEXT'), ('created_at', 'TEXT')
+    ),
+    'products': (
+        ('id', 'INTEGER PRIMARY KEY'), ('product_name', 'TEXT'), ('price', 'REAL'), ('stock', 'INTEGER'),
+        ('category', 'TEXT')
+    ),
+    'orders': (
+        ('id', 'INTEGER PRIMARY KEY'), ('user_id', 'INTEGER'), ('order_date', 'TEXT'), ('total_amount', 'REAL'),
+        ('status', 'TEXT')
+    ),
+    'customers': (
+        ('customer_id', 'INTEGER PRIMARY KEY'), ('first_name', 'TEXT'), ('last_name', 'TEXT'), ('phone', 'TEXT'),
+        ('address', 'TEXT')
+    ),
+}
+
+# 数据写入后创建的索引
+DEMO_INDEXES = {'orders': ('user_id', 'order_date'), 'products': ('category',)}
+
+FIRST_NAMES = (
+    'John', 'Jane', 'Michael', 'Emily', 'David', 'Sarah', 'Robert', 'Lisa',
+    'James', 'Maria', 'William', 'Anna', 'Daniel', 'Laura', 'Thomas', 'Olivia'
+)
+LAST_NAMES = (
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Miller', 'Davis', 'Garcia',
+    'Wilson', 'Moore', 'Taylor', 'Anderson', 'Clark', 'Lewis', 'Walker', 'Young'
+)
+CATEGORIES = ('Electronics', 'Books', 'Clothing', 'Home', 'Beauty')
+ADJECTIVES = ('Classic', 'Compact', 'Deluxe', 'Eco', 'Portable', 'Premium', 'Smart', 'Vintage')
+NOUNS = ('Lamp', 'Backpack', 'Headphones', 'Notebook', 'Jacket', 'Blender', 'Watch', 'Novel', 'Mug', 'Serum')
+STATUSES = ('Pending', 'Processing', 'Shipped', 'Delivered', 'Cancelled')
+STATUS_WEIGHTS = (5, 10, 15, 65, 5)
+STREETS = ('Main St', 'Oak Ave', 'Pine Rd', 'Maple Dr', 'Cedar Ln', 'Elm St', 'Lake View', 'Hill Rd')
+CITIES = ('Springfield', 'Riverside', 'Fairview', 'Georgetown', 'Madison', 'Clinton', 'Salem', 'Franklin')
+
+_FIRST_LOWER = tuple(name.lower() for name in FIRST_NAMES)
+_LAST_LOWER = tuple(name.lower() for name in LAST_NAMES)
+
+_MASK = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+
+
+def _mix(x):
+    """splitmix64 的输出函数"""
+    z = (x + _GOLDEN) & _MASK
+    z = ((z ^ (z >> 30)) * _MIX1) & _MASK
+    z = ((z ^ (z >> 27)) * _MIX2) & _MASK
+    return z ^ (z >> 31)
+
+
+def _cumulative(weights):
+    total = 0
+    result = []
+    for weight in weights:
+        total += weight
+        result.append(total)
+    return result
+
+
+class _PythonColumns:
+    """标准库实现：列为列表"""
+
+    def __init__(self, start, count):
+        self.ids = list(range(start, start + count))
+
+    def below(self, stream, n):
+        """每行一个 [0, n) 内的整数"""
+        return [_mix((stream + i * _GOLDEN) & _MASK) % n for i in self.ids]
+
+    def weighted(self, stream, cumulative):
+        """按累计权重抽取下标"""
+        return [bisect_right(cumulative, value) for value in self.below(stream, cumulative[-1])]
+
+    @staticmethod
+    def take(pool, indexes):
+        return [pool[i] for i in indexes]
+
+    @staticmethod
+    def offset(values, delta):
+        return [value + delta for value in values]
+
+    @staticmethod
+    def cents(values):
+        return [value / 100 for value in values]
+
+    @staticmethod
+    def text(values):
+        return [str(value) for value in values]
+
+    @staticmethod
+    def timestamps(seconds):
+        return [(EPOCH - timedelta(seconds=value)).isoformat() for value in seconds]
+
+    def concat(self, *parts):
+        columns = [[part] * len(self.ids) if isinstance(part, str) else part for part in parts]
+        return [''.join(values) for values in zip(*columns)]
+
+    @staticmethod
+    def tolist(values):
+        return values
+
+
+class _NumpyColumns:
+    """NumPy实现：整数运算在uint64上按2^64回绕，与标准库实现逐位一致"""
+
+    def __init__(self, start, count):
+        self.ids = np.arange(start, start + count, dtype=np.uint64)
+
+    def below(self, stream, n):
+        z = self.ids * np.uint64(_GOLDEN) + np.uint64(stream) + np.uint64(_GOLDEN)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(_MIX1)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(_MIX2)
+        z ^= z >> np.uint64(31)
+        return (z % np.uint64(n)).astype(np.int64)
+
+    def weighted(self, stream, cumulative):
+        return np.searchsorted(np.array(cumulative), self.below(stream, cumulative[-1]), side='right')
+
+    @staticmethod
+    def take(pool, indexes):
+        return np.array(pool, dtype=object)[indexes]
+
+    @staticmethod
+    def offset(values, delta):
+        return values + delta
+
+    @staticmethod
+    def cents(values):
+        return values / 100
+
+    @staticmethod
+    def text(values):
+        return values.astype(str).astype(object)
+
+    @staticmethod
+    def timestamps(seconds):
+        moments = np.datetime64(EPOCH, 's') - seconds.astype('timedelta64[s]')
+        return moments.astype(str).astype(object)
+
+    @staticmethod
+    def concat(*parts):
+        result = parts[0]
+        for part in parts[1:]:
+            result = result + part
+        return result
+
+    @staticmethod
+    def tolist(values):
+        return values.tolist()
+
+
+class DemoDataGenerator:
+    """按种子生成演示表的行
+
+    sizes 覆盖各表的行数（决定生成的总行数以及 orders.user_id 的取值范围）；
+    vectorized 为None时有NumPy就使用。
+    """
+
+    def __init__(self, seed=DEFAULT_SEED, sizes=None, vectorized=None):
+        if vectorized and np is None:
+            raise ValueError('NumPy is not installed')
+        self.seed = seed
+        self.sizes = dict(BASE_ROWS)
+        self.sizes.update(sizes or {})
+        self.vectorized = np is not None if vectorized is None else vectorized
+
+    @staticmethod
+    def columns(table):
+        return [name for name, _ in DEMO_TABLES[table]]
+
+    def _stream(self, name):
+        """每个 表.列 一个独立的随机流"""
+        return _mix((self.seed * _GOLDEN + zlib.crc32(name.encode('utf-8'))) & _MASK)
+
+    def generate(self, table, start=1, count=BATCH_SIZE):
+        """生成行ID在 [start, start + count) 内的行，返回列值列表的列表（每列一个列表）"""
+        if table not in DEMO_TABLES:
+            raise ValueError(f'Unknown demo table: {table}')
+        vectorized = self.vectorized and count >= _VECTOR_MIN_ROWS
+        c = (_NumpyColumns if vectorized else _PythonColumns)(start, count)
+        columns = getattr(self, '_' + table)(c)
+        return [c.tolist(values) for values in columns]
+
+    def rows(self, table, start=1, count=BATCH_SIZE):
+        """生成行元组列表"""
+        return list(zip(*self.generate(table, start, count)))
+
+    def sample(self, table, count=10):
+        """返回 (列名, 前count行)，用于模拟执行结果"""
+        return self.columns(table), self.rows(table, 1, min(count, self.sizes[table]))
+
+    def iter_batches(self, table, batch_size=BATCH_SIZE):
+        """按批产出整张表的行"""
+        total = self.sizes[table]
+        for start in range(1, total + 1, batch_size):
+            yield self.rows(table, start, min(batch_size, total + 1 - start))
+
+    def _users(self, c):
+        first = c.below(self._stream('users.first_name'), len(FIRST_NAMES))
+        last = c.below(self._stream('users.last_name'), len(LAST_NAMES))
+        return [
+            c.ids,
+            c.concat(c.take(FIRST_NAMES, first), ' ', c.take(LAST_NAMES, last)),
+            c.concat(c.take(_FIRST_LOWER, first), '.', c.take(_LAST_LOWER, last), c.text(c.ids), '@example.com'),
+            c.timestamps(c.below(self._stream('users.created_at'), DATE_SPAN_SECONDS))
+        ]
+
+    def _products(self, c):
+        adjective = c.below(self._stream('products.adjective'), len(ADJECTIVES))
+        noun = c.below(self._stream('products.noun'), len(NOUNS))
+        return [
+            c.ids,
+            c.concat(c.take(ADJECTIVES, adjective), ' ', c.take(NOUNS, noun)),
+            c.cents(c.offset(c.below(self._stream('products.price'), 50000), 99)),
+            c.below(self._stream('products.stock'), 1001),
+            c.take(CATEGORIES, c.below(self._stream('products.category'), len(CATEGORIES)))
+        ]
+
+    def _orders(self, c):
+        return [
+            c.ids,
+            c.offset(c.below(self._stream('orders.user_id'), self.sizes['users']), 1),
+            c.timestamps(c.below(self._stream('orders.order_date'), DATE_SPAN_SECONDS)),
+            c.cents(c.offset(c.below(self._stream('orders.total_amount'), 100000), 500)),
+            c.take(STATUSES, c.weighted(self._stream('orders.status'), _cumulative(STATUS_WEIGHTS)))
+        ]
+
+    def _customers(self, c):
+        return [
+            c.ids,
+            c.take(FIRST_NAMES, c.below(self._stream('customers.first_name'), len(FIRST_NAMES))),
+            c.take(LAST_NAMES, c.below(self._stream('customers.last_name'), len(LAST_NAMES))),
+            c.concat(
+                '+1-', c.text(c.offset(c.below(self._stream('customers.area_code'), 800), 200)),
+                '-555-', c.text(c.offset(c.below(self._stream('customers.line'), 9000), 1000))
+            ),
+            c.concat(
+                c.text(c.offset(c.below(self._stream('customers.house'), 9900), 100)), ' ',
+                c.take(STREETS, c.below(self._stream('customers.street'), len(STREETS))), ', ',
+                c.take(CITIES, c.below(self._stream('customers.city'), len(CITIES)))
+            )
+        ]
+
+
+def scaled_sizes(scale):
+    """BASE_ROWS 按比例缩放后的行数"""
+    return {table: max(1, int(rows * scale)) for table, rows in BASE_ROWS.items()}
+
+
+def write_demo_tables(db_path, generator=None, tables=None, batch_size=BATCH_SIZE):
+    """把演示表写入SQLite文件（已存在的同名表被替换），返回 {表: {'rows', 'elapsedMs'}}
+
+    每张表在一个事务中写入，随后建索引并执行ANALYZE，预览模式的行数估算可以直接使用 sqlite_stat1。
+    """
+    generator = generator or DemoDataGenerator()
+    tables = list(tables or DEMO_TABLES)
+    unknown = [table for table in tables if table not in DEMO_TABLES]
+    if unknown:
+        raise ValueError(f'Unknown demo table: {", ".join(unknown)}')
+
+    report = {}
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute('PRAGMA journal_mode = wal')
+        conn.execute('PRAGMA synchronous = off')
+        for table in tables:
+            start = time.perf_counter()
+            definition = ', '.join(f'{name} {kind}' for name, kind in DEMO_TABLES[table])
+            placeholders = ', '.join('?' * len(DEMO_TABLES[table]))
+            with conn:
+                conn.execute(f'DROP TABLE IF EXISTS {table}')
+                conn.execute(f'CREATE TABLE {table} ({definition})')
+                for rows in generator.iter_batches(table, batch_size):
+                    conn.executemany(f'INSERT INTO {table} VALUES ({placeholders})', rows)
+                for column in DEMO_INDEXES.get(table, ()):
+                    conn.execute(f'CREATE INDEX idx_{table}_{column} ON {table} ({column})')
+            conn.execute(f'ANALYZE {table}')
+            report[table] = {
+                'rows': generator.sizes[table],
+                'elapsedMs': round((time.perf_counter() - start) * 1000, 3)
+            }
+        conn.commit()
+    finally:
+        conn.close()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成演示表数据并写入SQLite文件')
+    parser.add_argument('db_path', help='目标SQLite文件')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='行数倍数，1对应 ' + ', '.join(f'{t}={n}' for t, n in BASE_ROWS.items()))
+    parser.add_argument('--tables', help='逗号分隔的表名，默认全部')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--no-numpy', action='store_true', help='使用标准库实现')
+    args = parser.parse_args(argv)
+
+    generator = DemoDataGenerator(args.seed, scaled_sizes(args.scale), vectorized=False if args.no_numpy else None)
+    tables = args.tables.split(',') if args.tables else None
+    print(f'Generating demo tables (seed={args.seed}, numpy={generator.vectorized}) into {args.db_path}')
+    for table, info in write_demo_tables(args.db_path, generator, tables, args.batch_size).items():
+        rate = info['rows'] / (info['elapsedMs'] / 1000) if info['elapsedMs'] else 0
+        print(f'  {table}: {info["rows"]} rows in {info["elapsedMs"] / 1000:.2f}s ({rate:.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,513 @@
+"""
+执行驱动
+统一的执行接口（connect / execute / stream / cancel / explain），两个后端按目标和请求选择驱动后调用：
+    mock        未配置目标数据库时返回演示数据（见 demo_data 模块）
+    sqlite      进程内执行，使用 SQLEngine 的连接池、结果缓存和查询计划缓存
+    subprocess  在独立的工作进程中打开目标库执行（见 worker 模块），用于不受信任或很重的查询：
+                崩溃、内存失控只影响工作进程，超时或取消时直接终止进程
+
+stream() 的产出约定与 SQLEngine.stream 相同，可以直接交给 ndjson_lines。
+execute() 的 execution_id 由调用方给出，执行期间可以用 cancel(execution_id) 取消。
+"""
+
+import abc
+import os
+import pickle
+import re
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+from .demo_data import DEMO_TABLES
+from .encoding import FORMAT_OBJECTS, format_result
+from .engine import DEFAULT_TARGET
+from .errors import SQLExecutionError
+from .limits import TIMEOUT, BudgetExceededError
+from .plans import build_plan_tree
+from .tokenizer import is_query
+
+MOCK = 'mock'
+SQLITE = 'sqlite'
+SUBPROCESS = 'subprocess'
+
+# execute() 时工作进程每条消息携带的行数
+FETCH_BATCH_SIZE = 1000
+
+# 超时后给工作进程自行中止的宽限秒数，之后强制终止
+KILL_GRACE_SECONDS = 5.0
+
+_LENGTH = struct.Struct('>I')
+_FROM_TABLE = re.compile(r'from\s+(\w+)', re.IGNORECASE)
+
+
+def send_message(stream, message):
+    """写入一条带长度前缀的pickle消息"""
+    data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    stream.write(_LENGTH.pack(len(data)) + data)
+    stream.flush()
+
+
+def _read_exact(stream, size):
+    chunks = []
+    while size:
+        chunk = stream.read(size)
+        if not chunk:
+            raise EOFError('Worker pipe closed')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def read_message(stream):
+    """读取一条消息，对端关闭时抛出 EOFError"""
+    size, = _LENGTH.unpack(_read_exact(stream, _LENGTH.size))
+    return pickle.loads(_read_exact(stream, size))
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 3)
+
+
+def _query_result(columns, rows, elapsed_ms, result_format):
+    return format_result({
+        'columns': columns,
+        'rows': rows,
+        'success': True,
+        'elapsedMs': elapsed_ms,
+        'message': f'Successfully executed query, returned {len(rows)} rows'
+    }, result_format)
+
+
+def _statement_result(affected_rows, elapsed_ms):
+    return {
+        'success': True,
+        'affectedRows': affected_rows,
+        'elapsedMs': elapsed_ms,
+        'message': 'SQL statement executed successfully'
+    }
+
+
+class RemoteExecutionError(SQLExecutionError):
+    """工作进程中的执行错误，保留原错误的响应体（包括预算信息）"""
+
+    def __init__(self, info):
+        super().__init__(info.get('error'))
+        self.info = info
+
+    def to_dict(self):
+        return dict(self.info)
+
+
+class Driver(abc.ABC):
+    """执行驱动接口，子类须实现 connect / execute / stream / explain"""
+
+    name = None
+
+    @abc.abstractmethod
+    def connect(self, target=DEFAULT_TARGET):
+        """确认目标可用，返回驱动与目标的描述；不可用时抛出 SQLExecutionError"""
+
+    @abc.abstractmethod
+    def execute(self, sql, params=None, target=DEFAULT_TARGET, limits=None, result_format=FORMAT_OBJECTS,
+                use_cache=True, execution_id=None):
+        """执行单条语句，返回结果字典"""
+
+    @abc.abstractmethod
+    def stream(self, sql, params=None, target=DEFAULT_TARGET, batch_size=500, limits=None, execution_id=None):
+        """先产出 {'columns', 'affectedRows'}，之后每次产出一批行元组"""
+
+    def cancel(self, execution_id):
+        """取消正在执行的语句，返回是否找到该执行"""
+        return False
+
+    @abc.abstractmethod
+    def explain(self, sql, params=None, target=DEFAULT_TARGET, limits=None, snippet_id=None):
+        """返回查询计划"""
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {'name': self.name}
+
+
+class MockDriver(Driver):
+    """模拟执行：演示表返回生成器的数据，其他表返回固定的示例行；SQL中含 error 时模拟执行失败"""
+
+    name = MOCK
+
+    def __init__(self, generator, rows=10):
+        self.generator = generator
+        self.rows = rows
+
+    def connect(self, target=DEFAULT_TARGET):
+        return {'driver': self.name, 'target': target}
+
+    def _check(self, sql):
+        if 'error' in sql.lower():
+            raise SQLExecutionError('模拟错误: 这是一个测试错误')
+
+    def _table(self, sql):
+        match = _FROM_TABLE.search(sql)
+        return match.group(1).lower() if match else 'users'
+
+    def _rows(self, sql):
+        table = self._table(sql)
+        if table in DEMO_TABLES:
+            return self.generator.sample(table, self.rows)
+        columns = ['id', 'column1', 'column2', 'column3']
+        return columns, [(i, f'Value {i}-1', f'Value {i}-2', f'Value {i}-3') for i in range(1, 6)]
+
+    def execute(self, sql, params=None, target=DEFAULT_TARGET, limits=None, result_format=FORMAT_OBJECTS,
+                use_cache=True, execution_id=None):
+        start = time.perf_counter()
+        self._check(sql)
+        if not is_query(sql):
+            return _statement_result(0, _elapsed_ms(start))
+        columns, rows = self._rows(sql)
+        return _query_result(columns, rows, _elapsed_ms(start), result_format)
+
+    def stream(self, sql, params=None, target=DEFAULT_TARGET, batch_size=500, limits=None, execution_id=None):
+        self._check(sql)
+        if not is_query(sql):
+            yield {'columns': None, 'affectedRows': 0}
+            return
+        columns, rows = self._rows(sql)
+        yield {'columns': columns, 'affectedRows': None}
+        for offset in range(0, len(rows), batch_size):
+            yield rows[offset:offset + batch_size]
+
+    def explain(self, sql, params=None, target=DEFAULT_TARGET, limits=None, snippet_id=None):
+        self._check(sql)
+        steps = [f'SCAN {self._table(sql)}'] if is_query(sql) else []
+        return {
+            'success': True,
+            'plan': build_plan_tree([(index + 2, 0, 0, detail) for index, detail in enumerate(steps)]),
+            'steps': steps,
+            'warnings': [],
+            'cached': False,
+            'elapsedMs': 0.0,
+            'message': f'Query plan has {len(steps)} steps, 0 warnings'
+        }
+
+
+class SQLiteDriver(Driver):
+    """进程内执行，委托给 SQLEngine 和 PlanCache"""
+
+    name = SQLITE
+
+    def __init__(self, engine, plans=None):
+        self.engine = engine
+        self.plans = plans
+
+    def connect(self, target=DEFAULT_TARGET):
+        with self.engine.get_pool(target, read_only=True).connection():
+            pass
+        return {'driver': self.name, 'target': target, 'path': self.engine.targets()[target]}
+
+    def execute(self, sql, params=None, target=DEFAULT_TARGET, limits=None, result_format=FORMAT_OBJECTS,
+                use_cache=True, execution_id=None):
+        return self.engine.execute(sql, params, target=target, use_cache=use_cache, limits=limits,
+                                   result_format=result_format, execution_id=execution_id)
+
+    def stream(self, sql, params=None, target=DEFAULT_TARGET, batch_size=500, limits=None, execution_id=None):
+        return self.engine.stream(sql, params, target=target, batch_size=batch_size, limits=limits,
+                                  execution_id=execution_id)
+
+    def cancel(self, execution_id):
+        return self.engine.cancel(execution_id)
+
+    def explain(self, sql, params=None, target=DEFAULT_TARGET, limits=None, snippet_id=None):
+        return self.plans.explain(sql, params, target=target, snippet_id=snippet_id, limits=limits)
+
+    def stats(self):
+        return {'name': self.name, 'pools': self.engine.stats()}
+
+
+class _Worker:
+    """一个工作进程及其管道"""
+
+    def __init__(self, memory_limit=None):
+        env = dict(os.environ)
+        package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [package_root, env.get('PYTHONPATH')]))
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'sql_engine.worker', str(memory_limit or 0)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=env
+        )
+        # 被终止的原因：TIMEOUT / 'cancelled'
+        self.killed = None
+
+    @property
+    def usable(self):
+        return self.killed is None and self.process.poll() is None
+
+    def send(self, message):
+        send_message(self.process.stdin, message)
+
+    def receive(self):
+        return read_message(self.process.stdout)
+
+    def kill(self, reason=None):
+        if self.killed is None:
+            self.killed = reason
+        try:
+            self.process.kill()
+        except OSError:
+            pass
+
+    def close(self):
+        self.kill()
+        self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+
+class SubprocessDriver(Driver):
+    """在工作进程中执行
+
+    最多同时运行 max_workers 个工作进程，空闲的进程被复用。read_only 为真时目标库以只读方式打开；
+    memory_limit（字节，仅POSIX）限制工作进程的地址空间。
+    limits.timeout 由工作进程内的进度处理器执行，超过 timeout + KILL_GRACE_SECONDS 仍未结束时强制终止进程。
+    """
+
+    name = SUBPROCESS
+
+    def __init__(self, engine, max_workers=2, read_only=True, memory_limit=None, kill_grace=KILL_GRACE_SECONDS):
+        self.engine = engine
+        self.max_workers = max_workers
+        self.read_only = read_only
+        self.memory_limit = memory_limit
+        self.kill_grace = kill_grace
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._idle = []
+        self._running = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.killed = 0
+
+    def _checkout(self):
+        self._slots.acquire()
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.usable:
+                    return worker
+                worker.close()
+        try:
+            worker = _Worker(self.memory_limit)
+        except OSError as e:
+            self._slots.release()
+            raise SQLExecutionError(f'Cannot start worker process: {e}')
+        with self._lock:
+            self.started += 1
+        return worker
+
+    def _checkin(self, worker, reusable):
+        if reusable and worker.usable:
+            with self._lock:
+                self._idle.append(worker)
+        else:
+            worker.close()
+            with self._lock:
+                self.killed += 1
+        self._slots.release()
+
+    def _run(self, kind, sql, params, target, limits, batch_size, execution_id, streaming=False):
+        """把请求发给工作进程并逐条产出响应消息（'end' / 'error' 之前的消息）
+
+        streaming 为真时，产出消息后等待调用方消费的时间不计入强制终止的期限（与工作进程中的超时一致）。
+        """
+        db_path = self.engine.targets().get(target)
+        if db_path is None:
+            raise SQLExecutionError(f'Unknown target database: {target}')
+
+        worker = self._checkout()
+
+        def arm(seconds):
+            armed = threading.Timer(max(seconds, 0), worker.kill, args=(TIMEOUT,))
+            armed.daemon = True
+            armed.start()
+            return armed
+
+        timer = None
+        if limits is not None and limits.timeout is not None:
+            remaining = limits.timeout + self.kill_grace
+            armed_at = time.perf_counter()
+            timer = arm(remaining)
+        if execution_id is not None:
+            with self._lock:
+                self._running[execution_id] = worker
+
+        start = time.perf_counter()
+        finished = False
+        try:
+            try:
+                worker.send((kind, db_path, self.read_only, sql, params,
+                             tuple(limits) if limits is not None else None, batch_size))
+                while True:
+                    message = worker.receive()
+                    if message[0] == 'end':
+                        finished = True
+                        return
+                    if message[0] == 'error':
+                        finished = True
+                        raise RemoteExecutionError(message[1])
+                    if not streaming or timer is None:
+                        yield message
+                        continue
+                    timer.cancel()
+                    remaining -= time.perf_counter() - armed_at
+                    yield message
+                    armed_at = time.perf_counter()
+                    timer = arm(remaining)
+            except (EOFError, OSError):
+                if worker.killed == TIMEOUT:
+                    raise BudgetExceededError(TIMEOUT, limits.timeout, _elapsed_ms(start))
+                if worker.killed == 'cancelled':
+                    raise SQLExecutionError('interrupted')
+                raise SQLExecutionError(f'Worker process exited unexpectedly (exit code {worker.process.poll()})')
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if execution_id is not None:
+                with self._lock:
+                    self._running.pop(execution_id, None)
+            # 中途放弃的流无法与工作进程重新同步，直接终止
+            self._checkin(worker, finished)
+
+    def connect(self, target=DEFAULT_TARGET):
+        if not self.engine.has_target(target):
+            raise SQLExecutionError(f'Unknown target database: {target}')
+        self._checkin(self._checkout(), True)
+        return {'driver': self.name, 'target': target, 'path': self.engine.targets()[target]}
+
+    def execute(self, sql, params=None, target=DEFAULT_TARGET, limits=None, result_format=FORMAT_OBJECTS,
+                use_cache=True, execution_id=None):
+        start = time.perf_counter()
+        columns = None
+        affected_rows = None
+        rows = []
+        try:
+            for message in self._run('execute', sql, params, target, limits, FETCH_BATCH_SIZE, execution_id):
+                if message[0] == 'header':
+                    _, columns, affected_rows = message
+                else:
+                    rows.extend(message[1])
+        except SQLExecutionError as e:
+            self.engine.record_query(sql, (time.perf_counter() - start) * 1000, target, e)
+            raise
+        self.engine.record_query(sql, (time.perf_counter() - start) * 1000, target)
+
+        if columns is None:
+            if self.engine.result_cache is not None:
+                self.engine.result_cache.invalidate(target)
+            return _statement_result(affected_rows, _elapsed_ms(start))
+        return _query_result(columns, rows, _elapsed_ms(start), result_format)
+
+    def stream(self, sql, params=None, target=DEFAULT_TARGET, batch_size=500, limits=None, execution_id=None):
+        start = time.perf_counter()
+        error = None
+        try:
+            for message in self._run('execute', sql, params, target, limits, batch_size, execution_id,
+                                     streaming=True):
+                if message[0] == 'header':
+                    yield {'columns': message[1], 'affectedRows': message[2]}
+                else:
+                    yield message[1]
+        except SQLExecutionError as e:
+            error = e
+            raise
+        finally:
+            self.engine.record_query(sql, (time.perf_counter() - start) * 1000, target, error)
+
+    def cancel(self, execution_id):
+        with self._lock:
+            worker = self._running.get(execution_id)
+        if worker is None:
+            return False
+        worker.kill('cancelled')
+        return True
+
+    def explain(self, sql, params=None, target=DEFAULT_TARGET, limits=None, snippet_id=None):
+        start = time.perf_counter()
+        rows = []
+        for message in self._run('explain', sql, params, target, limits, None, None):
+            rows.extend(message[1])
+        steps = [row[3] for row in rows]
+        return {
+            'success': True,
+            'plan': build_plan_tree(rows),
+            'steps': steps,
+            'warnings': [],
+            'cached': False,
+            'elapsedMs': _elapsed_ms(start),
+            'message': f'Query plan has {len(steps)} steps, 0 warnings'
+        }
+
+    def close(self):
+        with self._lock:
+            workers, self._idle = self._idle, []
+            running = list(self._running.values())
+        for worker in workers + running:
+            worker.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'maxWorkers': self.max_workers,
+                'idleWorkers': len(self._idle),
+                'running': len(self._running),
+                'started': self.started,
+                'killed': self.killed,
+                'readOnly': self.read_only
+            }
+
+
+class DriverRegistry:
+    """按请求和目标选择驱动
+
+    优先级：请求指定的驱动 > 目标配置的驱动（target_drivers）> 默认驱动。
+    未注册的目标只能使用 fallback 驱动（默认 mock）。
+    """
+
+    def __init__(self, engine, drivers, default=SQLITE, target_drivers=None, fallback=MOCK):
+        self.engine = engine
+        self.drivers = {driver.name: driver for driver in drivers}
+        self.default = default
+        self.target_drivers = dict(target_drivers or {})
+        self.fallback = fallback
+
+    def get(self, name):
+        driver = self.drivers.get(name)
+        if driver is None:
+            raise SQLExecutionError(f'Unknown driver: {name}; expected one of {", ".join(sorted(self.drivers))}')
+        return driver
+
+    def resolve(self, target=DEFAULT_TARGET, name=None):
+        """返回用于该目标的驱动"""
+        if not self.engine.has_target(target):
+            if name not in (None, self.fallback):
+                raise SQLExecutionError(f'Unknown target database: {target}')
+            return self.get(self.fallback)
+        return self.get(name or self.target_drivers.get(target) or self.default)
+
+    def cancel(self, execution_id):
+        """在所有驱动中取消该执行"""
+        return any([driver.cancel(execution_id) for driver in self.drivers.values()])
+
+    def stats(self):
+        return {
+            'default': self.default,
+            'targetDrivers': dict(self.target_drivers),
+            'drivers': {name: driver.stats() for name, driver in self.drivers.items()}
+        }
+
+    def close(self):
+        for driver in self.drivers.values():
+            driver.close()
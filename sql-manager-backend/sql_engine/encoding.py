@@ -0,0 +1,44 @@
+"""
+结果编码格式
+objects  （默认）每行一个对象：{'rows': [{col: val}, ...]}，列名在每行重复
+arrays   每行一个数组：{'format': 'arrays', 'rows': [[v1, v2], ...]}
+columnar 每列一个数组：{'format': 'columnar', 'data': [[col1...], [col2...]]}
+后两种只输出一次列名，宽结果的JSON体积和序列化时间明显更小。
+"""
+
+FORMAT_OBJECTS = 'objects'
+FORMAT_ARRAYS = 'arrays'
+FORMAT_COLUMNAR = 'columnar'
+
+RESULT_FORMATS = (FORMAT_OBJECTS, FORMAT_ARRAYS, FORMAT_COLUMNAR)
+
+
+def resolve_format(value):
+    """校验请求的结果格式，未指定时为objects"""
+    if not value:
+        return FORMAT_OBJECTS
+    if value not in RESULT_FORMATS:
+        raise ValueError(f'Unsupported result format: {value} (expected one of {", ".join(RESULT_FORMATS)})')
+    return value
+
+
+def shape_rows(columns, rows, fmt=FORMAT_OBJECTS):
+    """将行元组列表编码为指定格式，返回需合并进响应的字段"""
+    if fmt == FORMAT_ARRAYS:
+        return {'format': FORMAT_ARRAYS, 'rows': [list(row) for row in rows]}
+
+    if fmt == FORMAT_COLUMNAR:
+        if rows:
+            data = [list(values) for values in zip(*rows)]
+        else:
+            data = [[] for _ in columns]
+        return {'format': FORMAT_COLUMNAR, 'data': data, 'rowCount': len(rows)}
+
+    return {'rows': [dict(zip(columns, row)) for row in rows]}
+
+
+def format_result(result, fmt=FORMAT_OBJECTS):
+    """将结果字典中的 rows（行元组列表）原地替换为指定格式"""
+    rows = result.pop('rows')
+    result.update(shape_rows(result['columns'], rows, fmt))
+    return result
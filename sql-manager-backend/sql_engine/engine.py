@@ -0,0 +1,588 @@
+"""
+SQL执行引擎
+在配置的目标SQLite数据库上真实执行SQL语句，两个后端（app.py 与 run_minimal.py）共用
+"""
+
+import glob
+import os
+import sqlite3
+import threading
+import time
+from itertools import islice
+
+from .cache import is_cacheable
+from .coalesce import coalesce_key
+from .encoding import FORMAT_OBJECTS, format_result
+from .errors import SQLExecutionError
+from .limits import BudgetExceededError, BudgetGuard
+from .pool import ConnectionPool, PoolTimeoutError, connect
+from .tokenizer import is_query, iter_statements, statement_kind
+
+DEFAULT_TARGET = 'default'
+
+# 脚本中由 run_script 统一管理的事务控制语句
+_SKIPPED_SCRIPT_KINDS = ('begin', 'commit', 'end')
+
+# 脚本事件中语句文本的最大长度
+SCRIPT_PREVIEW_LENGTH = 200
+
+
+def targets_from_env(environ=None):
+    """从环境变量读取目标数据库配置
+
+    SQL_TARGET_DB=path            -> {'default': path}
+    SQL_TARGETS=name=path,name2=path2 -> 追加命名目标
+    SQL_TARGET_GLOB=/data/regions/*.db -> 每个匹配的文件注册为一个目标，名称为文件名（不含扩展名）
+    """
+    environ = os.environ if environ is None else environ
+    targets = {}
+
+    if environ.get('SQL_TARGET_DB'):
+        targets[DEFAULT_TARGET] = environ['SQL_TARGET_DB']
+
+    for item in environ.get('SQL_TARGETS', '').split(','):
+        if '=' in item:
+            name, path = item.split('=', 1)
+            if name.strip() and path.strip():
+                targets[name.strip()] = path.strip()
+
+    if environ.get('SQL_TARGET_GLOB'):
+        for path in sorted(glob.glob(environ['SQL_TARGET_GLOB'])):
+            name = os.path.splitext(os.path.basename(path))[0]
+            targets.setdefault(name, path)
+
+    return targets
+
+
+class SQLEngine:
+    """按目标数据库管理连接池并执行SQL
+
+    每个目标有两个连接池：只读查询（SELECT / VALUES / WITH ... SELECT）使用以
+    mode=ro 打开的读连接池，其余语句使用写连接池（默认只有一个连接，写入在进程内串行）。
+    写连接把数据库设为WAL模式后，读连接既不阻塞写入也不被写事务阻塞，读吞吐随线程数增长。
+    """
+
+    # execute() 内部分批读取的行数，便于在读取过程中检查行数预算
+    FETCH_BATCH_SIZE = 1000
+
+    def __init__(self, targets=None, read_pool_size=5, write_pool_size=1, pool_timeout=30.0, result_cache=None,
+                 query_stats=None, journal_mode='wal', coalescer=None):
+        self.read_pool_size = read_pool_size
+        self.write_pool_size = write_pool_size
+        self.pool_timeout = pool_timeout
+        self.result_cache = result_cache
+        self.query_stats = query_stats
+        self.coalescer = coalescer
+        self.journal_mode = journal_mode
+        self._targets = {}
+        self._pools = {}
+        self._read_pools = {}
+        self._probes = {}
+        self._running = {}
+        self._lock = threading.Lock()
+
+        for name, db_path in (targets or {}).items():
+            self.add_target(name, db_path)
+
+    def add_target(self, name, db_path):
+        """注册目标数据库"""
+        with self._lock:
+            self._targets[name] = db_path
+            old_pools = [self._pools.pop(name, None), self._read_pools.pop(name, None)]
+            old_probe = self._probes.pop(name, None)
+        for old_pool in old_pools:
+            if old_pool:
+                old_pool.close()
+        if old_probe:
+            old_probe[0].close()
+        if self.result_cache is not None:
+            self.result_cache.invalidate(name)
+
+    def has_target(self, name):
+        return name in self._targets
+
+    def targets(self):
+        """已注册的目标（名称 -> 文件路径）"""
+        return dict(self._targets)
+
+    def get_pool(self, target=DEFAULT_TARGET, read_only=False):
+        """获取目标数据库的写连接池或只读连接池（首次使用时创建）"""
+        pools = self._read_pools if read_only else self._pools
+        with self._lock:
+            pool = pools.get(target)
+            if pool is None:
+                if target not in self._targets:
+                    raise SQLExecutionError(f'Unknown target database: {target}')
+                if read_only:
+                    pool = ConnectionPool(
+                        self._targets[target],
+                        max_size=self.read_pool_size,
+                        timeout=self.pool_timeout,
+                        read_only=True
+                    )
+                else:
+                    pool = ConnectionPool(
+                        self._targets[target],
+                        max_size=self.write_pool_size,
+                        timeout=self.pool_timeout,
+                        journal_mode=self.journal_mode
+                    )
+                pools[target] = pool
+            return pool
+
+    def pool_for(self, sql, target=DEFAULT_TARGET):
+        """按语句类型选择连接池：只读查询用读连接池，其余用写连接池"""
+        return self.get_pool(target, read_only=is_query(sql))
+
+    def data_version(self, target=DEFAULT_TARGET):
+        """目标数据库的数据版本
+
+        使用一个从不写入的探测连接读取 PRAGMA data_version（其他任何连接提交后都会变化），
+        并附带数据库文件与WAL文件的mtime/大小，外部进程的修改同样能被感知。
+        """
+        with self._lock:
+            probe = self._probes.get(target)
+            if probe is None:
+                if target not in self._targets:
+                    raise SQLExecutionError(f'Unknown target database: {target}')
+                conn = connect(self._targets[target], read_only=True, check_same_thread=False)
+                probe = (conn, threading.Lock())
+                self._probes[target] = probe
+            db_path = self._targets[target]
+
+        conn, probe_lock = probe
+        try:
+            with probe_lock:
+                version = conn.execute('PRAGMA data_version').fetchone()[0]
+        except sqlite3.Error as e:
+            raise SQLExecutionError(str(e))
+
+        stamps = [version]
+        for path in (db_path, db_path + '-wal'):
+            try:
+                st = os.stat(path)
+                stamps.extend((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamps.extend((0, 0))
+        return tuple(stamps)
+
+    def record_query(self, sql, elapsed_ms, target=DEFAULT_TARGET, error=None):
+        """把一次执行的耗时计入查询统计（见 querylog 模块），未配置时忽略"""
+        if self.query_stats is not None:
+            self.query_stats.record(sql, elapsed_ms, target, error)
+
+    def execute(self, sql, params=None, target=DEFAULT_TARGET, use_cache=True, limits=None,
+                result_format=FORMAT_OBJECTS, execution_id=None):
+        """执行单条SQL语句并返回结果字典
+
+        配置了结果缓存时，只读查询先查缓存；写入语句执行后清除该目标的缓存。
+        limits（QueryLimits）限制墙钟时间、读取行数和VM指令数，超出时抛出BudgetExceededError。
+        result_format 见 encoding 模块（objects / arrays / columnar）。
+        包括缓存命中在内的每次执行都计入查询统计。
+        给出 execution_id 时执行期间可以通过 cancel(execution_id) 中断。
+        配置了 coalescer（QueryCoalescer）时，相同的只读查询正在执行时直接共享其结果（结果带 coalesced 标记）；
+        可取消的执行（给出 execution_id）不参与合并，避免一个用户的取消影响其他用户。
+        """
+        start = time.perf_counter()
+        try:
+            result = self._execute(sql, params, target, use_cache, limits, result_format, execution_id)
+        except SQLExecutionError as e:
+            self.record_query(sql, (time.perf_counter() - start) * 1000, target, e)
+            raise
+        self.record_query(sql, (time.perf_counter() - start) * 1000, target)
+        return result
+
+    def _execute(self, sql, params, target, use_cache, limits, result_format, execution_id):
+        cacheable = is_cacheable(sql, params)
+        coalesce = self.coalescer is not None and execution_id is None and cacheable
+        data_version = self.data_version(target) if coalesce or (use_cache and cacheable) else None
+
+        cache_key = None
+        if use_cache and self.result_cache is not None and cacheable:
+            lookup_start = time.perf_counter()
+            cache_key = self.result_cache.make_key(sql, params, target, data_version)
+            cached = self.result_cache.get(cache_key)
+            max_rows = limits.max_rows if limits is not None else None
+            if cached is not None and (max_rows is None or len(cached['rows']) <= max_rows):
+                result = format_result(dict(cached), result_format)
+                result['cached'] = True
+                result['elapsedMs'] = round((time.perf_counter() - lookup_start) * 1000, 3)
+                return result
+
+        if not coalesce:
+            return self._run(sql, params, target, limits, result_format, execution_id, cache_key)
+
+        key = coalesce_key(sql, params, target, data_version, limits)
+        result, shared = self.coalescer.do(
+            key, lambda: self._run(sql, params, target, limits, None, None, cache_key)
+        )
+        result = format_result(dict(result), result_format)
+        if shared:
+            result['coalesced'] = True
+        return result
+
+    def _run(self, sql, params, target, limits, result_format, execution_id, cache_key):
+        """在连接池的连接上执行；result_format 为 None 时返回未转换格式的结果（rows 为行元组列表）"""
+        pool = self.pool_for(sql, target)
+        start = time.perf_counter()
+        changed = 0
+
+        try:
+            conn = pool.acquire()
+        except PoolTimeoutError as e:
+            raise SQLExecutionError(str(e))
+
+        self._register(execution_id, conn)
+        cursor = conn.cursor()
+        changes_before = conn.total_changes
+        try:
+            with BudgetGuard(conn, limits) as guard:
+                try:
+                    cursor.execute(sql, params or ())
+                    if cursor.description is not None:
+                        columns = [d[0] for d in cursor.description]
+                        rows = []
+                        while True:
+                            batch = cursor.fetchmany(self.FETCH_BATCH_SIZE)
+                            if not batch:
+                                break
+                            guard.add_rows(len(batch))
+                            rows.extend(batch)
+                        affected_rows = None
+                        changed = conn.total_changes - changes_before
+                    else:
+                        columns = None
+                        rows = None
+                        affected_rows = conn.total_changes - changes_before
+                except sqlite3.Error as e:
+                    raise guard.translate(e)
+        finally:
+            self._unregister(execution_id)
+            cursor.close()
+            pool.release(conn)
+
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+
+        if self.result_cache is not None and (columns is None or changed):
+            self.result_cache.invalidate(target)
+
+        if columns is not None:
+            result = {
+                'columns': columns,
+                'rows': rows,
+                'success': True,
+                'elapsedMs': elapsed_ms,
+                'message': f'Successfully executed query, returned {len(rows)} rows'
+            }
+            if cache_key is not None and not changed:
+                self.result_cache.put(cache_key, result)
+                result = dict(result, cached=False)
+            return format_result(result, result_format) if result_format is not None else result
+
+        return {
+            'success': True,
+            'affectedRows': affected_rows,
+            'elapsedMs': elapsed_ms,
+            'message': 'SQL statement executed successfully'
+        }
+
+    def stream(self, sql, params=None, target=DEFAULT_TARGET, batch_size=500, limits=None, execution_id=None):
+        """以fetchmany分批读取结果的生成器
+
+        第一次产出 {'columns': [...] 或 None, 'affectedRows': n 或 None}，
+        之后每次产出一批行元组（最多batch_size行），内存占用与结果总行数无关。
+        连接在生成器结束或被关闭时归还连接池。
+        limits中的超时只计算在SQLite中执行和读取的时间，等待调用方消费结果（如客户端读取较慢）的时间
+        不计入；查询统计记录的是整个流的耗时。
+        """
+        pool = self.pool_for(sql, target)
+        start = time.perf_counter()
+
+        try:
+            conn = pool.acquire()
+        except PoolTimeoutError as e:
+            raise SQLExecutionError(str(e))
+
+        self._register(execution_id, conn)
+        cursor = conn.cursor()
+        changes_before = conn.total_changes
+        error = None
+        try:
+            with BudgetGuard(conn, limits) as guard:
+                try:
+                    cursor.execute(sql, params or ())
+                except sqlite3.Error as e:
+                    raise guard.translate(e)
+
+                if cursor.description is None:
+                    yield {'columns': None, 'affectedRows': conn.total_changes - changes_before}
+                    return
+
+                guard.pause()
+                yield {'columns': [d[0] for d in cursor.description], 'affectedRows': None}
+                guard.resume()
+
+                while True:
+                    try:
+                        batch = cursor.fetchmany(batch_size)
+                    except sqlite3.Error as e:
+                        raise guard.translate(e)
+                    if not batch:
+                        break
+                    guard.add_rows(len(batch))
+                    guard.pause()
+                    yield batch
+                    guard.resume()
+        except SQLExecutionError as e:
+            error = e
+            raise
+        finally:
+            self._unregister(execution_id)
+            cursor.close()
+            pool.release(conn)
+            self.record_query(sql, (time.perf_counter() - start) * 1000, target, error)
+
+    def _register(self, execution_id, conn):
+        if execution_id is not None:
+            with self._lock:
+                self._running[execution_id] = conn
+
+    def _unregister(self, execution_id):
+        if execution_id is not None:
+            with self._lock:
+                self._running.pop(execution_id, None)
+
+    def cancel(self, execution_id):
+        """中断正在执行的语句（sqlite3.Connection.interrupt），返回是否找到该执行"""
+        with self._lock:
+            conn = self._running.get(execution_id)
+        if conn is None:
+            return False
+        conn.interrupt()
+        return True
+
+    def execute_many(self, sql, rows, target=DEFAULT_TARGET, batch_size=1000, limits=None):
+        """以executemany分批执行参数化的写入语句，每批一个事务
+
+        rows 为参数行的可迭代对象（序列或命名参数字典），按批读取，可以是流式生成器。
+        遇到失败的批次时回滚该批次，逐行重放定位第一个失败的行后停止；
+        之前已提交的批次保留。limits 对每个批次单独生效。
+        返回包含吞吐量统计的结果字典，失败时 success 为 False 并带有 failedRow。
+        """
+        if is_query(sql):
+            raise SQLExecutionError('Bulk execution only accepts data-modifying statements')
+
+        pool = self.get_pool(target)
+        start = time.perf_counter()
+
+        try:
+            conn = pool.acquire()
+        except PoolTimeoutError as e:
+            raise SQLExecutionError(str(e))
+
+        cursor = conn.cursor()
+        rows = iter(rows)
+        applied = 0
+        affected = 0
+        batches = 0
+        failure = None
+        try:
+            while True:
+                try:
+                    batch = list(islice(rows, batch_size))
+                except SQLExecutionError as e:
+                    # 流式输入中的行无法解析
+                    failure = dict(e.to_dict(), failedRow=applied)
+                    break
+                if not batch:
+                    break
+
+                changes_before = conn.total_changes
+                try:
+                    with BudgetGuard(conn, limits) as guard:
+                        try:
+                            cursor.execute('BEGIN IMMEDIATE')
+                            cursor.executemany(sql, batch)
+                            cursor.execute('COMMIT')
+                        except sqlite3.Error as e:
+                            raise guard.translate(e)
+                except SQLExecutionError as e:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    failure = e.to_dict()
+                    offset = 0
+                    if not isinstance(e, BudgetExceededError):
+                        offset, message = self._find_failing_row(conn, cursor, sql, batch)
+                        failure['error'] = message or failure['error']
+                    failure['failedRow'] = applied + offset
+                    failure['failedParams'] = batch[offset]
+                    break
+
+                applied += len(batch)
+                affected += conn.total_changes - changes_before
+                batches += 1
+        finally:
+            cursor.close()
+            pool.release(conn)
+            if self.result_cache is not None and applied:
+                self.result_cache.invalidate(target)
+
+        elapsed = time.perf_counter() - start
+        result = {
+            'success': failure is None,
+            'rowsApplied': applied,
+            'affectedRows': affected,
+            'batches': batches,
+            'batchSize': batch_size,
+            'elapsedMs': round(elapsed * 1000, 3),
+            'rowsPerSecond': round(applied / elapsed, 1) if elapsed > 0 else None
+        }
+        if failure is not None:
+            result.update(failure)
+            result['success'] = False
+        return result
+
+    @staticmethod
+    def _find_failing_row(conn, cursor, sql, batch):
+        """在回滚后的事务中逐行重放批次，返回 (第一个失败行的偏移, 错误信息)"""
+        try:
+            cursor.execute('BEGIN')
+            for offset, params in enumerate(batch):
+                try:
+                    cursor.execute(sql, params)
+                except sqlite3.Error as e:
+                    return offset, str(e)
+        except sqlite3.Error:
+            pass
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+        return 0, None
+
+    def run_script(self, script, target=DEFAULT_TARGET, limits=None):
+        """在单个事务中逐条执行多语句脚本的生成器
+
+        依次产出事件字典：
+            {'type': 'begin'}                          事务已开始
+            {'type': 'statement', 'index': i, 'kind': ..., 'rowCount' 或 'affectedRows', 'elapsedMs': t}
+            {'type': 'end', 'statementCount': n, ...}  全部成功并已提交
+            {'type': 'error', 'index': i, ...}         语句失败，整个事务已回滚
+        脚本中的 BEGIN / COMMIT / END 被跳过，ROLLBACK 视为错误；limits 对每条语句单独生效。
+        无法获取连接或开始事务时在第一次产出前抛出 SQLExecutionError。
+        """
+        pool = self.get_pool(target)
+        start = time.perf_counter()
+
+        try:
+            conn = pool.acquire()
+        except PoolTimeoutError as e:
+            raise SQLExecutionError(str(e))
+
+        cursor = conn.cursor()
+        index = -1
+        executed = 0
+        try:
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+            except sqlite3.Error as e:
+                raise SQLExecutionError(str(e))
+            yield {'type': 'begin'}
+
+            for index, sql in enumerate(iter_statements(script)):
+                kind = statement_kind(sql)
+                event = {'type': 'statement', 'index': index, 'kind': kind, 'sql': sql[:SCRIPT_PREVIEW_LENGTH]}
+
+                if kind in _SKIPPED_SCRIPT_KINDS:
+                    event['skipped'] = True
+                    yield event
+                    continue
+
+                statement_start = time.perf_counter()
+                changes_before = conn.total_changes
+                try:
+                    if kind == 'rollback':
+                        raise SQLExecutionError('ROLLBACK is not allowed inside a script')
+                    with BudgetGuard(conn, limits) as guard:
+                        try:
+                            cursor.execute(sql)
+                            if cursor.description is not None:
+                                row_count = 0
+                                while True:
+                                    batch = cursor.fetchmany(self.FETCH_BATCH_SIZE)
+                                    if not batch:
+                                        break
+                                    guard.add_rows(len(batch))
+                                    row_count += len(batch)
+                                event['rowCount'] = row_count
+                            else:
+                                event['affectedRows'] = conn.total_changes - changes_before
+                        except sqlite3.Error as e:
+                            raise guard.translate(e)
+                except SQLExecutionError as e:
+                    yield self._script_error(conn, e.to_dict(), index, event['sql'], executed, start)
+                    return
+
+                executed += 1
+                event['elapsedMs'] = round((time.perf_counter() - statement_start) * 1000, 3)
+                yield event
+
+            try:
+                cursor.execute('COMMIT')
+            except sqlite3.Error as e:
+                yield self._script_error(conn, SQLExecutionError(str(e)).to_dict(), index, None, executed, start)
+                return
+
+            yield {
+                'type': 'end',
+                'success': True,
+                'statementCount': executed,
+                'elapsedMs': round((time.perf_counter() - start) * 1000, 3)
+            }
+        finally:
+            cursor.close()
+            # 中途断开时 release() 会回滚未提交的事务
+            pool.release(conn)
+            if self.result_cache is not None and executed:
+                self.result_cache.invalidate(target)
+
+    @staticmethod
+    def _script_error(conn, error, index, sql, executed, start):
+        """回滚脚本事务并构造错误事件"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            pass
+        error.update({
+            'type': 'error',
+            'index': index,
+            'sql': sql,
+            'rolledBack': True,
+            'statementCount': executed,
+            'elapsedMs': round((time.perf_counter() - start) * 1000, 3)
+        })
+        return error
+
+    def stats(self):
+        """各目标读写连接池状态"""
+        with self._lock:
+            return {
+                name: {
+                    'write': self._pools[name].stats() if name in self._pools else None,
+                    'read': self._read_pools[name].stats() if name in self._read_pools else None
+                }
+                for name in set(self._pools) | set(self._read_pools)
+            }
+
+    def close(self):
+        """关闭所有连接池"""
+        with self._lock:
+            pools = list(self._pools.values()) + list(self._read_pools.values())
+            probes = list(self._probes.values())
+            self._pools.clear()
+            self._read_pools.clear()
+            self._probes.clear()
+        for pool in pools:
+            pool.close()
+        for conn, _ in probes:
+            conn.close()
@@ -0,0 +1,11 @@
+"""
+执行引擎异常
+"""
+
+
+class SQLExecutionError(Exception):
+    """SQL执行失败"""
+
+    def to_dict(self):
+        """错误响应体"""
+        return {'error': str(self), 'success': False}
@@ -0,0 +1,113 @@
+"""
+服务端导出
+执行查询并直接从游标按批编码为 CSV / TSV / JSONL 文件流，可选gzip压缩，
+内存占用只与批大小有关，与导出的总行数无关。
+"""
+
+import csv
+import io
+import json
+import logging
+import zlib
+
+from .engine import DEFAULT_TARGET
+from .errors import SQLExecutionError
+from .streaming import DEFAULT_BATCH_SIZE, json_default
+from .tokenizer import is_query
+
+EXPORT_CSV = 'csv'
+EXPORT_TSV = 'tsv'
+EXPORT_JSONL = 'jsonl'
+
+# 格式 -> (Content-Type, 文件扩展名)
+EXPORT_FORMATS = {
+    EXPORT_CSV: ('text/csv; charset=utf-8', 'csv'),
+    EXPORT_TSV: ('text/tab-separated-values; charset=utf-8', 'tsv'),
+    EXPORT_JSONL: ('application/x-ndjson; charset=utf-8', 'jsonl'),
+}
+
+GZIP_MIMETYPE = 'application/gzip'
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_export_format(value):
+    """校验导出格式，未指定时为csv"""
+    value = (value or EXPORT_CSV).lower()
+    if value not in EXPORT_FORMATS:
+        raise ValueError(f'Unsupported export format: {value} (expected one of {", ".join(EXPORT_FORMATS)})')
+    return value
+
+
+def export_headers(fmt, compress=False, filename='sql_results'):
+    """返回 (Content-Type, Content-Disposition)"""
+    content_type, extension = EXPORT_FORMATS[fmt]
+    filename = f'{filename}.{extension}'
+    if compress:
+        content_type = GZIP_MIMETYPE
+        filename += '.gz'
+    return content_type, f'attachment; filename="{filename}"'
+
+
+def export_chunks(engine, sql, params=None, target=DEFAULT_TARGET, fmt=EXPORT_CSV, compress=False,
+                  batch_size=DEFAULT_BATCH_SIZE, limits=None):
+    """执行语句并返回导出文件的字节块生成器
+
+    与 ndjson_lines 相同，语句在返回前已执行，SQL错误在发送响应头之前抛出。
+    非查询语句在执行之前即被拒绝，导出只使用只读连接。读取中途出错时生成器重新抛出SQLExecutionError，
+    调用方应中断分块传输（不发送结束块），客户端据此知道文件不完整。
+    """
+    if not is_query(sql):
+        raise SQLExecutionError('Only statements that return rows can be exported')
+
+    batches = engine.stream(sql, params, target=target, batch_size=batch_size, limits=limits)
+    header = next(batches)
+    if header['columns'] is None:
+        batches.close()
+        raise SQLExecutionError('Only statements that return rows can be exported')
+
+    chunks = _encode(batches, header['columns'], fmt)
+    if compress:
+        chunks = _gzip(chunks)
+    return chunks
+
+
+def _encode(batches, columns, fmt):
+    """逐批编码，每批产出一个字节块"""
+    try:
+        if fmt == EXPORT_JSONL:
+            dumps = json.JSONEncoder(default=json_default, ensure_ascii=False, separators=(',', ':')).encode
+            for batch in batches:
+                yield ''.join([dumps(dict(zip(columns, row))) + '\n' for row in batch]).encode('utf-8')
+            return
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, dialect='excel-tab' if fmt == EXPORT_TSV else 'excel', lineterminator='\n')
+        writer.writerow(columns)
+        for batch in batches:
+            writer.writerows(batch)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        # 没有数据行时只输出表头
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+    except SQLExecutionError as e:
+        # 响应头已发送，只能中断传输，不能当作完整的文件结束
+        logger.warning('Export aborted: %s', e)
+        raise
+    finally:
+        batches.close()
+
+
+def _gzip(chunks):
+    """流式gzip压缩"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        chunks.close()
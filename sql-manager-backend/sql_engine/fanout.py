@@ -0,0 +1,233 @@
+"""
+多目标并行执行
+同一条语句在多个目标数据库（例如每个地区一个SQLite文件）上并发执行，
+结果合并为一个结果集并加上来源列，可选地在合并后按列排序并截取前N行。
+单个目标失败不影响整个请求，每个目标的耗时和错误单独报告。
+
+传入准入控制器时，并行宽度受准入名额限制：请求本身占用的名额算作一个执行通道，
+其余通道逐个向准入控制器申请，申请不到就不再扩宽，剩余目标由已有通道依次执行。
+"""
+
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+
+from .encoding import FORMAT_ARRAYS, FORMAT_OBJECTS, shape_rows
+from .errors import SQLExecutionError
+
+# 合并结果中标记行来源目标的列名
+SOURCE_COLUMN = '_source'
+
+MAX_FANOUT_TARGETS = 256
+
+_GLOB_CHARS = ('*', '?', '[')
+
+
+def _sort_key(value):
+    """按SQLite的类型顺序比较：NULL < 数值 < 文本 < BLOB"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, bytes(value))
+
+
+def parse_order_by(spec):
+    """解析合并排序规则
+
+    接受 "total DESC, region" 形式的字符串，或 [{'column': 'total', 'desc': true}, ...]，
+    返回 [(列名, 是否降序), ...]。
+    """
+    if not spec:
+        return []
+    if isinstance(spec, str):
+        terms = []
+        for part in spec.split(','):
+            words = part.split()
+            if not words or len(words) > 2 or (len(words) == 2 and words[1].lower() not in ('asc', 'desc')):
+                raise ValueError(f'Invalid orderBy term: {part.strip()!r}')
+            terms.append((words[0], len(words) == 2 and words[1].lower() == 'desc'))
+        return terms
+    return [(term['column'], bool(term.get('desc'))) for term in spec]
+
+
+class FanOutExecutor:
+    """在工作线程池中对多个目标执行语句并合并结果"""
+
+    def __init__(self, engine, max_workers=8):
+        self.engine = engine
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sql-fanout')
+
+    def resolve_targets(self, spec):
+        """目标名称列表，或匹配已注册目标名称的通配模式（如 "region_*"）"""
+        registered = sorted(self.engine.targets())
+        if isinstance(spec, str):
+            if any(c in spec for c in _GLOB_CHARS):
+                names = [name for name in registered if fnmatchcase(name, spec)]
+            else:
+                names = [spec]
+        elif isinstance(spec, (list, tuple)):
+            names = list(dict.fromkeys(str(name) for name in spec))
+        else:
+            raise SQLExecutionError('targets must be a list of target names or a glob pattern')
+
+        if not names:
+            raise SQLExecutionError(f'No target database matches: {spec}')
+        if len(names) > MAX_FANOUT_TARGETS:
+            raise SQLExecutionError(f'Too many targets ({len(names)}, at most {MAX_FANOUT_TARGETS})')
+        unknown = [name for name in names if not self.engine.has_target(name)]
+        if unknown:
+            raise SQLExecutionError(f'Unknown target database: {", ".join(unknown)}')
+        return names
+
+    def execute(self, sql, params=None, targets=(), limits=None, order_by=None, limit=None,
+                result_format=FORMAT_OBJECTS, admission=None, user=None):
+        """并发执行并返回合并后的结果字典
+
+        limits 为 {目标: QueryLimits}，每个目标单独计算预算。
+        order_by / limit 在合并后的结果上生效；各目标各自的ORDER BY不影响合并顺序。
+        只要有一个目标成功 success 即为真，失败的目标列在 targets 中并计入 failedTargets。
+        admission / user 给出时，调用方须已为本请求占用一个名额，额外的并行通道各占用该用户的一个名额。
+        """
+        order_by = parse_order_by(order_by)
+        if limit is not None:
+            limit = int(limit)
+            if limit < 0:
+                raise ValueError('limit must not be negative')
+
+        start = time.perf_counter()
+        limits = limits or {}
+        pending = deque(enumerate(targets))
+        outcomes = [None] * len(pending)
+        if admission is None:
+            lanes = [None] * len(pending)
+        else:
+            lanes = [None]
+            width = min(len(pending), self.max_workers)
+            while len(lanes) < width:
+                ticket = admission.try_acquire(user)
+                if ticket is None:
+                    break
+                lanes.append(ticket)
+
+        futures = []
+        try:
+            for ticket in lanes:
+                futures.append(self._executor.submit(self._run_lane, sql, params, limits, pending, outcomes, ticket))
+        except BaseException:
+            for ticket in lanes[len(futures):]:
+                if ticket is not None:
+                    ticket.release()
+            raise
+        for future in futures:
+            future.result()
+
+        reports = []
+        results = []
+        for (report, result), target in zip(outcomes, targets):
+            reports.append(report)
+            if result is not None:
+                results.append((target, result))
+
+        merged = self._merge(results, reports, order_by, limit, result_format)
+        failed = sum(1 for report in reports if not report['success'])
+        merged.update({
+            'success': failed < len(reports),
+            'targets': reports,
+            'failedTargets': failed,
+            'elapsedMs': round((time.perf_counter() - start) * 1000, 3)
+        })
+        if failed == len(reports):
+            merged['error'] = 'Statement failed on all targets'
+        return merged
+
+    def _run_lane(self, sql, params, limits, pending, outcomes, ticket):
+        """一个执行通道：依次取出待执行的目标直到取完，结束后归还本通道占用的准入名额"""
+        try:
+            while True:
+                try:
+                    index, target = pending.popleft()
+                except IndexError:
+                    return
+                outcomes[index] = self._run_one(sql, params, target, limits.get(target))
+        finally:
+            if ticket is not None:
+                ticket.release()
+
+    def _run_one(self, sql, params, target, limits):
+        """在单个目标上执行，返回 (报告, 结果或None)"""
+        start = time.perf_counter()
+        report = {'target': target}
+        try:
+            result = self.engine.execute(sql, params, target=target, limits=limits, result_format=FORMAT_ARRAYS)
+        except SQLExecutionError as e:
+            report.update(e.to_dict())
+            report['elapsedMs'] = round((time.perf_counter() - start) * 1000, 3)
+            return report, None
+
+        report.update({'success': True, 'elapsedMs': round((time.perf_counter() - start) * 1000, 3)})
+        if 'columns' in result:
+            report['rowCount'] = len(result['rows'])
+        else:
+            report['affectedRows'] = result['affectedRows']
+        return report, result
+
+    def _merge(self, results, reports, order_by, limit, result_format):
+        """拼接各目标的行并加上来源列，列名不一致的目标按失败处理"""
+        columns = None
+        rows = []
+        affected = None
+        merged_targets = 0
+        for target, result in results:
+            if 'columns' not in result:
+                affected = (affected or 0) + result['affectedRows']
+                continue
+            if columns is None:
+                columns = result['columns']
+            elif result['columns'] != columns:
+                report = next(r for r in reports if r['target'] == target)
+                report.update({
+                    'success': False,
+                    'error': f'Columns differ from the other targets: {", ".join(result["columns"])}'
+                })
+                report.pop('rowCount', None)
+                continue
+            rows.extend([target] + row for row in result['rows'])
+            merged_targets += 1
+
+        if columns is None:
+            return {} if affected is None else {'affectedRows': affected, 'message': 'SQL statement executed'}
+
+        merged_columns = [SOURCE_COLUMN] + columns
+        if order_by:
+            rows = self._sort(merged_columns, rows, order_by)
+        truncated = limit is not None and len(rows) > limit
+        if truncated:
+            rows = rows[:limit]
+
+        result = {'columns': merged_columns, 'truncated': truncated}
+        result.update(shape_rows(merged_columns, rows, result_format))
+        result['rowCount'] = len(rows)
+        result['message'] = f'Merged {len(rows)} rows from {merged_targets} targets'
+        return result
+
+    @staticmethod
+    def _sort(columns, rows, order_by):
+        """按多个列稳定排序（从最后一个排序列开始逐列排序）
+
+        各目标的结果通常已按同样的列排好序，timsort会利用这些有序段，
+        拼接后的排序接近k路归并的代价。
+        """
+        for name, desc in reversed(order_by):
+            if name not in columns:
+                raise ValueError(f'orderBy column not in result: {name}')
+            index = columns.index(name)
+            rows.sort(key=lambda row: _sort_key(row[index]), reverse=desc)
+        return rows
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,294 @@
+"""
+异步查询任务
+POST /api/jobs 提交后立即返回任务ID，查询在有界工作线程池中执行，
+可轮询状态和已读取的行，运行中的任务通过 sqlite3.Connection.interrupt() 取消。
+已结束的任务在保留期（result_ttl）内可查询，之后被清理。
+配置了准入控制（AdmissionController）时任务以后台优先级等待放行，放行后才交给工作线程，
+等待期间仍为排队状态，不占用工作线程（个别用户排队的任务不会挡住其他用户的任务）。
+结果行保存在 ResultBuffer 中，超过内存预算时溢出到临时文件（见 buffer 模块）。
+"""
+
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from .admission import PRIORITY_BACKGROUND
+from .buffer import REQUEST_MEMORY_BYTES, ResultBuffer
+from .encoding import FORMAT_OBJECTS, shape_rows
+from .engine import DEFAULT_TARGET
+from .errors import SQLExecutionError
+from .limits import BudgetGuard
+from .pool import PoolTimeoutError
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobNotFoundError(Exception):
+    """任务不存在、已过期或不属于当前用户"""
+
+
+class JobQueueFullError(Exception):
+    """等待执行的任务过多"""
+
+
+class QueryJob:
+    """单个异步查询任务"""
+
+    def __init__(self, sql, params, target, owner, limits=None, buffer=None):
+        self.id = uuid.uuid4().hex
+        self.sql = sql
+        self.params = params or ()
+        self.target = target
+        self.owner = owner
+        self.limits = limits
+        self.status = QUEUED
+        self.columns = None
+        self.buffer = buffer if buffer is not None else ResultBuffer()
+        self.affected_rows = None
+        self.error = None
+        self.error_info = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self.cancel_requested = False
+        self.lock = threading.Lock()
+        self._conn = None
+        self._ticket = None
+
+    def to_dict(self, offset=0, limit=None, result_format=FORMAT_OBJECTS):
+        """任务状态及已读取的行（按offset/limit截取）"""
+        with self.lock:
+            end = None if limit is None else offset + limit
+            rows = self.buffer.slice(offset, end)
+            row_count = len(self.buffer)
+            spilled = self.buffer.spilled
+            status = self.status
+
+        result = {
+            'jobId': self.id,
+            'status': status,
+            'target': self.target,
+            'rowCount': row_count,
+            'createdAt': self.created_at,
+            'startedAt': self.started_at,
+            'finishedAt': self.finished_at,
+            'success': status != FAILED
+        }
+        if self.started_at:
+            result['elapsedMs'] = round(((self.finished_at or time.time()) - self.started_at) * 1000, 3)
+        if self.columns is not None:
+            result['columns'] = self.columns
+            result.update(shape_rows(self.columns, rows, result_format))
+            result['rowCount'] = row_count
+            result['offset'] = offset
+            result['spilled'] = spilled
+        if self.affected_rows is not None:
+            result['affectedRows'] = self.affected_rows
+        if self.error_info:
+            result.update(self.error_info)
+            result['success'] = False
+        return result
+
+    def iter_batches(self, offset=0, batch_size=500):
+        """从offset开始按批读取已缓冲的行（运行中的任务只读到当前已读取的部分）"""
+        return self.buffer.iter_batches(batch_size, offset, lock=self.lock)
+
+
+class JobManager:
+    """在有界线程池中执行查询任务"""
+
+    def __init__(self, engine, max_workers=4, max_pending=100, result_ttl=600, batch_size=500,
+                 memory_budget=None, buffer_memory_bytes=REQUEST_MEMORY_BYTES, spill_dir=None, admission=None):
+        self.engine = engine
+        self.admission = admission
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.batch_size = batch_size
+        self.memory_budget = memory_budget
+        self.buffer_memory_bytes = buffer_memory_bytes
+        self.spill_dir = spill_dir
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sql-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, sql, params=None, target=DEFAULT_TARGET, owner=None, limits=None):
+        """提交任务，返回QueryJob"""
+        self.evict_expired()
+
+        if not self.engine.has_target(target):
+            raise SQLExecutionError(f'Unknown target database: {target}')
+
+        buffer = ResultBuffer(self.memory_budget, self.buffer_memory_bytes, self.spill_dir)
+        job = QueryJob(sql, params, target, owner, limits, buffer)
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j.status in (QUEUED, RUNNING))
+            if pending >= self.max_pending:
+                raise JobQueueFullError(f'Too many pending jobs ({pending})')
+            self._jobs[job.id] = job
+
+        if self.admission is None:
+            job.future = self._executor.submit(self._run, job)
+        else:
+            ticket = self.admission.enqueue(job.owner, PRIORITY_BACKGROUND, on_admit=partial(self._admitted, job))
+            with job.lock:
+                job._ticket = ticket
+        return job
+
+    def get(self, job_id, owner=None):
+        """获取任务"""
+        self.evict_expired()
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            raise JobNotFoundError(f'Job not found or expired: {job_id}')
+        return job
+
+    def cancel(self, job_id, owner=None):
+        """取消任务：排队中的直接取消，运行中的中断其连接"""
+        job = self.get(job_id, owner)
+        ticket = conn = None
+        with job.lock:
+            if job.status in FINISHED_STATES:
+                return job
+            job.cancel_requested = True
+            if job.status == QUEUED:
+                if job.future is None:
+                    # 仍在等待准入放行；取消失败说明刚刚放行，由工作线程按取消处理
+                    cancelled = job._ticket is not None and job._ticket.cancel()
+                else:
+                    # 已交给线程池但尚未开始执行，取消后归还其准入名额
+                    cancelled = job.future.cancel()
+                    ticket = job._ticket if cancelled else None
+                if cancelled:
+                    job.status = CANCELLED
+                    job.finished_at = time.time()
+            conn = job._conn
+
+        # 归还名额可能放行并调用其他任务的回调，须在任务锁之外进行
+        if ticket is not None:
+            ticket.release()
+        if conn is not None:
+            conn.interrupt()
+        return job
+
+    def _admitted(self, job, ticket):
+        """准入放行时把任务交给工作线程"""
+        with job.lock:
+            job._ticket = ticket
+            job.future = self._executor.submit(self._run, job, ticket)
+
+    def _run(self, job, ticket=None):
+        """工作线程中执行任务，结束后归还准入名额"""
+        try:
+            self._execute(job)
+        finally:
+            if ticket is not None:
+                ticket.release()
+
+    def _execute(self, job):
+        with job.lock:
+            if job.cancel_requested:
+                job.status = CANCELLED
+                job.finished_at = time.time()
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+
+        try:
+            pool = self.engine.pool_for(job.sql, job.target)
+            conn = pool.acquire()
+        except SQLExecutionError as e:
+            self._finish(job, FAILED, e)
+            return
+        except PoolTimeoutError as e:
+            self._finish(job, FAILED, SQLExecutionError(str(e)))
+            return
+
+        with job.lock:
+            job._conn = conn
+        cursor = conn.cursor()
+        try:
+            with BudgetGuard(conn, job.limits) as guard:
+                try:
+                    # 取消请求可能在连接登记之前到达，此时interrupt()尚未生效
+                    if job.cancel_requested:
+                        raise sqlite3.OperationalError('interrupted')
+                    changes_before = conn.total_changes
+                    cursor.execute(job.sql, job.params)
+
+                    if cursor.description is None:
+                        job.affected_rows = conn.total_changes - changes_before
+                    else:
+                        job.columns = [d[0] for d in cursor.description]
+                        while True:
+                            batch = cursor.fetchmany(self.batch_size)
+                            if not batch:
+                                break
+                            guard.add_rows(len(batch))
+                            with job.lock:
+                                job.buffer.extend(batch)
+                            if job.cancel_requested:
+                                raise sqlite3.OperationalError('interrupted')
+                except sqlite3.Error as e:
+                    if job.cancel_requested:
+                        self._finish(job, CANCELLED)
+                        return
+                    raise guard.translate(e)
+            self._finish(job, SUCCEEDED)
+        except SQLExecutionError as e:
+            self._finish(job, FAILED, e)
+        finally:
+            with job.lock:
+                job._conn = None
+            cursor.close()
+            pool.release(conn)
+
+    def _finish(self, job, status, error=None):
+        with job.lock:
+            job.status = status
+            if error is not None:
+                job.error = str(error)
+                job.error_info = error.to_dict()
+            job.finished_at = time.time()
+
+    def evict_expired(self):
+        """清理超过保留期的已结束任务"""
+        deadline = time.time() - self.result_ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.status in FINISHED_STATES and job.finished_at and job.finished_at < deadline
+            ]
+            jobs = [self._jobs.pop(job_id) for job_id in expired]
+        for job in jobs:
+            with job.lock:
+                job.buffer.close()
+        return len(expired)
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        result = {'jobs': counts, 'maxPending': self.max_pending, 'resultTtl': self.result_ttl}
+        if self.memory_budget is not None:
+            result['memory'] = self.memory_budget.stats()
+        return result
+
+    def shutdown(self):
+        """取消所有任务并关闭线程池"""
+        with self._lock:
+            job_ids = list(self._jobs)
+        for job_id in job_ids:
+            self.cancel(job_id)
+        self._executor.shutdown(wait=False)
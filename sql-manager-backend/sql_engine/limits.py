@@ -0,0 +1,179 @@
+"""
+语句执行预算
+通过 set_progress_handler 为每条语句施加墙钟超时和VM指令数上限，并限制读取的行数。
+超出预算时抛出带有部分耗时信息的 BudgetExceededError。
+流式读取时产出结果后等待调用方消费的时间通过 pause() / resume() 排除，超时只计算在SQLite中的时间。
+"""
+
+import time
+from collections import namedtuple
+
+from .errors import SQLExecutionError
+
+# 每执行多少条VM指令回调一次进度处理器
+PROGRESS_INTERVAL = 1000
+
+TIMEOUT = 'timeout'
+MAX_ROWS = 'maxRows'
+MAX_VM_STEPS = 'maxVmSteps'
+
+# timeout: 秒；max_rows: 行；max_vm_steps: VM指令数。None表示不限制
+QueryLimits = namedtuple('QueryLimits', ['timeout', 'max_rows', 'max_vm_steps'])
+QueryLimits.__new__.__defaults__ = (None, None, None)
+
+UNLIMITED = QueryLimits()
+
+
+def limits_from_dict(data):
+    """从配置字典（timeout / maxRows / maxVmSteps）构造QueryLimits"""
+    data = data or {}
+    return QueryLimits(
+        timeout=data.get('timeout'),
+        max_rows=data.get('maxRows'),
+        max_vm_steps=data.get('maxVmSteps')
+    )
+
+
+class BudgetExceededError(SQLExecutionError):
+    """语句超出执行预算"""
+
+    def __init__(self, budget, limit, elapsed_ms, rows_read=0, vm_steps=0):
+        self.budget = budget
+        self.limit = limit
+        self.elapsed_ms = elapsed_ms
+        self.rows_read = rows_read
+        self.vm_steps = vm_steps
+        super().__init__(f'Statement exceeded {budget} budget ({limit}) after {elapsed_ms} ms')
+
+    def to_dict(self):
+        result = super().to_dict()
+        result.update({
+            'errorType': 'budget_exceeded',
+            'budget': self.budget,
+            'limit': self.limit,
+            'elapsedMs': self.elapsed_ms,
+            'rowsRead': self.rows_read,
+            'vmSteps': self.vm_steps
+        })
+        return result
+
+
+class LimitPolicy:
+    """按用户和目标数据库解析执行预算
+
+    优先级（后者覆盖前者）：默认值 < 目标 < 用户 < 用户+目标。
+    用户可用ID或邮箱配置；值为None的项不覆盖。
+    """
+
+    def __init__(self, defaults=None, per_target=None, per_user=None):
+        self.defaults = limits_from_dict(defaults)
+        self.per_target = {k: limits_from_dict(v) for k, v in (per_target or {}).items()}
+        # 键为用户ID/邮箱，或 '用户ID/邮箱:目标' 形式
+        self.per_user = {k: limits_from_dict(v) for k, v in (per_user or {}).items()}
+
+    def resolve(self, user_keys=(), target=None):
+        """返回指定用户在指定目标上的QueryLimits"""
+        layers = [self.defaults, self.per_target.get(target)]
+        for key in user_keys:
+            layers.append(self.per_user.get(key))
+        for key in user_keys:
+            layers.append(self.per_user.get(f'{key}:{target}'))
+
+        merged = dict(self.defaults._asdict())
+        for layer in layers:
+            if layer is None:
+                continue
+            for field, value in layer._asdict().items():
+                if value is not None:
+                    merged[field] = value
+        return QueryLimits(**merged)
+
+
+class BudgetGuard:
+    """在连接上安装进度处理器并跟踪预算
+
+    用法：
+        with BudgetGuard(conn, limits) as guard:
+            cursor.execute(...)
+            guard.add_rows(len(batch))
+    进度处理器中止语句后，sqlite3会抛出OperationalError('interrupted')，
+    调用 guard.translate(e) 将其转换为 BudgetExceededError。
+    """
+
+    def __init__(self, conn, limits=None, interval=PROGRESS_INTERVAL):
+        self.conn = conn
+        self.limits = limits or UNLIMITED
+        self.interval = interval
+        self.start = time.perf_counter()
+        self.deadline = None
+        if self.limits.timeout is not None:
+            self.deadline = self.start + self.limits.timeout
+        self.vm_steps = 0
+        self.rows_read = 0
+        self.tripped = None
+        self.idle = 0.0
+        self._paused_at = None
+
+    @property
+    def active(self):
+        return self.limits.timeout is not None or self.limits.max_vm_steps is not None
+
+    def __enter__(self):
+        if self.active:
+            self.conn.set_progress_handler(self._on_progress, self.interval)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.active:
+            self.conn.set_progress_handler(None, 0)
+        return False
+
+    def _on_progress(self):
+        self.vm_steps += self.interval
+        if self.limits.max_vm_steps is not None and self.vm_steps > self.limits.max_vm_steps:
+            self.tripped = MAX_VM_STEPS
+            return 1
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            self.tripped = TIMEOUT
+            return 1
+        return 0
+
+    def pause(self):
+        """暂停计时，例如流式读取时把一批结果交给调用方之前"""
+        self._paused_at = time.perf_counter()
+
+    def resume(self):
+        """恢复计时，暂停的时间顺延到截止时间上"""
+        if self._paused_at is None:
+            return
+        idle = time.perf_counter() - self._paused_at
+        self._paused_at = None
+        self.idle += idle
+        if self.deadline is not None:
+            self.deadline += idle
+
+    def elapsed_ms(self):
+        """不含暂停时间的耗时"""
+        return round((time.perf_counter() - self.start - self.idle) * 1000, 3)
+
+    def add_rows(self, count):
+        """累计读取行数，超过max_rows时抛出BudgetExceededError"""
+        self.rows_read += count
+        if self.limits.max_rows is not None and self.rows_read > self.limits.max_rows:
+            self.tripped = MAX_ROWS
+            raise self.error()
+
+    def error(self):
+        """根据触发的预算构造异常"""
+        limit = {
+            TIMEOUT: self.limits.timeout,
+            MAX_ROWS: self.limits.max_rows,
+            MAX_VM_STEPS: self.limits.max_vm_steps
+        }[self.tripped]
+        return BudgetExceededError(self.tripped, limit, self.elapsed_ms(), self.rows_read, self.vm_steps)
+
+    def translate(self, e):
+        """将sqlite3异常转换为SQLExecutionError（预算中止时为BudgetExceededError）"""
+        if self.tripped is not None:
+            return self.error()
+        return SQLExecutionError(str(e))
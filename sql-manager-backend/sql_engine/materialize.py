@@ -0,0 +1,558 @@
+"""
+SQL片段的定时刷新与结果物化
+看板等场景下同一个保存的片段每次打开页面都会重新执行。为片段设置刷新计划后，后台线程按计划
+执行片段，把结果写入物化库（独立的SQLite文件）中该片段的结果表并记录刷新时间；之后读取该片段
+直接从结果表返回，不再访问目标库。
+
+刷新计划：'every N'（每N秒，N不小于 MIN_INTERVAL）或五段式cron表达式
+（分 时 日 月 周，支持 * / 列表 / 范围 / 步长，以及 @hourly 等别名），cron按服务器本地时间计算。
+
+刷新时结果先流式写入临时表，完成后在一个事务中替换旧表并更新元数据；刷新失败时保留上一次的结果，
+错误记录在元数据中。读取在只读连接的读事务中进行（WAL模式下不被刷新阻塞），元数据和结果表来自
+同一个快照。结果表的列统一命名为 c0、c1……，真实列名保存在元数据中（结果中可能有重名的列）。
+"""
+
+import calendar
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from .admission import PRIORITY_BACKGROUND
+from .cache import normalize_sql
+from .encoding import FORMAT_OBJECTS, shape_rows
+from .engine import DEFAULT_TARGET
+from .errors import SQLExecutionError
+from .params import resolve_statement
+from .pool import ConnectionPool, PoolTimeoutError
+from .tokenizer import is_query
+
+# 按间隔刷新时的最小间隔（秒）
+MIN_INTERVAL = 10
+
+_CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+}
+
+# (名称, 最小值, 最大值)；周字段中 7 与 0 都表示周日
+_CRON_FIELDS = (('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 7))
+
+# 查找下一次触发时间时最多向后搜索的年数，超过说明表达式永远不会触发（如 2月30日）
+_CRON_HORIZON_YEARS = 5
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS materialized_snippets (
+        snippet_id TEXT PRIMARY KEY,
+        owner TEXT,
+        target TEXT NOT NULL,
+        content TEXT NOT NULL,
+        template_params TEXT,
+        params TEXT,
+        schedule TEXT NOT NULL,
+        table_name TEXT NOT NULL,
+        columns TEXT,
+        row_count INTEGER,
+        refreshed_at REAL,
+        elapsed_ms REAL,
+        next_run REAL,
+        error TEXT,
+        created_at REAL NOT NULL
+    )
+"""
+
+
+class SnippetNotScheduledError(Exception):
+    """片段没有设置定时刷新，或还没有刷新过"""
+
+
+class IntervalSchedule:
+    """每隔固定秒数刷新一次"""
+
+    def __init__(self, seconds):
+        if seconds < MIN_INTERVAL:
+            raise ValueError(f'Refresh interval must be at least {MIN_INTERVAL} seconds')
+        self.seconds = seconds
+        self.spec = f'every {seconds:g}'
+
+    def next_after(self, ts):
+        return ts + self.seconds
+
+
+def _parse_cron_field(text, low, high):
+    """解析cron的一个字段，返回 (取值集合, 是否为 *)"""
+    values = set()
+    for item in text.split(','):
+        base, _, step = item.partition('/')
+        step = int(step) if step else 1
+        if step < 1:
+            raise ValueError(f'Invalid step in cron field: {item}')
+        if base == '*':
+            start, end = low, high
+        elif '-' in base:
+            start, end = (int(part) for part in base.split('-', 1))
+        else:
+            start = int(base)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high:
+            raise ValueError(f'Cron field value out of range {low}-{high}: {item}')
+        values.update(range(start, end + 1, step))
+    return values, text == '*'
+
+
+class CronSchedule:
+    """五段式cron表达式（分 时 日 月 周），按本地时间计算
+
+    与cron相同，日和周都不是 * 时满足其一即可。
+    """
+
+    def __init__(self, expression):
+        self.spec = expression.strip()
+        fields = _CRON_ALIASES.get(self.spec.lower(), self.spec).split()
+        if len(fields) != 5:
+            raise ValueError(f'Cron expression must have 5 fields (minute hour day month weekday): {expression}')
+        try:
+            parsed = [_parse_cron_field(text, low, high) for text, (_, low, high) in zip(fields, _CRON_FIELDS)]
+        except ValueError as e:
+            if 'cron' in str(e).lower():
+                raise
+            raise ValueError(f'Invalid cron expression: {expression}')
+        (self.minutes, _), (self.hours, _), (self.days, self.any_day), (self.months, _), \
+            (weekdays, self.any_weekday) = parsed
+        self.weekdays = {day % 7 for day in weekdays}
+        # 提前检查表达式能否触发
+        self.next_after(time.time())
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        # cron的周日为0，datetime的周一为0
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day and self.any_weekday:
+            return True
+        if self.any_day:
+            return weekday
+        if self.any_weekday:
+            return day
+        return day or weekday
+
+    def next_after(self, ts):
+        """ts 之后的下一次触发时间（时间戳）"""
+        moment = datetime.fromtimestamp(ts).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        horizon = moment.year + _CRON_HORIZON_YEARS
+        while moment.year <= horizon:
+            if moment.month not in self.months:
+                days = calendar.monthrange(moment.year, moment.month)[1] - moment.day + 1
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=days)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment.timestamp()
+        raise ValueError(f'Cron expression never fires: {self.spec}')
+
+
+def parse_schedule(spec):
+    """解析刷新计划：'every N'（秒）或cron表达式"""
+    spec = str(spec).strip()
+    if spec.lower().startswith('every '):
+        try:
+            seconds = float(spec[6:])
+        except ValueError:
+            raise ValueError(f'Invalid refresh interval: {spec}')
+        return IntervalSchedule(seconds)
+    return CronSchedule(spec)
+
+
+def _params_key(params):
+    return json.dumps(params, sort_keys=True, default=str) if params else ''
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class _Entry:
+    """一个设置了刷新计划的片段（与元数据表中的一行对应）"""
+
+    def __init__(self, row):
+        (self.snippet_id, self.owner, self.target, self.content, template_params, params, schedule,
+         self.table_name, columns, self.row_count, self.refreshed_at, self.elapsed_ms, self.next_run,
+         self.error, self.created_at) = row
+        self.template_params = json.loads(template_params) if template_params else None
+        self.params = json.loads(params) if params else None
+        self.columns = json.loads(columns) if columns else None
+        self.schedule = parse_schedule(schedule)
+        self.sql, self.bound_params = resolve_statement(
+            {'sql': self.content, 'templateParams': self.template_params, 'params': self.params}
+        )
+        if not is_query(self.sql):
+            raise ValueError('Only queries (SELECT / WITH ... SELECT / VALUES) can be materialized')
+        self.refreshing = False
+        self.refresh_count = 0
+
+    def row(self, **updates):
+        values = dict(vars(self), **updates)
+        return (
+            self.snippet_id, self.owner, self.target, self.content,
+            json.dumps(self.template_params) if self.template_params is not None else None,
+            json.dumps(self.params) if self.params is not None else None,
+            self.schedule.spec, self.table_name,
+            json.dumps(values['columns']) if values['columns'] is not None else None,
+            values['row_count'], values['refreshed_at'], values['elapsed_ms'], values['next_run'],
+            values['error'], self.created_at
+        )
+
+    def matches(self, sql, params, target):
+        return (target == self.target and normalize_sql(sql) == normalize_sql(self.sql)
+                and _params_key(params) == _params_key(self.bound_params))
+
+    def to_dict(self):
+        return {
+            'snippetId': self.snippet_id,
+            'owner': self.owner,
+            'target': self.target,
+            'schedule': self.schedule.spec,
+            'templateParams': self.template_params,
+            'params': self.params,
+            'columns': self.columns,
+            'rowCount': self.row_count,
+            'refreshedAt': self.refreshed_at,
+            'ageSeconds': round(time.time() - self.refreshed_at, 3) if self.refreshed_at else None,
+            'elapsedMs': self.elapsed_ms,
+            'nextRun': self.next_run,
+            'refreshing': self.refreshing,
+            'error': self.error,
+            'createdAt': self.created_at
+        }
+
+
+class SnippetMaterializer:
+    """按计划刷新片段结果并从物化库读取
+
+    刷新由单个后台线程按到期顺序依次执行，配置了准入控制时以后台优先级等待放行。
+    limits 为刷新使用的执行预算（max_rows 限制物化的行数）。
+    """
+
+    def __init__(self, engine, store_path, admission=None, limits=None, batch_size=1000, read_pool_size=4):
+        self.engine = engine
+        self.store_path = store_path
+        self.admission = admission
+        self.limits = limits
+        self.batch_size = batch_size
+        self._entries = {}
+        self._refresh_locks = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self.refreshes = 0
+        self.failures = 0
+        self.reads = 0
+
+        # 单个写连接串行化所有写入；读连接以只读方式打开，WAL模式下读写互不阻塞
+        self._write_pool = ConnectionPool(store_path, max_size=1, journal_mode='wal')
+        self._read_pool = ConnectionPool(store_path, max_size=read_pool_size, read_only=True)
+        with self._write_pool.connection() as conn:
+            conn.execute(_SCHEMA)
+            rows = conn.execute('SELECT * FROM materialized_snippets').fetchall()
+        for row in rows:
+            try:
+                entry = _Entry(row)
+            except (ValueError, TypeError, SQLExecutionError):
+                # 计划或模板参数已无法解析的条目跳过，保留在物化库中
+                continue
+            self._entries[entry.snippet_id] = entry
+
+        self._thread = threading.Thread(target=self._loop, name='snippet-materializer', daemon=True)
+        self._thread.start()
+
+    def schedule(self, snippet_id, content, schedule, target=DEFAULT_TARGET, owner=None, template_params=None,
+                 params=None):
+        """设置（或替换）片段的刷新计划，并安排立即刷新一次
+
+        只修改计划（SQL、参数和目标不变）时保留已有结果，按新计划安排下一次刷新。
+        计划无效或SQL不是查询时抛出 ValueError，模板参数缺失时抛出 SQLExecutionError。
+        """
+        if not self.engine.has_target(target):
+            raise SQLExecutionError(f'Unknown target database: {target}')
+        now = time.time()
+        with self._cond:
+            existing = self._entries.get(snippet_id)
+        entry = _Entry((
+            snippet_id, owner, target, content,
+            json.dumps(template_params) if template_params is not None else None,
+            json.dumps(params) if params is not None else None,
+            parse_schedule(schedule).spec,
+            'mv_' + hashlib.sha1(snippet_id.encode('utf-8')).hexdigest()[:16],
+            None, None, None, None, now, None, now
+        ))
+        if existing is not None and existing.matches(entry.sql, entry.bound_params, target):
+            # 只修改计划时保留已有结果
+            entry.columns, entry.row_count = existing.columns, existing.row_count
+            entry.refreshed_at, entry.elapsed_ms = existing.refreshed_at, existing.elapsed_ms
+            entry.created_at = existing.created_at
+            entry.next_run = entry.schedule.next_after(now)
+        with self._cond:
+            self._entries[snippet_id] = entry
+        try:
+            self._save(entry)
+        except sqlite3.Error as e:
+            with self._cond:
+                if self._entries.get(snippet_id) is entry:
+                    del self._entries[snippet_id]
+            raise SQLExecutionError(str(e))
+        with self._cond:
+            self._cond.notify_all()
+        return entry.to_dict()
+
+    def update_content(self, snippet_id, content):
+        """片段内容修改后按原计划和参数重新刷新；新内容无法物化时取消计划，返回是否仍在计划中"""
+        with self._cond:
+            entry = self._entries.get(snippet_id)
+        if entry is None or entry.content == content:
+            return entry is not None
+        try:
+            self.schedule(snippet_id, content, entry.schedule.spec, target=entry.target, owner=entry.owner,
+                          template_params=entry.template_params, params=entry.params)
+        except (ValueError, SQLExecutionError):
+            self.unschedule(snippet_id)
+            return False
+        return True
+
+    def unschedule(self, snippet_id):
+        """取消刷新计划并删除物化结果，返回是否存在"""
+        with self._cond:
+            entry = self._entries.pop(snippet_id, None)
+            self._cond.notify_all()
+        if entry is None:
+            return False
+        with self._write_pool.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM materialized_snippets WHERE snippet_id = ?', (snippet_id,))
+                conn.execute(f'DROP TABLE IF EXISTS {_quote(entry.table_name)}')
+                conn.execute('COMMIT')
+            except sqlite3.Error:
+                conn.execute('ROLLBACK')
+                raise
+        return True
+
+    def get(self, snippet_id):
+        with self._cond:
+            entry = self._entries.get(snippet_id)
+            return entry.to_dict() if entry is not None else None
+
+    def list(self, owner=None):
+        with self._cond:
+            return [entry.to_dict() for entry in self._entries.values() if owner is None or entry.owner == owner]
+
+    def lookup(self, snippet_id, sql, params, target=DEFAULT_TARGET):
+        """片段已物化且 (sql, params, target) 与计划中的相同时返回True"""
+        with self._cond:
+            entry = self._entries.get(snippet_id)
+            return entry is not None and entry.refreshed_at is not None and entry.matches(sql, params, target)
+
+    def refresh_now(self, snippet_id):
+        """立即刷新（在调用线程中执行），返回刷新后的状态"""
+        with self._cond:
+            entry = self._entries.get(snippet_id)
+        if entry is None:
+            raise SnippetNotScheduledError(f'Snippet {snippet_id} has no refresh schedule')
+        self._refresh(entry)
+        with self._cond:
+            self._cond.notify_all()
+        return entry.to_dict()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    pending = [entry for entry in self._entries.values() if not entry.refreshing]
+                    entry = min(pending, key=lambda e: e.next_run) if pending else None
+                    delay = entry.next_run - time.time() if entry is not None else None
+                    if delay is not None and delay <= 0:
+                        break
+                    self._cond.wait(delay)
+            self._refresh(entry)
+
+    def _refresh(self, entry):
+        """执行片段并替换结果表；同一片段的刷新串行执行"""
+        with self._cond:
+            lock = self._refresh_locks.setdefault(entry.snippet_id, threading.Lock())
+        with lock:
+            with self._cond:
+                entry.refreshing = True
+            start = time.perf_counter()
+            try:
+                if self.admission is not None:
+                    with self.admission.acquire(entry.owner, PRIORITY_BACKGROUND):
+                        columns, row_count = self._materialize(entry)
+                else:
+                    columns, row_count = self._materialize(entry)
+            except (SQLExecutionError, sqlite3.Error, PoolTimeoutError) as e:
+                # 保留上一次的结果
+                updates = {'error': str(e)}
+            else:
+                updates = {
+                    'columns': columns,
+                    'row_count': row_count,
+                    'refreshed_at': time.time(),
+                    'elapsed_ms': round((time.perf_counter() - start) * 1000, 3),
+                    'error': None
+                }
+            updates['next_run'] = entry.schedule.next_after(time.time())
+            try:
+                self._save(entry, updates, swap=updates['error'] is None)
+            except sqlite3.Error as e:
+                updates = {'error': str(e), 'next_run': updates['next_run']}
+                self._drop_staging(entry)
+            with self._cond:
+                if updates['error'] is None:
+                    self.refreshes += 1
+                    entry.refresh_count += 1
+                else:
+                    self.failures += 1
+                for name, value in updates.items():
+                    setattr(entry, name, value)
+                entry.refreshing = False
+
+    def _materialize(self, entry):
+        """把查询结果流式写入临时表，返回 (列名, 行数)"""
+        staging = _quote(entry.table_name + '__new')
+        rows = self.engine.stream(entry.sql, entry.bound_params, target=entry.target,
+                                  batch_size=self.batch_size, limits=self.limits)
+        try:
+            columns = next(rows)['columns']
+            if columns is None:
+                raise SQLExecutionError('Snippet did not return a result set')
+            names = [f'c{i}' for i in range(len(columns))]
+            insert = f'INSERT INTO {staging} VALUES ({", ".join("?" * len(columns))})'
+            row_count = 0
+            with self._write_pool.connection() as conn:
+                conn.execute(f'DROP TABLE IF EXISTS {staging}')
+                conn.execute(f'CREATE TABLE {staging} ({", ".join(names)})')
+            for batch in rows:
+                # 每批一个事务，写连接不被整个刷新占用
+                with self._write_pool.connection() as conn:
+                    conn.execute('BEGIN IMMEDIATE')
+                    conn.executemany(insert, batch)
+                    conn.execute('COMMIT')
+                row_count += len(batch)
+        except Exception:
+            rows.close()
+            self._drop_staging(entry)
+            raise
+        return columns, row_count
+
+    def _save(self, entry, updates=None, swap=False):
+        """写入元数据（updates 为随之更新的字段，提交后由调用方应用到条目上）
+
+        swap 为真时在同一事务中用临时表替换结果表。条目已被取消或替换时不写入，并删除临时表。
+        """
+        table = _quote(entry.table_name)
+        staging = _quote(entry.table_name + '__new')
+        with self._write_pool.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # 在写事务中检查，unschedule() 的删除要么在此之前生效，要么在提交之后执行
+                with self._cond:
+                    current = self._entries.get(entry.snippet_id) is entry
+                if not current:
+                    if swap:
+                        conn.execute(f'DROP TABLE IF EXISTS {staging}')
+                elif swap:
+                    conn.execute(f'DROP TABLE IF EXISTS {table}')
+                    conn.execute(f'ALTER TABLE {staging} RENAME TO {table}')
+                if current:
+                    conn.execute(f'INSERT OR REPLACE INTO materialized_snippets VALUES ({", ".join("?" * 15)})',
+                                 entry.row(**(updates or {})))
+                conn.execute('COMMIT')
+            except sqlite3.Error:
+                conn.execute('ROLLBACK')
+                raise
+
+    def _drop_staging(self, entry):
+        try:
+            with self._write_pool.connection() as conn:
+                conn.execute(f'DROP TABLE IF EXISTS {_quote(entry.table_name + "__new")}')
+        except (sqlite3.Error, PoolTimeoutError):
+            pass
+
+    def read(self, snippet_id, offset=0, limit=None, result_format=FORMAT_OBJECTS):
+        """从物化结果读取（按offset/limit截取），不访问目标库"""
+        start = time.perf_counter()
+        offset = max(int(offset or 0), 0)
+        try:
+            conn = self._read_pool.acquire()
+        except PoolTimeoutError as e:
+            raise SQLExecutionError(str(e))
+
+        try:
+            # 元数据和结果表在同一个读事务中读取，不会读到刷新到一半的状态
+            conn.execute('BEGIN')
+            try:
+                meta = conn.execute(
+                    'SELECT table_name, columns, row_count, refreshed_at FROM materialized_snippets '
+                    'WHERE snippet_id = ?', (snippet_id,)
+                ).fetchone()
+                if meta is None or meta[3] is None:
+                    raise SnippetNotScheduledError(f'Snippet {snippet_id} has not been materialized')
+                table, columns, row_count, refreshed_at = meta
+                # 结果表按顺序插入且不删除行，rowid 即为 1..row_count
+                rows = conn.execute(
+                    f'SELECT * FROM {_quote(table)} WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                    (offset, -1 if limit is None else int(limit))
+                ).fetchall()
+            finally:
+                conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            raise SQLExecutionError(str(e))
+        finally:
+            self._read_pool.release(conn)
+
+        with self._cond:
+            self.reads += 1
+        columns = json.loads(columns)
+        result = {
+            'columns': columns,
+            'success': True,
+            'materialized': True,
+            'snippetId': snippet_id,
+            'refreshedAt': refreshed_at,
+            'ageSeconds': round(time.time() - refreshed_at, 3),
+            'elapsedMs': round((time.perf_counter() - start) * 1000, 3),
+            'message': f'Returned {len(rows)} of {row_count} materialized rows'
+        }
+        result.update(shape_rows(columns, rows, result_format))
+        result.update({'rowCount': row_count, 'offset': offset})
+        return result
+
+    def stats(self):
+        with self._cond:
+            return {
+                'storePath': self.store_path,
+                'scheduled': len(self._entries),
+                'refreshing': sum(1 for entry in self._entries.values() if entry.refreshing),
+                'refreshes': self.refreshes,
+                'failures': self.failures,
+                'reads': self.reads
+            }
+
+    def shutdown(self):
+        """停止后台线程并关闭物化库连接"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+        self._write_pool.close()
+        self._read_pool.close()
@@ -0,0 +1,176 @@
+"""
+{{param}} 模板参数绑定
+把SQL片段中的 {{ name }} 占位符改写为绑定参数 ?，不同参数值共用同一条SQL文本，
+sqlite3按连接缓存的预编译语句（cached_statements，以SQL文本为键）因此可以复用，
+再次执行同一片段时跳过语法分析和查询规划。
+
+    SELECT * FROM users WHERE id = {{id}}         -> ... WHERE id = ?
+    SELECT * FROM users WHERE name = '{{name}}'   -> ... WHERE name = ?
+    SELECT * FROM users WHERE name = "{{name}}"   -> ... WHERE name = ?
+    SELECT * FROM users WHERE email LIKE '%{{q}}%' -> ... WHERE email LIKE ('%' || ? || '%')
+
+双引号中的占位符与单引号中的相同按字符串绑定（SQLite把无法解析为列名的双引号标识符当作字符串）。
+绑定参数只能代替值：出现在表名、列名、关键字等位置（FROM {{table}}、ORDER BY {{col}}、t.{{col}}、
+`{{name}}` 等）的占位符无法绑定，抛出 SQLExecutionError，而不是把改写后无效或语义不同的SQL交给SQLite。
+注释中的占位符保持原样。
+"""
+
+import re
+from functools import lru_cache
+
+from .errors import SQLExecutionError
+from .tokenizer import COMMENT, IDENTIFIER, NUMBER, PUNCT, STRING, WHITESPACE, WORD, tokenize
+
+PLACEHOLDER = re.compile(r'{{\s*(\w+)\s*}}')
+
+_INTEGER = re.compile(r'[-+]?\d+')
+_REAL = re.compile(r'[-+]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?')
+
+# 代码中的占位符在记号序列中的类型
+_PLACEHOLDER = 'placeholder'
+
+# 其后可以出现值（表达式）的关键字；前一个记号是其他关键字或标识符时，占位符处于名称或关键字的位置
+_VALUE_KEYWORDS = frozenset((
+    'select', 'where', 'and', 'or', 'not', 'in', 'is', 'like', 'glob', 'match', 'regexp', 'between',
+    'case', 'when', 'then', 'else', 'limit', 'offset', 'values', 'having', 'on', 'distinct', 'all', 'escape'
+))
+
+
+def has_placeholders(sql):
+    return PLACEHOLDER.search(sql) is not None
+
+
+def _string_expression(literal, names):
+    """字符串字面量（或双引号）中的占位符改写为 || 拼接表达式"""
+    body = literal[1:-1]
+    if literal[0] == '"':
+        # 双引号中的 "" 转义为 "，其余文本作为单引号字符串输出
+        body = body.replace('""', '"').replace("'", "''")
+    pieces = PLACEHOLDER.split(body)
+    if len(pieces) == 3 and not pieces[0] and not pieces[2]:
+        names.append((pieces[1], False))
+        return '?'
+
+    parts = []
+    for i, piece in enumerate(pieces):
+        if i % 2:
+            names.append((piece, False))
+            parts.append('?')
+        elif piece:
+            parts.append(f"'{piece}'")
+    return '(' + ' || '.join(parts) + ')'
+
+
+def _units(sql):
+    """产出 (类型, 文本) 记号，代码中的占位符合并为一个 placeholder 记号"""
+    code = []
+
+    def flush():
+        text = ''.join(code)
+        code.clear()
+        position = 0
+        for match in PLACEHOLDER.finditer(text):
+            yield from tokenize(text[position:match.start()])
+            yield _PLACEHOLDER, match.group()
+            position = match.end()
+        yield from tokenize(text[position:])
+
+    for kind, text in tokenize(sql):
+        if kind in (COMMENT, IDENTIFIER, STRING):
+            yield from flush()
+            yield kind, text
+        else:
+            code.append(text)
+    yield from flush()
+
+
+def _check_value_position(units, index):
+    """占位符不在值的位置时抛出SQLExecutionError"""
+    def neighbour(step):
+        i = index + step
+        while 0 <= i < len(units) and units[i][0] in (WHITESPACE, COMMENT):
+            i += step
+        return units[i] if 0 <= i < len(units) else (None, None)
+
+    previous_kind, previous = neighbour(-1)
+    next_kind, following = neighbour(1)
+    adjacent_kind = units[index + 1][0] if index + 1 < len(units) else None
+
+    if previous_kind == PUNCT:
+        valid = previous not in ('.', ')')
+    elif previous_kind == WORD:
+        valid = previous.lower() in _VALUE_KEYWORDS
+    else:
+        valid = False
+    if following in ('.', '(') or adjacent_kind in (WORD, NUMBER):
+        valid = False
+
+    if not valid:
+        raise SQLExecutionError(
+            f'Template parameter {units[index][1]} is used as a table, column or keyword name; '
+            f'placeholders can only stand for values'
+        )
+
+
+@lru_cache(maxsize=256)
+def compile_template(sql):
+    """解析模板，返回 (改写后的SQL, ((参数名, 是否裸占位符), ...))
+
+    占位符不在值的位置时抛出 SQLExecutionError。
+    """
+    names = []
+    output = []
+    units = list(_units(sql))
+
+    for index, (kind, text) in enumerate(units):
+        if kind == _PLACEHOLDER:
+            _check_value_position(units, index)
+            names.append((PLACEHOLDER.fullmatch(text).group(1), True))
+            output.append('?')
+        elif kind == STRING and len(text) > 1 and text.endswith("'") and PLACEHOLDER.search(text):
+            output.append(_string_expression(text, names))
+        elif kind == IDENTIFIER and PLACEHOLDER.search(text):
+            if not (text[0] == '"' and len(text) > 1 and text.endswith('"')):
+                raise SQLExecutionError(
+                    f'Template parameter in quoted name {text} cannot be bound; placeholders can only stand for values'
+                )
+            output.append(_string_expression(text, names))
+        else:
+            output.append(text)
+
+    return ''.join(output), tuple(names)
+
+
+def _coerce(value):
+    """裸占位符的数字字符串按数值绑定，与原来的文本替换语义一致"""
+    if isinstance(value, str):
+        text = value.strip()
+        if _INTEGER.fullmatch(text):
+            return int(text)
+        if _REAL.fullmatch(text):
+            return float(text)
+    return value
+
+
+def bind_template(sql, values):
+    """返回 (SQL文本, 参数元组)，缺少参数值时抛出SQLExecutionError"""
+    text, names = compile_template(sql)
+    values = values or {}
+    params = []
+    for name, bare in names:
+        if name not in values:
+            raise SQLExecutionError(f'Missing value for template parameter: {name}')
+        value = values[name]
+        params.append(_coerce(value) if bare else ('' if value is None else str(value)))
+    return text, tuple(params)
+
+
+def resolve_statement(data):
+    """从请求体取出 (sql, params)
+
+    提供 templateParams 或SQL中含有 {{param}} 占位符时按模板绑定，否则使用 params。
+    """
+    sql = data['sql']
+    if data.get('templateParams') is not None or has_placeholders(sql):
+        return bind_template(sql, data.get('templateParams'))
+    return sql, data.get('params')
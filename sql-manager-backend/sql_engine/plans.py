@@ -0,0 +1,217 @@
+"""
+查询计划捕获
+执行 EXPLAIN QUERY PLAN 并返回计划树，按（目标, schema版本, 规范化SQL）缓存计划，
+对大表上的全表扫描（SCAN）给出警告，并记录每个SQL片段最近一次的计划，
+同一片段两次执行之间计划发生变化时在响应中标出，便于在延迟上升前发现索引失效。
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .cache import normalize_sql
+from .engine import DEFAULT_TARGET
+from .errors import SQLExecutionError
+from .limits import BudgetGuard
+from .pool import PoolTimeoutError
+from .preview import estimate_table_rows
+from .tokenizer import IDENTIFIER, WORD, tokenize, unquote_identifier
+
+# 计划步骤：SCAN [TABLE] <表或别名> [USING [COVERING] INDEX ...]
+_SCAN = re.compile(r'^SCAN (?:TABLE )?(\S+)')
+
+# FROM子句中表名后面不会是别名的关键字
+_NOT_ALIAS = {
+    'where', 'group', 'order', 'limit', 'on', 'using', 'join', 'inner', 'left', 'right', 'full',
+    'cross', 'natural', 'outer', 'union', 'except', 'intersect', 'window', 'having', 'indexed', 'not'
+}
+_FROM_END = {'where', 'group', 'order', 'limit', 'having', 'window', 'union', 'except', 'intersect', 'on', 'using'}
+
+
+def build_plan_tree(rows):
+    """将 (id, parent, notused, detail) 行组装为嵌套的计划树"""
+    nodes = {}
+    roots = []
+    for row in rows:
+        node_id, parent, detail = row[0], row[1], row[3]
+        node = {'id': node_id, 'detail': detail, 'children': []}
+        nodes[node_id] = node
+        if parent in nodes:
+            nodes[parent]['children'].append(node)
+        else:
+            roots.append(node)
+    return roots
+
+
+def table_aliases(sql):
+    """粗略解析FROM/JOIN子句，返回 {别名或表名（小写）: 表名}"""
+    aliases = {}
+    in_from = False
+    expect_table = False
+    table = None
+
+    for kind, text in tokenize(sql):
+        if kind == WORD:
+            lower = text.lower()
+        elif kind == IDENTIFIER:
+            lower = None
+        elif text in (',', '(', ')'):
+            lower = text
+        else:
+            continue
+
+        if lower in ('from', 'join'):
+            in_from = True
+            expect_table = True
+            table = None
+        elif lower in ('(', ')'):
+            expect_table = False
+            table = None
+        elif not in_from:
+            continue
+        elif lower in _FROM_END:
+            in_from = False
+            table = None
+        elif lower == ',':
+            expect_table = True
+            table = None
+        elif expect_table:
+            table = unquote_identifier(text)
+            aliases[table.lower()] = table
+            expect_table = False
+        elif table is not None and lower not in _NOT_ALIAS and lower != 'as':
+            aliases[unquote_identifier(text).lower()] = table
+            table = None
+    return aliases
+
+
+class PlanCache:
+    """EXPLAIN QUERY PLAN 结果缓存及片段计划历史
+
+    schema变化（建索引、ALTER等）会改变 schema_version，从而使缓存的计划失效。
+    """
+
+    def __init__(self, engine, max_entries=512, large_table_rows=10000, max_snippets=1000):
+        self.engine = engine
+        self.max_entries = max_entries
+        self.large_table_rows = large_table_rows
+        self.max_snippets = max_snippets
+        self._plans = OrderedDict()
+        self._snippets = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def explain(self, sql, params=None, target=DEFAULT_TARGET, snippet_id=None, limits=None):
+        """返回计划树、扁平步骤、全表扫描警告，以及与片段上一次计划的比较结果"""
+        start = time.perf_counter()
+        # EXPLAIN 不执行语句本身，写入语句的计划同样可以在只读连接上获取
+        pool = self.engine.get_pool(target, read_only=True)
+        try:
+            conn = pool.acquire()
+        except PoolTimeoutError as e:
+            raise SQLExecutionError(str(e))
+
+        try:
+            with BudgetGuard(conn, limits) as guard:
+                try:
+                    schema_version = conn.execute('PRAGMA schema_version').fetchone()[0]
+                    key = (target, schema_version, normalize_sql(sql))
+                    with self._lock:
+                        entry = self._plans.get(key)
+                        if entry is not None:
+                            self._plans.move_to_end(key)
+                            self.hits += 1
+                        else:
+                            self.misses += 1
+
+                    cached = entry is not None
+                    if entry is None:
+                        # EXPLAIN 不开启读事务，也就不会检查schema版本：先读一次 sqlite_master 让连接
+                        # 重新加载schema，再把版本号写进语句文本，避免命中sqlite3按文本缓存的旧语句
+                        conn.execute('SELECT count(*) FROM sqlite_master').fetchone()
+                        rows = conn.execute(
+                            f'/* schema {schema_version} */ EXPLAIN QUERY PLAN ' + sql, params or ()
+                        ).fetchall()
+                        entry = self._analyze(conn, sql, rows)
+                        with self._lock:
+                            self._plans[key] = entry
+                            while len(self._plans) > self.max_entries:
+                                self._plans.popitem(last=False)
+                except sqlite3.Error as e:
+                    raise guard.translate(e)
+        finally:
+            pool.release(conn)
+
+        result = {
+            'success': True,
+            'plan': entry['plan'],
+            'steps': entry['steps'],
+            'warnings': entry['warnings'],
+            'cached': cached,
+            'elapsedMs': round((time.perf_counter() - start) * 1000, 3),
+            'message': f'Query plan has {len(entry["steps"])} steps, {len(entry["warnings"])} warnings'
+        }
+        if snippet_id is not None:
+            result.update(self._compare_snippet(snippet_id, target, entry['steps']))
+        return result
+
+    def _analyze(self, conn, sql, rows):
+        """组装计划树并检查大表全表扫描"""
+        steps = [row[3] for row in rows]
+        aliases = None
+        warnings = []
+        for detail in steps:
+            match = _SCAN.match(detail)
+            if match is None:
+                continue
+            name = match.group(1)
+            if name.startswith('(') or name == 'CONSTANT':
+                continue
+            if aliases is None:
+                aliases = table_aliases(sql)
+            table = aliases.get(name.lower(), name)
+            estimated, _ = estimate_table_rows(conn, table)
+            if estimated is not None and estimated >= self.large_table_rows:
+                warnings.append({
+                    'type': 'full_scan',
+                    'table': table,
+                    'estimatedRows': estimated,
+                    'detail': detail,
+                    'message': f'Full scan of {table} (~{estimated} rows); consider adding an index'
+                })
+        return {'plan': build_plan_tree(rows), 'steps': steps, 'warnings': warnings}
+
+    def _compare_snippet(self, snippet_id, target, steps):
+        """记录片段本次的计划并与上一次比较"""
+        key = (str(snippet_id), target)
+        with self._lock:
+            previous = self._snippets.pop(key, None)
+            self._snippets[key] = steps
+            while len(self._snippets) > self.max_snippets:
+                self._snippets.popitem(last=False)
+
+        changed = previous is not None and previous != steps
+        result = {'snippetId': snippet_id, 'planChanged': changed}
+        if changed:
+            result['previousSteps'] = previous
+        return result
+
+    def clear(self):
+        with self._lock:
+            count = len(self._plans)
+            self._plans.clear()
+            return count
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._plans),
+                'maxEntries': self.max_entries,
+                'snippets': len(self._snippets),
+                'hits': self.hits,
+                'misses': self.misses,
+                'largeTableRows': self.large_table_rows
+            }
@@ -0,0 +1,155 @@
+"""
+目标数据库连接池
+每个目标SQLite文件维护一个有界连接池，连接在请求之间复用。
+只读连接池以 file:...?mode=ro 的URI打开连接，SQLite在打开时即拒绝写入；
+写连接池可设置日志模式，WAL模式下读连接不会被写事务的锁阻塞。
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+# 每个连接缓存的预编译语句数（sqlite3以SQL文本为键做LRU缓存）
+STATEMENT_CACHE_SIZE = 256
+
+
+def read_only_uri(db_path):
+    """返回以只读模式打开数据库文件的URI"""
+    return 'file:' + pathname2url(os.path.abspath(db_path)) + '?mode=ro'
+
+
+def connect(db_path, read_only=False, **kwargs):
+    """打开到目标数据库的连接
+
+    只读模式下数据库文件不存在时先创建空库（mode=ro 不会创建文件）。
+    """
+    if not read_only:
+        return sqlite3.connect(db_path, **kwargs)
+    if not os.path.exists(db_path):
+        sqlite3.connect(db_path).close()
+    return sqlite3.connect(read_only_uri(db_path), uri=True, **kwargs)
+
+
+class PoolTimeoutError(Exception):
+    """等待空闲连接超时"""
+
+
+class ConnectionPool:
+    """单个目标数据库的有界连接池
+
+    read_only 为真时所有连接都以只读URI打开；journal_mode（如 'wal'）在每个新建的
+    读写连接上设置，WAL模式会持久保存在数据库文件中。
+    """
+
+    def __init__(self, db_path, max_size=5, timeout=30.0, statement_cache_size=STATEMENT_CACHE_SIZE,
+                 read_only=False, journal_mode=None):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.statement_cache_size = statement_cache_size
+        self.read_only = read_only
+        self.journal_mode = journal_mode
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self):
+        """创建新连接（自动提交模式，显式事务由调用方BEGIN/COMMIT）"""
+        conn = connect(
+            self.db_path,
+            read_only=self.read_only,
+            timeout=self.timeout,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=self.statement_cache_size
+        )
+        if self.journal_mode and not self.read_only:
+            try:
+                conn.execute(f'PRAGMA journal_mode={self.journal_mode}')
+            except sqlite3.Error:
+                conn.close()
+                raise
+        return conn
+
+    def acquire(self, timeout=None):
+        """获取连接，池已满时阻塞等待空闲连接"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.max_size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        wait = self.timeout if timeout is None else timeout
+        try:
+            return self._idle.get(timeout=wait)
+        except queue.Empty:
+            raise PoolTimeoutError(f'No idle connection for {self.db_path} within {wait}s')
+
+    def release(self, conn):
+        """归还连接，未结束的事务会被回滚"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self.discard(conn)
+            return
+
+        if self._closed:
+            self.discard(conn)
+        else:
+            self._idle.put(conn)
+
+    def discard(self, conn):
+        """关闭并丢弃连接（连接损坏或连接池已关闭时使用）"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """以上下文管理器方式借用连接"""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """关闭所有空闲连接，借出的连接在归还时关闭"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+    def stats(self):
+        """连接池状态"""
+        return {
+            'dbPath': self.db_path,
+            'maxSize': self.max_size,
+            'statementCacheSize': self.statement_cache_size,
+            'readOnly': self.read_only,
+            'size': self._created,
+            'idle': self._idle.qsize()
+        }
@@ -0,0 +1,211 @@
+"""
+结果预览
+交互执行时，没有顶层 LIMIT 的查询自动追加 LIMIT，只读取前N行并返回 truncated 标记，
+避免打开 SELECT * FROM orders 这样的片段就把整张表读出来；完整结果需要显式执行。
+
+被截断时估算总行数：
+    单表查询（SELECT ... FROM 表 [ORDER BY ...]）使用 sqlite_stat1 或 MAX(rowid)
+    其他查询在后台任务中执行有上限的 COUNT(*)，响应中返回任务ID供轮询
+"""
+
+import sqlite3
+
+from .encoding import FORMAT_ARRAYS, FORMAT_OBJECTS, shape_rows
+from .engine import DEFAULT_TARGET
+from .jobs import JobQueueFullError
+from .pool import PoolTimeoutError
+from .tokenizer import (
+    COMMENT, IDENTIFIER, PUNCT, SEMICOLON, WHITESPACE, WORD, is_query, tokenize, unquote_identifier
+)
+
+PREVIEW_LIMIT = 1000
+MAX_PREVIEW_LIMIT = 100000
+
+# 后台计数最多数到的行数，达到上限时只能说明总行数不少于该值
+COUNT_CAP = 1000000
+
+# 出现在顶层时查询不是简单的单表扫描
+_NOT_SINGLE_TABLE = {
+    'where', 'join', 'group', 'having', 'union', 'except', 'intersect', 'distinct', 'window', 'limit', 'values'
+}
+
+
+def _statement_body(sql):
+    """返回 (去掉结尾分号和注释的语句文本, 是否含顶层LIMIT)，含多条语句时返回 (None, False)"""
+    depth = 0
+    position = 0
+    code_end = 0
+    has_limit = False
+    ended = False
+
+    for kind, text in tokenize(sql):
+        position += len(text)
+        if kind in (WHITESPACE, COMMENT):
+            continue
+        if kind == SEMICOLON:
+            ended = True
+            continue
+        if ended:
+            return None, False
+
+        code_end = position
+        if kind == PUNCT:
+            if text == '(':
+                depth += 1
+            elif text == ')':
+                depth -= 1
+        elif kind == WORD and depth == 0 and text.lower() == 'limit':
+            has_limit = True
+    return sql[:code_end], has_limit
+
+
+def limit_statement(sql, limit):
+    """没有顶层 LIMIT 的查询返回追加了 LIMIT limit 的语句，其他语句返回None"""
+    if not is_query(sql):
+        return None
+    body, has_limit = _statement_body(sql)
+    if body is None or has_limit:
+        return None
+    return f'{body}\nLIMIT {int(limit)}'
+
+
+def count_statement(sql, cap=COUNT_CAP):
+    """统计查询结果行数（最多数到cap）的语句"""
+    body, _ = _statement_body(sql)
+    return f'SELECT count(*) FROM (SELECT 1 FROM (\n{body}\n) LIMIT {int(cap)})'
+
+
+def single_table(sql):
+    """SELECT ... FROM 表 [[AS] 别名] [ORDER BY ...] 形式的查询返回表名，否则返回None"""
+    depth = 0
+    state = None
+    table = None
+
+    for kind, text in tokenize(sql):
+        if kind in (WHITESPACE, COMMENT, SEMICOLON):
+            continue
+        lower = text.lower() if kind == WORD else None
+        if state is None:
+            if lower != 'select':
+                return None
+            state = 'select'
+            continue
+
+        if kind == PUNCT and text == '(':
+            if state == 'from':
+                # 子查询或表值函数
+                return None
+            depth += 1
+            continue
+        if kind == PUNCT and text == ')':
+            depth -= 1
+            continue
+        if depth:
+            continue
+        if lower in _NOT_SINGLE_TABLE:
+            return None
+
+        if state == 'select':
+            if lower == 'from':
+                state = 'from'
+        elif state == 'from':
+            if table is None:
+                if kind not in (WORD, IDENTIFIER):
+                    return None
+                table = unquote_identifier(text)
+            elif lower == 'order':
+                state = 'order'
+            elif kind == PUNCT:
+                # 逗号连接多表或 schema.表
+                return None
+    return table
+
+
+def estimate_table_rows(conn, table):
+    """估算表的行数，返回 (行数, 来源)
+
+    优先使用 sqlite_stat1（ANALYZE的统计），否则用 MAX(rowid)（索引查找，O(log n)），
+    都不可用时返回 (None, None)。
+    """
+    try:
+        row = conn.execute(
+            'SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1', (table,)
+        ).fetchone()
+        if row is not None:
+            return int(str(row[0]).split()[0]), 'sqlite_stat1'
+    except (sqlite3.Error, ValueError):
+        pass
+    try:
+        quoted = '"' + table.replace('"', '""') + '"'
+        row = conn.execute(f'SELECT MAX(rowid) FROM {quoted}').fetchone()
+    except sqlite3.Error:
+        return None, None
+    return row[0] or 0, 'max_rowid'
+
+
+class PreviewRunner:
+    """预览模式执行：追加LIMIT、标记截断并估算总行数"""
+
+    def __init__(self, engine, jobs=None, limit=PREVIEW_LIMIT, count_cap=COUNT_CAP):
+        self.engine = engine
+        self.jobs = jobs
+        self.limit = limit
+        self.count_cap = count_cap
+
+    def run(self, sql, params=None, target=DEFAULT_TARGET, owner=None, limit=None, limits=None,
+            result_format=FORMAT_OBJECTS):
+        """执行预览，返回结果字典
+
+        多读一行判断是否截断。结果带有 preview（是否追加了LIMIT）、previewLimit、truncated，
+        以及 estimatedRowCount / estimateSource，或者后台计数任务的 countJobId / countCap。
+        已有顶层LIMIT的查询和非查询语句按原样执行。
+        """
+        limit = self.limit if limit is None else int(limit)
+        if not 1 <= limit <= MAX_PREVIEW_LIMIT:
+            raise ValueError(f'previewLimit must be between 1 and {MAX_PREVIEW_LIMIT}')
+
+        limited = limit_statement(sql, limit + 1)
+        if limited is None:
+            result = self.engine.execute(sql, params, target=target, limits=limits, result_format=result_format)
+            result['preview'] = False
+            return result
+
+        result = self.engine.execute(limited, params, target=target, limits=limits, result_format=FORMAT_ARRAYS)
+        rows = result.pop('rows')
+        result.pop('format', None)
+        truncated = len(rows) > limit
+        rows = rows[:limit]
+        result.update(shape_rows(result['columns'], rows, result_format))
+        result.update({
+            'preview': True,
+            'previewLimit': limit,
+            'truncated': truncated,
+            'message': f'Previewing first {len(rows)} rows' if truncated else result['message']
+        })
+
+        if not truncated:
+            result.update({'estimatedRowCount': len(rows), 'estimateSource': 'exact'})
+        else:
+            result.update(self._estimate(sql, params, target, owner, limits))
+        return result
+
+    def _estimate(self, sql, params, target, owner, limits):
+        """单表查询用表统计估算，其他查询提交后台计数任务"""
+        table = single_table(sql)
+        if table is not None:
+            try:
+                with self.engine.get_pool(target, read_only=True).connection() as conn:
+                    count, source = estimate_table_rows(conn, table)
+            except PoolTimeoutError:
+                count = None
+            if count is not None:
+                return {'estimatedRowCount': count, 'estimateSource': source}
+
+        if self.jobs is None:
+            return {}
+        try:
+            job = self.jobs.submit(count_statement(sql, self.count_cap), params, target=target, owner=owner,
+                                   limits=limits)
+        except JobQueueFullError:
+            return {}
+        return {'countJobId': job.id, 'countCap': self.count_cap}
@@ -0,0 +1,280 @@
+"""
+查询指纹与慢查询日志
+把语句中的字面量、绑定参数和空白规范化后得到稳定的指纹，同一SQL片段换了参数值仍归为一类；
+按指纹累计执行次数、总耗时、最大耗时和延迟直方图，超过阈值的语句写入慢查询日志，
+据此找出最值得优化的片段。
+
+    SELECT * FROM users WHERE id = 42            -> select * from users where id = ?
+    SELECT * FROM users WHERE id IN (1, 2, 3)    -> select * from users where id in (?+)
+    INSERT INTO t VALUES (1, 'a'), (2, 'b')      -> insert into t values (?+)
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+
+from .tokenizer import COMMENT, IDENTIFIER, NUMBER, PUNCT, SEMICOLON, STRING, WHITESPACE, WORD, tokenize
+
+# 延迟直方图各桶的上界（毫秒），最后一个桶收集超过最大上界的样本
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+SORT_KEYS = ('total', 'max', 'count', 'mean')
+
+# 慢查询日志和样本中保留的SQL长度
+SAMPLE_LENGTH = 1000
+
+# 每个指纹记录的片段ID个数上限
+MAX_SNIPPET_IDS = 10
+
+# IN (?, ?, ?) 以及多行 VALUES (...), (...) 折叠为一项，列表长度不同不产生新的指纹
+_VALUE_LIST = re.compile(r'\( \?(?: , \?)* \)')
+_REPEATED_LISTS = re.compile(r'\(\?\+\)(?: , \(\?\+\))+')
+
+
+def _is_operand(part):
+    """记号是否可以作为二元运算的左操作数（此时其后的 +/- 不是一元正负号）"""
+    return part in (')', '?') or part[:1] in ('"', '`', '[', '_') or part[:1].isalnum()
+
+
+@lru_cache(maxsize=1024)
+def normalize_statement(sql):
+    """去掉注释，字面量和参数替换为 ?，关键字转小写，记号之间以单个空格分隔"""
+    parts = []
+    for kind, text in tokenize(sql):
+        if kind in (WHITESPACE, COMMENT, SEMICOLON):
+            continue
+        if kind in (STRING, NUMBER):
+            if parts and parts[-1] in ('-', '+') and (len(parts) == 1 or not _is_operand(parts[-2])):
+                # 一元正负号属于数字字面量
+                parts.pop()
+            elif kind == NUMBER and parts and parts[-1] == '?':
+                # ?NNN 形式的编号参数
+                continue
+            elif kind == STRING and parts and parts[-1] == 'x':
+                # X'...' 形式的BLOB字面量
+                parts.pop()
+            parts.append('?')
+        elif kind == WORD:
+            if parts and parts[-1] in (':', '@', '$'):
+                # :name / @name / $name 命名参数
+                parts[-1] = '?'
+            else:
+                parts.append(text.lower())
+        elif kind == PUNCT or kind == IDENTIFIER:
+            parts.append(text)
+
+    text = ' '.join(parts)
+    text = _VALUE_LIST.sub('(?+)', text)
+    return _REPEATED_LISTS.sub('(?+)', text)
+
+
+def fingerprint(sql):
+    """返回 (指纹, 规范化语句)，指纹为规范化语句SHA-1的前16位十六进制"""
+    text = normalize_statement(sql)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16], text
+
+
+def _bucket_index(elapsed_ms):
+    for index, bound in enumerate(LATENCY_BUCKETS_MS):
+        if elapsed_ms <= bound:
+            return index
+    return len(LATENCY_BUCKETS_MS)
+
+
+class FingerprintStats:
+    """单个指纹的累计统计"""
+
+    def __init__(self, fingerprint_id, statement, sample):
+        self.fingerprint = fingerprint_id
+        self.statement = statement
+        self.sample = sample
+        self.count = 0
+        self.errors = 0
+        self.slow_count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.min_ms = None
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.targets = set()
+        self.snippet_ids = []
+        self.last_seen = None
+
+    @property
+    def mean_ms(self):
+        return self.total_ms / self.count if self.count else 0.0
+
+    def add(self, elapsed_ms, target, error, slow):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.min_ms = elapsed_ms if self.min_ms is None else min(self.min_ms, elapsed_ms)
+        self.histogram[_bucket_index(elapsed_ms)] += 1
+        self.targets.add(target)
+        self.last_seen = time.time()
+        if error is not None:
+            self.errors += 1
+        if slow:
+            self.slow_count += 1
+
+    def percentile(self, fraction):
+        """由直方图估算分位数：返回所在桶的上界，溢出桶返回最大耗时"""
+        if not self.count:
+            return None
+        threshold = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.histogram):
+            seen += count
+            if seen >= threshold:
+                if index < len(LATENCY_BUCKETS_MS):
+                    return min(LATENCY_BUCKETS_MS[index], round(self.max_ms, 3))
+                break
+        return round(self.max_ms, 3)
+
+    def to_dict(self):
+        return {
+            'fingerprint': self.fingerprint,
+            'statement': self.statement,
+            'sample': self.sample,
+            'count': self.count,
+            'errors': self.errors,
+            'slowCount': self.slow_count,
+            'totalMs': round(self.total_ms, 3),
+            'meanMs': round(self.mean_ms, 3),
+            'minMs': round(self.min_ms, 3) if self.min_ms is not None else None,
+            'maxMs': round(self.max_ms, 3),
+            'p50Ms': self.percentile(0.5),
+            'p95Ms': self.percentile(0.95),
+            'p99Ms': self.percentile(0.99),
+            'histogram': {
+                'bucketsMs': list(LATENCY_BUCKETS_MS),
+                'counts': list(self.histogram)
+            },
+            'targets': sorted(self.targets),
+            'snippetIds': list(self.snippet_ids),
+            'lastSeen': self.last_seen
+        }
+
+
+class QueryStats:
+    """按指纹聚合的执行统计和慢查询日志
+
+    slow_threshold_ms 为慢查询阈值；最近的慢查询保存在内存中（最多 slow_log_size 条），
+    配置 log_path 时同时以JSON行追加到该文件。
+    指纹数超过 max_fingerprints 时淘汰最久未执行的指纹。
+    """
+
+    def __init__(self, slow_threshold_ms=500, max_fingerprints=1000, slow_log_size=200, log_path=None):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.max_fingerprints = max_fingerprints
+        self.log_path = log_path
+        self._fingerprints = OrderedDict()
+        self._slow_log = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self.recorded = 0
+
+    def record(self, sql, elapsed_ms, target, error=None):
+        """记录一次执行，返回指纹"""
+        fingerprint_id, statement = fingerprint(sql)
+        slow = self.slow_threshold_ms is not None and elapsed_ms >= self.slow_threshold_ms
+
+        with self._lock:
+            entry = self._entry_locked(fingerprint_id, statement, sql)
+            entry.add(elapsed_ms, target, error, slow)
+            self.recorded += 1
+
+            record = None
+            if slow:
+                record = {
+                    'fingerprint': fingerprint_id,
+                    'sql': sql[:SAMPLE_LENGTH],
+                    'elapsedMs': round(elapsed_ms, 3),
+                    'target': target,
+                    'error': str(error) if error is not None else None,
+                    'at': time.time()
+                }
+                self._slow_log.append(record)
+
+        if record is not None and self.log_path:
+            self._write_log(record)
+        return fingerprint_id
+
+    def _entry_locked(self, fingerprint_id, statement, sql):
+        """取出或新建指纹的统计项并标记为最近使用（调用方持有锁）"""
+        entry = self._fingerprints.get(fingerprint_id)
+        if entry is None:
+            entry = FingerprintStats(fingerprint_id, statement, sql[:SAMPLE_LENGTH])
+            self._fingerprints[fingerprint_id] = entry
+            while len(self._fingerprints) > self.max_fingerprints:
+                self._fingerprints.popitem(last=False)
+        else:
+            self._fingerprints.move_to_end(fingerprint_id)
+        return entry
+
+    def _write_log(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._file_lock:
+            try:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except OSError:
+                pass
+
+    def note_snippet(self, sql, snippet_id):
+        """把保存的SQL片段ID关联到语句的指纹，通常在执行之前调用"""
+        if snippet_id is None:
+            return
+        fingerprint_id, statement = fingerprint(sql)
+        with self._lock:
+            entry = self._entry_locked(fingerprint_id, statement, sql)
+            if snippet_id in entry.snippet_ids:
+                return
+            entry.snippet_ids.append(snippet_id)
+            del entry.snippet_ids[:-MAX_SNIPPET_IDS]
+
+    def report(self, sort='total', limit=50):
+        """按 sort（total / max / count / mean）降序返回前limit个指纹和最近的慢查询"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f'Unsupported sort key: {sort}; expected one of {", ".join(SORT_KEYS)}')
+        key = {
+            'total': lambda e: e.total_ms,
+            'max': lambda e: e.max_ms,
+            'count': lambda e: e.count,
+            'mean': lambda e: e.mean_ms
+        }[sort]
+
+        with self._lock:
+            entries = sorted(self._fingerprints.values(), key=key, reverse=True)[:limit]
+            fingerprints = [entry.to_dict() for entry in entries]
+            slow = list(reversed(self._slow_log))[:limit]
+            total = len(self._fingerprints)
+
+        return {
+            'success': True,
+            'thresholdMs': self.slow_threshold_ms,
+            'sort': sort,
+            'fingerprintCount': total,
+            'fingerprints': fingerprints,
+            'slowQueries': slow
+        }
+
+    def clear(self):
+        with self._lock:
+            count = len(self._fingerprints)
+            self._fingerprints.clear()
+            self._slow_log.clear()
+            return count
+
+    def stats(self):
+        with self._lock:
+            return {
+                'fingerprints': len(self._fingerprints),
+                'maxFingerprints': self.max_fingerprints,
+                'slowQueries': len(self._slow_log),
+                'recorded': self.recorded,
+                'thresholdMs': self.slow_threshold_ms
+            }
@@ -0,0 +1,264 @@
+"""
+schema快照与自动补全
+从 sqlite_master / pragma_table_info / pragma_index_list 读取目标库的表、视图、列和索引，
+缓存为快照并按 PRAGMA schema_version 判断是否过期（任何DDL都会使版本加一）。
+
+补全查询走前缀树：从根沿前缀走到对应节点后按字典序遍历子树，取到 limit 条即停止，
+耗时只与前缀长度和返回条数有关，与schema大小无关。多个表中同名的列合并为一条，附带所在的表。
+"table.前缀" 形式只补全该表的列。
+"""
+
+import sqlite3
+import threading
+import time
+
+from .engine import DEFAULT_TARGET
+from .errors import SQLExecutionError
+from .pool import PoolTimeoutError
+
+KIND_TABLE = 'table'
+KIND_VIEW = 'view'
+KIND_COLUMN = 'column'
+KIND_INDEX = 'index'
+
+# 同名补全项的排列顺序
+_KIND_ORDER = {KIND_TABLE: 0, KIND_VIEW: 1, KIND_COLUMN: 2, KIND_INDEX: 3}
+
+COMPLETION_LIMIT = 50
+
+# 合并后的列补全项最多列出的表名个数
+COLUMN_TABLES_SHOWN = 10
+
+_COLUMNS_SQL = """
+    SELECT m.name, m.type, p.name, p.type, p."notnull", p.pk, p.dflt_value
+    FROM sqlite_master AS m JOIN pragma_table_info(m.name) AS p
+    WHERE m.type IN ('table', 'view') AND m.name NOT LIKE 'sqlite\\_%' ESCAPE '\\'
+    ORDER BY m.name, p.cid
+"""
+
+_INDEXES_SQL = """
+    SELECT m.name, l.name, l."unique", l.origin, i.name
+    FROM sqlite_master AS m
+    JOIN pragma_index_list(m.name) AS l
+    JOIN pragma_index_info(l.name) AS i
+    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite\\_%' ESCAPE '\\'
+    ORDER BY m.name, l.name, i.seqno
+"""
+
+
+class PrefixTrie:
+    """按小写键索引补全项的前缀树
+
+    构建完成后调用 freeze()，按字符重排每个节点的子节点（dict保持插入顺序，查找和有序遍历都不必再排序），
+    之后只读、可在多线程中共享。
+    """
+
+    def __init__(self):
+        # 节点：[子节点 {字符: 节点}, 补全项列表]
+        self._root = [{}, []]
+        self.size = 0
+
+    def insert(self, key, item):
+        node = self._root
+        for char in key.lower():
+            node = node[0].setdefault(char, [{}, []])
+        node[1].append(item)
+        self.size += 1
+
+    def freeze(self):
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            node[0] = dict(sorted(node[0].items()))
+            node[1].sort(key=lambda item: (_KIND_ORDER.get(item['kind'], 9), item['label']))
+            stack.extend(node[0].values())
+        return self
+
+    def _find(self, prefix):
+        node = self._root
+        for char in prefix.lower():
+            node = node[0].get(char)
+            if node is None:
+                return None
+        return node
+
+    def complete(self, prefix, limit=COMPLETION_LIMIT):
+        """按键的字典序返回以 prefix 开头的前 limit 个补全项"""
+        node = self._find(prefix)
+        if node is None:
+            return []
+        results = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for item in node[1]:
+                results.append(item)
+                if len(results) >= limit:
+                    return results
+            stack.extend(list(node[0].values())[::-1])
+        return results
+
+
+class SchemaSnapshot:
+    """某个 schema_version 下目标库的表结构及补全索引"""
+
+    def __init__(self, target, schema_version, tables):
+        self.target = target
+        self.schema_version = schema_version
+        self.tables = tables
+        self.built_at = time.time()
+        self.trie = PrefixTrie()
+        self._table_columns = {}
+
+        columns = {}
+        for table in tables:
+            self.trie.insert(table['name'], {'label': table['name'], 'kind': table['type']})
+            table_trie = PrefixTrie()
+            for column in table['columns']:
+                columns.setdefault(column['name'].lower(), (column['name'], []))[1].append(table['name'])
+                table_trie.insert(column['name'], {
+                    'label': column['name'], 'kind': KIND_COLUMN, 'table': table['name'], 'type': column['type']
+                })
+            self._table_columns[table['name'].lower()] = table_trie.freeze()
+            for index in table['indexes']:
+                if index['origin'] == 'c':
+                    self.trie.insert(index['name'], {
+                        'label': index['name'], 'kind': KIND_INDEX, 'table': table['name']
+                    })
+        for name, tables_with_column in columns.values():
+            self.trie.insert(name, {
+                'label': name,
+                'kind': KIND_COLUMN,
+                'tables': tables_with_column[:COLUMN_TABLES_SHOWN],
+                'tableCount': len(tables_with_column)
+            })
+        self.trie.freeze()
+
+    def complete(self, prefix, limit=COMPLETION_LIMIT):
+        """补全名称；"table.前缀" 只补全该表的列（表名不存在时返回空列表）"""
+        if '.' in prefix:
+            table, _, prefix = prefix.rpartition('.')
+            table_trie = self._table_columns.get(table.strip('"`[]').lower())
+            return table_trie.complete(prefix, limit) if table_trie is not None else []
+        return self.trie.complete(prefix, limit)
+
+    def to_dict(self):
+        return {
+            'target': self.target,
+            'schemaVersion': self.schema_version,
+            'tables': self.tables,
+            'builtAt': self.built_at
+        }
+
+
+def read_schema(conn):
+    """读取表、视图、列和索引，返回按表名排序的列表"""
+    tables = {}
+    for table, kind, column, column_type, not_null, pk, default in conn.execute(_COLUMNS_SQL):
+        entry = tables.setdefault(table, {'name': table, 'type': kind, 'columns': [], 'indexes': []})
+        entry['columns'].append({
+            'name': column,
+            'type': column_type,
+            'notNull': bool(not_null),
+            'primaryKey': bool(pk),
+            'default': default
+        })
+
+    indexes = {}
+    for table, index, unique, origin, column in conn.execute(_INDEXES_SQL):
+        if table not in tables:
+            continue
+        entry = indexes.get((table, index))
+        if entry is None:
+            entry = {'name': index, 'columns': [], 'unique': bool(unique), 'origin': origin}
+            indexes[(table, index)] = entry
+            tables[table]['indexes'].append(entry)
+        entry['columns'].append(column)
+
+    return [tables[name] for name in sorted(tables)]
+
+
+class SchemaCatalog:
+    """按目标缓存schema快照，schema_version 变化后重新读取"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self.builds = 0
+        self.hits = 0
+
+    def snapshot(self, target=DEFAULT_TARGET):
+        """返回 (快照, 是否命中缓存)"""
+        pool = self.engine.get_pool(target, read_only=True)
+        try:
+            conn = pool.acquire()
+        except PoolTimeoutError as e:
+            raise SQLExecutionError(str(e))
+
+        try:
+            try:
+                version = conn.execute('PRAGMA schema_version').fetchone()[0]
+                snapshot = self._snapshots.get(target)
+                if snapshot is not None and snapshot.schema_version == version:
+                    with self._lock:
+                        self.hits += 1
+                    return snapshot, True
+
+                # 同一目标只由一个线程重建，其他线程等待后直接使用新快照
+                with self._lock:
+                    build_lock = self._build_locks.setdefault(target, threading.Lock())
+                with build_lock:
+                    snapshot = self._snapshots.get(target)
+                    if snapshot is not None and snapshot.schema_version == version:
+                        return snapshot, True
+                    # 读取前先访问一次 sqlite_master，让连接加载最新的schema
+                    conn.execute('SELECT count(*) FROM sqlite_master').fetchone()
+                    snapshot = SchemaSnapshot(target, version, read_schema(conn))
+                    with self._lock:
+                        self._snapshots[target] = snapshot
+                        self.builds += 1
+                    return snapshot, False
+            except sqlite3.Error as e:
+                raise SQLExecutionError(str(e))
+        finally:
+            pool.release(conn)
+
+    def describe(self, target=DEFAULT_TARGET):
+        start = time.perf_counter()
+        snapshot, cached = self.snapshot(target)
+        result = snapshot.to_dict()
+        result.update({'success': True, 'cached': cached, 'elapsedMs': round((time.perf_counter() - start) * 1000, 3)})
+        return result
+
+    def complete(self, prefix, target=DEFAULT_TARGET, limit=COMPLETION_LIMIT):
+        start = time.perf_counter()
+        snapshot, _ = self.snapshot(target)
+        completions = snapshot.complete(prefix, limit)
+        return {
+            'success': True,
+            'prefix': prefix,
+            'completions': completions,
+            'schemaVersion': snapshot.schema_version,
+            'elapsedMs': round((time.perf_counter() - start) * 1000, 3)
+        }
+
+    def invalidate(self, target=None):
+        with self._lock:
+            if target is None:
+                count = len(self._snapshots)
+                self._snapshots.clear()
+                return count
+            return 1 if self._snapshots.pop(target, None) is not None else 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'targets': {
+                    name: {'schemaVersion': s.schema_version, 'tables': len(s.tables), 'entries': s.trie.size}
+                    for name, s in self._snapshots.items()
+                },
+                'builds': self.builds,
+                'hits': self.hits
+            }
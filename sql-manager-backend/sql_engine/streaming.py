@@ -0,0 +1,131 @@
+"""
+流式结果输出
+将查询结果按fetchmany批次编码为NDJSON，供分块传输（chunked）响应使用
+"""
+
+import json
+import time
+
+from .engine import DEFAULT_TARGET
+from .errors import SQLExecutionError
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+DEFAULT_BATCH_SIZE = 500
+
+# 以这些Content-Type上传的请求体直接作为SQL脚本
+SQL_SCRIPT_MIMETYPES = ('application/sql', 'text/plain')
+
+
+def json_default(value):
+    """JSON无法直接编码的值（BLOB等）"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return str(value)
+
+
+def wants_stream(data, accept_header):
+    """请求体 stream=true 或 Accept: application/x-ndjson 时启用流式模式"""
+    if data.get('stream'):
+        return True
+    return NDJSON_MIMETYPE in (accept_header or '')
+
+
+def ndjson_lines(engine, sql, params=None, target=DEFAULT_TARGET, batch_size=DEFAULT_BATCH_SIZE, limits=None):
+    """执行语句并返回NDJSON字节块生成器
+
+    输出格式（每行一个JSON值）：
+        {"type": "meta", "columns": [...]}
+        [v1, v2, ...]                       每行结果一个数组
+        {"type": "end", "rowCount": n, "elapsedMs": t, "success": true}
+    非查询语句只输出一行 {"type": "end", "affectedRows": n, ...}。
+
+    语句在此函数返回前已执行，SQL错误以SQLExecutionError抛出，
+    调用方可以在发送响应头之前返回400。
+    """
+    start = time.perf_counter()
+    batches = engine.stream(sql, params, target=target, batch_size=batch_size, limits=limits)
+    header = next(batches)
+    return _encode(batches, header, start)
+
+
+def job_lines(job, offset=0, batch_size=DEFAULT_BATCH_SIZE):
+    """把异步任务已缓冲的结果编码为NDJSON字节块生成器（格式同 ndjson_lines）
+
+    行从任务的结果缓冲区按批读取，缓冲区是否已溢出到磁盘对输出没有影响。
+    """
+    start = time.perf_counter()
+    header = {'columns': job.columns, 'affectedRows': job.affected_rows}
+    return _encode(job.iter_batches(offset, batch_size), header, start)
+
+
+def _encode(batches, header, start):
+    """逐批编码，每批产出一个字节块"""
+    dumps = json.JSONEncoder(default=json_default, ensure_ascii=False, separators=(',', ':')).encode
+
+    try:
+        if header['columns'] is None:
+            yield (dumps({
+                'type': 'end',
+                'success': True,
+                'affectedRows': header['affectedRows'],
+                'elapsedMs': _elapsed_ms(start)
+            }) + '\n').encode('utf-8')
+            return
+
+        yield (dumps({'type': 'meta', 'columns': header['columns']}) + '\n').encode('utf-8')
+
+        row_count = 0
+        try:
+            for batch in batches:
+                row_count += len(batch)
+                yield ''.join([dumps(row) + '\n' for row in batch]).encode('utf-8')
+        except SQLExecutionError as e:
+            # 响应头已发送，只能在流中报告错误
+            error = dict(e.to_dict(), type='error', rowCount=row_count)
+            yield (dumps(error) + '\n').encode('utf-8')
+            return
+
+        yield (dumps({
+            'type': 'end',
+            'success': True,
+            'rowCount': row_count,
+            'elapsedMs': _elapsed_ms(start)
+        }) + '\n').encode('utf-8')
+    finally:
+        batches.close()
+
+
+def script_lines(engine, script, target=DEFAULT_TARGET, limits=None):
+    """在单个事务中执行多语句脚本，返回NDJSON字节块生成器
+
+    每条语句完成后立即输出一行事件（见 SQLEngine.run_script），最后一行为 end 或 error。
+    无法开始事务时在此函数返回前抛出SQLExecutionError。
+    """
+    events = engine.run_script(script, target=target, limits=limits)
+    first = next(events)
+    return _encode_events(events, first)
+
+
+def _encode_events(events, first):
+    dumps = json.JSONEncoder(default=json_default, ensure_ascii=False, separators=(',', ':')).encode
+    try:
+        yield (dumps(first) + '\n').encode('utf-8')
+        for event in events:
+            yield (dumps(event) + '\n').encode('utf-8')
+    finally:
+        events.close()
+
+
+def read_ndjson(lines):
+    """逐行解析NDJSON（bytes或str行），跳过空行，无法解析时抛出SQLExecutionError"""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise SQLExecutionError(f'Invalid JSON on line {number}: {e}')
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 3)
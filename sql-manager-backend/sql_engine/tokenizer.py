@@ -0,0 +1,135 @@
+"""
+SQL词法分析与语句拆分
+识别字符串、带引号的标识符、行注释、块注释和分号，按SQLite的规则拆分多语句脚本，
+CREATE TRIGGER ... BEGIN ... END 内部的分号不会拆分语句。
+"""
+
+import re
+
+WHITESPACE = 'whitespace'
+COMMENT = 'comment'
+STRING = 'string'
+IDENTIFIER = 'identifier'
+WORD = 'word'
+NUMBER = 'number'
+SEMICOLON = 'semicolon'
+PUNCT = 'punct'
+
+_TOKEN = re.compile(r"""
+    (?P<whitespace>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>'(?:[^']|'')*(?:'|\Z))
+  | (?P<identifier>"(?:[^"]|"")*(?:"|\Z)|`(?:[^`]|``)*(?:`|\Z)|\[[^\]]*(?:\]|\Z))
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|0[xX][0-9a-fA-F]+)
+  | (?P<word>[A-Za-z_\u0080-\uffff][\w$\u0080-\uffff]*)
+  | (?P<semicolon>;)
+  | (?P<punct>.)
+""", re.VERBOSE | re.DOTALL)
+
+# 语句类型为 with 时，顶层第一个出现的这些关键字决定实际类型
+_DML_KEYWORDS = ('select', 'insert', 'update', 'delete', 'replace', 'values')
+
+# 只读查询的语句类型
+QUERY_KINDS = ('select', 'values')
+
+
+def tokenize(sql):
+    """逐个产出 (类型, 文本) 记号"""
+    for match in _TOKEN.finditer(sql):
+        yield match.lastgroup, match.group()
+
+
+def unquote_identifier(name):
+    """去掉标识符两侧的引号（"name"、`name`、[name]）"""
+    if name[:1] in ('"', '`', '[') and len(name) > 1:
+        return name[1:-1]
+    return name
+
+
+def _is_trigger(words):
+    """CREATE [TEMP|TEMPORARY] TRIGGER"""
+    if len(words) < 2 or words[0] != 'create':
+        return False
+    if words[1] == 'trigger':
+        return True
+    return len(words) >= 3 and words[1] in ('temp', 'temporary') and words[2] == 'trigger'
+
+
+def iter_statements(sql):
+    """按分号拆分脚本，逐条产出去掉首尾空白的语句文本
+
+    只含空白和注释的片段会被跳过。
+    """
+    start = 0
+    words = []      # 当前语句开头的几个关键字（小写）
+    depth = 0       # 触发器体内 BEGIN / CASE 的嵌套层数
+    has_code = False
+
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup
+        if kind in (WHITESPACE, COMMENT):
+            continue
+
+        if kind == WORD:
+            word = match.group().lower()
+            if len(words) < 3:
+                words.append(word)
+            if _is_trigger(words):
+                if word in ('begin', 'case'):
+                    depth += 1
+                elif word == 'end' and depth:
+                    depth -= 1
+        elif kind == SEMICOLON:
+            if depth:
+                continue
+            if has_code:
+                yield sql[start:match.end()].strip()
+            start = match.end()
+            words = []
+            has_code = False
+            continue
+
+        has_code = True
+
+    if has_code:
+        yield sql[start:].strip()
+
+
+def split_statements(sql):
+    """返回语句文本列表"""
+    return list(iter_statements(sql))
+
+
+def statement_kind(sql):
+    """返回语句类型（首个关键字的小写形式）
+
+    跳过开头的注释；WITH 语句返回其主体的类型（select / insert / update / delete ...），
+    无法识别时返回空字符串。
+    """
+    depth = 0
+    first = None
+    for kind, text in tokenize(sql):
+        if kind in (WHITESPACE, COMMENT):
+            continue
+        if first is None:
+            if kind != WORD:
+                return ''
+            first = text.lower()
+            if first != 'with':
+                return first
+            continue
+        if kind == SEMICOLON:
+            break
+        if kind == PUNCT:
+            if text == '(':
+                depth += 1
+            elif text == ')':
+                depth -= 1
+        elif kind == WORD and depth == 0 and text.lower() in _DML_KEYWORDS:
+            return text.lower()
+    return first or ''
+
+
+def is_query(sql):
+    """语句是否为只读查询（SELECT / VALUES / WITH ... SELECT）"""
+    return statement_kind(sql) in QUERY_KINDS
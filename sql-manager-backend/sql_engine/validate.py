@@ -0,0 +1,291 @@
+"""
+SQL校验（只编译不执行）
+把每条语句加上 EXPLAIN 前缀交给SQLite编译：语法、表名、列名、函数名都在编译（prepare）阶段检查，
+EXPLAIN 只返回字节码而不执行语句本身，因此写入语句也可以在只读连接上校验，不占执行名额。
+
+错误给出在请求文本中的位置（offset / line / column，从0 / 1 / 1开始）。Python的sqlite3没有提供
+sqlite3_error_offset，位置从错误信息推断：syntax error 通过编译逐步加长的前缀找到出错的记号，
+no such table/column/function 定位到对应名称第一次出现的位置。
+
+PRAGMA 在编译阶段就会生效（加上 EXPLAIN 也一样），不能在共享的读连接上编译：这类语句只在临时的
+内存连接上检查语法，结果带有 syntaxOnly 标记。
+
+校验结论按（目标, schema_version, 语句哈希）缓存，建表、加列等schema变化后自动失效。
+脚本中位于DDL语句之后的语句可能引用前面才创建的表或列，这类名称错误降为 warning。
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .engine import DEFAULT_TARGET
+from .errors import SQLExecutionError
+from .params import PLACEHOLDER, compile_template, has_placeholders
+from .pool import PoolTimeoutError
+from .tokenizer import (
+    COMMENT, IDENTIFIER, STRING, WHITESPACE, WORD, iter_statements, statement_kind, tokenize, unquote_identifier
+)
+
+SEVERITY_ERROR = 'error'
+SEVERITY_WARNING = 'warning'
+
+# 会改变schema的语句类型，其后语句中的名称错误降为 warning
+_DDL_KINDS = ('create', 'alter', 'drop', 'attach', 'detach')
+
+_SYNTAX = re.compile(r'^near "(.*)": syntax error$', re.DOTALL)
+_UNRECOGNIZED = re.compile(r'^unrecognized token: "(.*)"$', re.DOTALL)
+_NAME_ERRORS = (
+    (re.compile(r'^no such table: (.+)$'), 'unknown_table'),
+    (re.compile(r'^no such column: (.+)$'), 'unknown_column'),
+    (re.compile(r'^no such function: (.+)$'), 'unknown_function'),
+    (re.compile(r'^ambiguous column name: (.+)$'), 'ambiguous_column'),
+)
+
+
+def _leading_kind(sql):
+    """跳过 EXPLAIN [QUERY PLAN] 后的首个关键字（小写）"""
+    for _, kind, text in _token_offsets(sql):
+        if kind != WORD:
+            return ''
+        if text.lower() not in ('explain', 'query', 'plan'):
+            return text.lower()
+    return ''
+
+
+def _statement_spans(sql):
+    """按 iter_statements 的规则拆分，产出 (在原文中的偏移, 语句文本)"""
+    position = 0
+    for statement in iter_statements(sql):
+        offset = sql.index(statement, position)
+        position = offset + len(statement)
+        yield offset, statement
+
+
+def _token_offsets(sql):
+    """产出 (偏移, 类型, 文本)，跳过空白和注释"""
+    offset = 0
+    for kind, text in tokenize(sql):
+        if kind not in (WHITESPACE, COMMENT):
+            yield offset, kind, text
+        offset += len(text)
+
+
+def _compile(conn, sql, prefix):
+    """编译 prefix + sql，成功返回None，失败返回错误信息"""
+    try:
+        conn.execute(prefix + sql)
+    except sqlite3.ProgrammingError as e:
+        # 参数个数不匹配在编译成功之后才检查，校验时不提供参数
+        if 'binding' in str(e):
+            return None
+        return str(e)
+    except sqlite3.Error as e:
+        return str(e)
+    return None
+
+
+def _locate_syntax_error(conn, sql, prefix, token):
+    """找出 near "token" 指的是第几次出现：编译到该记号为止的前缀时报告同样的错误"""
+    message = f'near "{token}": syntax error'
+    first = None
+    for offset, kind, text in _token_offsets(sql):
+        if text != token:
+            continue
+        if first is None:
+            first = offset
+        if _compile(conn, sql[:offset + len(text)], prefix) == message:
+            return offset, len(text)
+    return (first, len(token)) if first is not None else (None, 0)
+
+
+def _locate_name(sql, name):
+    """定位 table / schema.table / table.column 形式的名称，返回 (偏移, 长度)"""
+    parts = [part.lower() for part in name.split('.')]
+    tokens = [(offset, kind, text) for offset, kind, text in _token_offsets(sql) if kind != STRING]
+    for index, (offset, kind, text) in enumerate(tokens):
+        if kind not in (WORD, IDENTIFIER) or unquote_identifier(text).lower() != parts[0]:
+            continue
+        end = index
+        for part in parts[1:]:
+            if (end + 2 < len(tokens) and tokens[end + 1][2] == '.'
+                    and unquote_identifier(tokens[end + 2][2]).lower() == part):
+                end += 2
+            else:
+                break
+        else:
+            last_offset, _, last_text = tokens[end]
+            return offset, last_offset + len(last_text) - offset
+    return None, 0
+
+
+def _diagnose(conn, sql, prefix, message):
+    """把错误信息归类为 (errorType, 偏移, 长度)"""
+    match = _SYNTAX.match(message)
+    if match:
+        offset, length = _locate_syntax_error(conn, sql, prefix, match.group(1))
+        return 'syntax', offset, length
+    match = _UNRECOGNIZED.match(message)
+    if match:
+        offset = sql.find(match.group(1))
+        return 'syntax', (offset if offset >= 0 else None), len(match.group(1))
+    if message == 'incomplete input':
+        return 'syntax', len(sql), 0
+    for pattern, error_type in _NAME_ERRORS:
+        match = pattern.match(message)
+        if match:
+            offset, length = _locate_name(sql, match.group(1))
+            return error_type, offset, length
+    return 'error', None, 0
+
+
+def _position(sql, offset):
+    """把偏移换算为 {offset, line, column}"""
+    line = sql.count('\n', 0, offset) + 1
+    column = offset - (sql.rfind('\n', 0, offset) + 1) + 1
+    return {'offset': offset, 'line': line, 'column': column}
+
+
+class SQLValidator:
+    """编译期校验及结论缓存"""
+
+    def __init__(self, engine, max_entries=2048):
+        self.engine = engine
+        self.max_entries = max_entries
+        self._verdicts = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def validate(self, sql, target=DEFAULT_TARGET):
+        """校验脚本中的每条语句，返回整体结论和每条语句的错误"""
+        start = time.perf_counter()
+        pool = self.engine.get_pool(target, read_only=True)
+        try:
+            conn = pool.acquire()
+        except PoolTimeoutError as e:
+            raise SQLExecutionError(str(e))
+
+        statements = []
+        try:
+            try:
+                schema_version = conn.execute('PRAGMA schema_version').fetchone()[0]
+                # EXPLAIN 不开启读事务，先读一次 sqlite_master 让连接加载最新的schema
+                conn.execute('SELECT count(*) FROM sqlite_master').fetchone()
+            except sqlite3.Error as e:
+                raise SQLExecutionError(str(e))
+
+            after_ddl = False
+            for index, (offset, statement) in enumerate(_statement_spans(sql)):
+                verdict = self._verdict(conn, target, schema_version, statement, after_ddl)
+                statements.append(self._report(sql, index, offset, statement, verdict))
+                after_ddl = after_ddl or verdict['kind'] in _DDL_KINDS
+        finally:
+            pool.release(conn)
+
+        errors = sum(1 for s in statements if s.get('severity') == SEVERITY_ERROR)
+        warnings = sum(1 for s in statements if s.get('severity') == SEVERITY_WARNING)
+        return {
+            'success': True,
+            'valid': errors == 0,
+            'statements': statements,
+            'errorCount': errors,
+            'warningCount': warnings,
+            'schemaVersion': schema_version,
+            'elapsedMs': round((time.perf_counter() - start) * 1000, 3),
+            'message': f'{len(statements)} statements checked, {errors} errors, {warnings} warnings'
+        }
+
+    def _verdict(self, conn, target, schema_version, statement, after_ddl):
+        """单条语句的结论（位置相对于语句开头），优先取缓存"""
+        # 按原文哈希：结论中的位置相对于语句原文，空白不同的语句不能共用
+        digest = hashlib.sha1(statement.encode('utf-8')).hexdigest()
+        key = (target, schema_version, digest, after_ddl)
+        with self._lock:
+            verdict = self._verdicts.get(key)
+            if verdict is not None:
+                self._verdicts.move_to_end(key)
+                self.hits += 1
+                return dict(verdict, cached=True)
+            self.misses += 1
+
+        kind = statement_kind(statement)
+        # {{param}} 占位符按绑定参数编译；改写后的文本与原文长度不同时只能给出近似位置
+        try:
+            compiled = compile_template(statement)[0] if has_placeholders(statement) else statement
+            template_error = None
+        except SQLExecutionError as e:
+            # 占位符出现在名称或关键字的位置，无法绑定
+            compiled, template_error = None, str(e)
+        # 与 PlanCache 相同，把schema版本写进语句文本，避免命中sqlite3按文本缓存的旧语句；
+        # 本身就是 EXPLAIN 的语句直接编译
+        prefix = f'/* schema {schema_version} */ ' + ('EXPLAIN ' if kind != 'explain' else '')
+        syntax_only = _leading_kind(statement) == 'pragma'
+        if template_error is not None:
+            message = template_error
+            placeholder = PLACEHOLDER.search(message)
+            offset = statement.find(placeholder.group()) if placeholder else -1
+            diagnosis = ('template', offset if offset >= 0 else None, len(placeholder.group()) if placeholder else 0)
+        elif syntax_only:
+            # PRAGMA 在编译时即修改连接的设置，只在用后即关的内存连接上检查语法
+            scratch = sqlite3.connect(':memory:')
+            try:
+                message = _compile(scratch, compiled, prefix)
+                diagnosis = _diagnose(scratch, compiled, prefix, message) if message is not None else None
+            finally:
+                scratch.close()
+            if diagnosis is not None and diagnosis[0] != 'syntax':
+                # 内存库上的名称错误（如未知的schema）不代表目标库上的结果
+                message = diagnosis = None
+        else:
+            message = _compile(conn, compiled, prefix)
+            diagnosis = _diagnose(conn, compiled, prefix, message) if message is not None else None
+        verdict = {'kind': kind, 'valid': message is None}
+        if syntax_only:
+            verdict['syntaxOnly'] = True
+        if message is not None:
+            error_type, offset, length = diagnosis
+            severity = SEVERITY_ERROR
+            if after_ddl and error_type in ('unknown_table', 'unknown_column'):
+                severity = SEVERITY_WARNING
+                verdict['valid'] = True
+            verdict.update({'error': message, 'errorType': error_type, 'severity': severity,
+                            'offset': offset, 'length': length})
+
+        with self._lock:
+            self._verdicts[key] = verdict
+            while len(self._verdicts) > self.max_entries:
+                self._verdicts.popitem(last=False)
+        return dict(verdict, cached=False)
+
+    @staticmethod
+    def _report(sql, index, offset, statement, verdict):
+        report = {'index': index, 'kind': verdict['kind'], 'valid': verdict['valid'], 'cached': verdict['cached'],
+                  'start': _position(sql, offset), 'length': len(statement)}
+        if verdict.get('syntaxOnly'):
+            report['syntaxOnly'] = True
+        if 'error' in verdict:
+            report.update({'error': verdict['error'], 'errorType': verdict['errorType'],
+                           'severity': verdict['severity']})
+            if verdict['offset'] is not None:
+                position = _position(sql, offset + min(verdict['offset'], len(statement)))
+                position['length'] = verdict['length']
+                report['position'] = position
+        return report
+
+    def clear(self):
+        with self._lock:
+            count = len(self._verdicts)
+            self._verdicts.clear()
+            return count
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._verdicts),
+                'maxEntries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses
+            }
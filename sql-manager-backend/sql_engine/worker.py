@@ -0,0 +1,94 @@
+"""
+SQL执行工作进程
+由 SubprocessDriver 以 `python -m sql_engine.worker [内存上限字节数]` 启动，通过标准输入/输出交换带长度前缀的
+pickle消息，在自己的进程中打开目标库执行语句并分批发回结果。语句崩溃、内存失控或被强制终止都只影响工作进程。
+
+请求：(kind, db_path, read_only, sql, params, limits, batch_size)，kind 为 'execute' 或 'explain'
+响应：('header', columns, affected_rows)、('rows', batch)...，最后是 ('end', None) 或 ('error', 错误响应体)
+"""
+
+import sqlite3
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from .drivers import read_message, send_message
+from .errors import SQLExecutionError
+from .limits import BudgetGuard, QueryLimits
+from .pool import connect
+
+
+def _handle(connections, request, send):
+    kind, db_path, read_only, sql, params, limits, batch_size = request
+    conn = connections.get((db_path, read_only))
+    if conn is None:
+        conn = connect(db_path, read_only=read_only, isolation_level=None)
+        connections[(db_path, read_only)] = conn
+
+    cursor = conn.cursor()
+    try:
+        with BudgetGuard(conn, QueryLimits(*limits) if limits else None) as guard:
+            try:
+                if kind == 'explain':
+                    send(('rows', cursor.execute('EXPLAIN QUERY PLAN ' + sql, params or ()).fetchall()))
+                    return
+
+                changes_before = conn.total_changes
+                cursor.execute(sql, params or ())
+                if cursor.description is None:
+                    send(('header', None, conn.total_changes - changes_before))
+                    return
+
+                # 管道写满时 send 阻塞在等待父进程读取上，这段时间不计入超时
+                guard.pause()
+                send(('header', [d[0] for d in cursor.description], None))
+                guard.resume()
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        return
+                    guard.add_rows(len(batch))
+                    guard.pause()
+                    send(('rows', batch))
+                    guard.resume()
+            except sqlite3.Error as e:
+                raise guard.translate(e)
+    finally:
+        cursor.close()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    memory_limit = int(argv[0]) if argv else 0
+    if memory_limit and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    # 标准输出用于消息，其他输出改写到标准错误
+    sys.stdout = sys.stderr
+
+    def send(message):
+        send_message(stdout, message)
+
+    connections = {}
+    while True:
+        try:
+            request = read_message(stdin)
+        except EOFError:
+            break
+        try:
+            _handle(connections, request, send)
+            send(('end', None))
+        except SQLExecutionError as e:
+            send(('error', e.to_dict()))
+        except sqlite3.Error as e:
+            send(('error', SQLExecutionError(str(e)).to_dict()))
+        except MemoryError:
+            send(('error', SQLExecutionError('Worker process ran out of memory').to_dict()))
+
+
+if __name__ == '__main__':
+    main()